@@ -56,7 +56,10 @@ model = dict(
         norm_cfg=norm_cfg,
         act_cfg=dict(type='ReLU'),
         dice_weight=2.0,    # best 2.0
-        neg_entropy_weight=1.0,),   # best 1.0
+        neg_entropy_weight=1.0,   # best 1.0
+        # checkpoint the fusion of every (or of each) level to save memory, see
+        # tools/analysis_tools/benchmark_checkpointing.py
+        with_cp=False,),
 
     neck=dict(
         type='FPN',
@@ -58,6 +58,11 @@ model = dict(
 
     dice_weight=2.0,
 
+    taf_cfg=dict(
+        # checkpoint the fusion of every (or of each) level to save memory, see
+        # tools/analysis_tools/benchmark_checkpointing.py
+        with_cp=False),
+
     neck=dict(
         type='FPN',
         in_channels=[512, 1024],
@@ -0,0 +1,58 @@
+_base_ = './faster_rcnn_vgg16_fpn_sanitized-kaist_v2.py'
+
+# 单通道lwir: 以灰度图读取lwir图像, backbone的第一层卷积将预训练的3通道权重求和为1通道
+img_scale = (640, 512)
+
+# grayscale of the 3-channel lwir statistics
+lwir_mean = [43.586]
+lwir_std = [28.092]
+
+rgb_mean = [91.392, 84.984, 75.076]
+rgb_std = [67.841, 64.853, 65.535]
+
+model = dict(share_weights=dict(backbone=True, lwir_in_channels=1))
+
+train_pipeline = [
+        dict(type='LoadRGBTFromFile', lwir_color_type='grayscale'),
+        dict(type='LoadRGBTAnnotations', with_bbox=True, with_mask=True),
+        dict(type='FillRGBTIgnoredBoxRegionsByMeanValues', rgb_mean=rgb_mean, lwir_mean=lwir_mean),
+        dict(type='ResizeRGBT', img_scale=img_scale, keep_ratio=True),
+        dict(type='RandomFlipRGBT', flip_ratio=0.5),
+        dict(
+            type='NormalizeRGBT',
+            rgb_mean=rgb_mean,
+            rgb_std=rgb_std,
+            lwir_mean=lwir_mean,
+            lwir_std=lwir_std,
+            to_rgb=True),
+        dict(type='PadRGBT', size_divisor=32),
+        dict(type='DefaultFormatBundleRGBT'),
+        dict(type='CollectRGBT', keys=['rgb_img', 'lwir_img', 'gt_bboxes', 'gt_labels', 'gt_masks'])
+    ]
+
+test_pipeline = [
+    dict(type='LoadRGBTFromFile', lwir_color_type='grayscale'),
+    dict(
+        type='MultiScaleFlipAugRGBT',
+        img_scale=img_scale,
+        flip=False,
+        transforms=[
+            dict(type='ResizeRGBT', keep_ratio=True),
+            dict(type='RandomFlipRGBT'),
+            dict(
+                type='NormalizeRGBT',
+                rgb_mean=rgb_mean,
+                rgb_std=rgb_std,
+                lwir_mean=lwir_mean,
+                lwir_std=lwir_std,
+                to_rgb=True),
+            dict(type='PadRGBT', size_divisor=32),
+            dict(type='RGBTImageToTensor', keys=['lwir_img', 'rgb_img']),
+            dict(type='CollectRGBT', keys=['lwir_img', 'rgb_img'])
+        ])
+]
+
+data = dict(
+    train=dict(pipeline=train_pipeline),
+    val=dict(pipeline=test_pipeline),
+    test=dict(pipeline=test_pipeline))
@@ -1,12 +1,17 @@
 # Copyright (c) OpenMMLab. All rights reserved.
-from .inference import (async_inference_detector, inference_detector,
-                        init_detector, show_result_pyplot)
+from .inference import (async_inference_detector,
+                        async_inference_rgbt_detector, inference_detector,
+                        inference_rgbt_detector, init_detector,
+                        prepare_dummy_rgbt_data, prepare_rgbt_data,
+                        show_result_pyplot)
 from .test import multi_gpu_test, single_gpu_test
 from .train import (get_root_logger, init_random_seed, set_random_seed,
                     train_detector)
 
 __all__ = [
     'get_root_logger', 'set_random_seed', 'train_detector', 'init_detector',
-    'async_inference_detector', 'inference_detector', 'show_result_pyplot',
-    'multi_gpu_test', 'single_gpu_test', 'init_random_seed'
+    'async_inference_detector', 'async_inference_rgbt_detector',
+    'inference_detector', 'inference_rgbt_detector', 'prepare_rgbt_data',
+    'prepare_dummy_rgbt_data', 'show_result_pyplot', 'multi_gpu_test', 'single_gpu_test',
+    'init_random_seed'
 ]
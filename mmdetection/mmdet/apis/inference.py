@@ -1,4 +1,5 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import copy
 import warnings
 from pathlib import Path
 
@@ -156,6 +157,121 @@ def inference_detector(model, imgs):
         return results
 
 
+def prepare_rgbt_data(cfg, pairs, device):
+    """Prepare the inputs of a rgbt detector from image pairs.
+
+    The test pipeline of ``cfg`` runs in memory, with ``LoadRGBTFromFile``
+    replaced by :obj:`LoadRGBTFromWebcam`, and all the pairs are collated
+    into one batch.
+
+    Args:
+        cfg (:obj:`mmcv.Config`): Config of the detector.
+        pairs (list[tuple[str/ndarray]]): (visible, thermal) pairs, each
+            image being a file or a loaded image.
+        device (torch.device): Device to put the inputs on.
+
+    Returns:
+        dict: ``rgb_img``, ``lwir_img`` and ``img_metas`` to be passed to the
+            forward of the detector.
+    """
+    # set loading pipeline type, keeping its arguments such as color types.
+    # The pipeline is copied so that ``cfg`` is left unchanged
+    pipeline = copy.deepcopy(cfg.data.test.pipeline)
+    pipeline[0]['type'] = 'LoadRGBTFromWebcam'
+    test_pipeline = Compose(replace_ImageToTensor(pipeline))
+
+    datas = []
+    for rgb_img, lwir_img in pairs:
+        # prepare data
+        data = dict(rgb_img=rgb_img, lwir_img=lwir_img)
+        # build the data pipeline
+        data = test_pipeline(data)
+        datas.append(data)
+
+    data = collate(datas, samples_per_gpu=len(pairs))
+    # just get the actual data from DataContainer
+    data['img_metas'] = [img_metas.data[0] for img_metas in data['img_metas']]
+    data['rgb_img'] = [img.data[0] for img in data['rgb_img']]
+    data['lwir_img'] = [img.data[0] for img in data['lwir_img']]
+    if device.type == 'cuda':
+        # scatter to specified GPU
+        data = scatter(data, [device])[0]
+    return data
+
+
+def prepare_dummy_rgbt_data(cfg, shape, batch_size=1, device=None):
+    """Prepare the inputs of a rgbt detector from random image pairs.
+
+    The thermal images have the channels the loading step of the test
+    pipeline expects, i.e. a single one with
+    ``lwir_color_type='grayscale'``. The pairs are passed through
+    :func:`prepare_rgbt_data`, to benchmark or profile a detector without a
+    dataset.
+
+    Args:
+        cfg (:obj:`mmcv.Config`): Config of the detector.
+        shape (tuple[int]): (h, w) of the random images.
+        batch_size (int): Number of pairs in the batch. Defaults to 1.
+        device (torch.device, optional): Device to put the inputs on.
+            Defaults to the cpu.
+
+    Returns:
+        dict: ``rgb_img``, ``lwir_img`` and ``img_metas`` to be passed to the
+            forward of the detector.
+    """
+    load_cfg = cfg.data.test.pipeline[0]
+    assert load_cfg.type.startswith('LoadRGBT'), \
+        'dummy inputs are built by the rgbt test pipeline'
+    h, w = shape
+    gray = load_cfg.get('lwir_color_type') == 'grayscale'
+    rgb_img = np.random.randint(0, 256, (h, w, 3), dtype=np.uint8)
+    lwir_img = np.random.randint(
+        0, 256, (h, w) if gray else (h, w, 3), dtype=np.uint8)
+    return prepare_rgbt_data(cfg, [(rgb_img, lwir_img)] * batch_size,
+                             device or torch.device('cpu'))
+
+
+def inference_rgbt_detector(model, pairs):
+    """Inference rgbt image pair(s) with the detector.
+
+    The test pipeline of the model config runs in memory, with
+    ``LoadRGBTFromFile`` replaced by :obj:`LoadRGBTFromWebcam`, and all the
+    pairs are collated into one batch for a single forward.
+
+    Args:
+        model (nn.Module): The loaded detector.
+        pairs (tuple[str/ndarray] or list[tuple[str/ndarray]]): Either one
+            (visible, thermal) pair or a list of pairs, each image being a
+            file or a loaded image.
+
+    Returns:
+        If pairs is a list, the same length list of results will be
+        returned, otherwise return the detection results directly.
+    """
+    if isinstance(pairs, list):
+        is_batch = True
+    else:
+        pairs = [pairs]
+        is_batch = False
+
+    device = next(model.parameters()).device  # model device
+    data = prepare_rgbt_data(model.cfg, pairs, device)
+    if device.type != 'cuda':
+        for m in model.modules():
+            assert not isinstance(
+                m, RoIPool
+            ), 'CPU inference with RoIPool is not supported currently.'
+
+    # forward the model
+    with torch.no_grad():
+        results = model(return_loss=False, rescale=True, **data)
+
+    if not is_batch:
+        return results[0]
+    else:
+        return results
+
+
 async def async_inference_detector(model, imgs):
     """Async inference image(s) with the detector.
 
@@ -213,6 +329,36 @@ async def async_inference_detector(model, imgs):
     return results
 
 
+async def async_inference_rgbt_detector(model, pairs):
+    """Async inference rgbt image pair(s) with the detector.
+
+    Args:
+        model (nn.Module): The loaded detector.
+        pairs (tuple[str/ndarray] or list[tuple[str/ndarray]]): Either one
+            (visible, thermal) pair or a list of pairs, each image being a
+            file or a loaded image.
+
+    Returns:
+        Awaitable detection results.
+    """
+    if not isinstance(pairs, list):
+        pairs = [pairs]
+
+    device = next(model.parameters()).device  # model device
+    data = prepare_rgbt_data(model.cfg, pairs, device)
+    if device.type != 'cuda':
+        for m in model.modules():
+            assert not isinstance(
+                m, RoIPool
+            ), 'CPU inference with RoIPool is not supported currently.'
+
+    # We don't restore `torch.is_grad_enabled()` value during concurrent
+    # inference since execution can overlap
+    torch.set_grad_enabled(False)
+    results = await model.aforward_test(rescale=True, **data)
+    return results
+
+
 def show_result_pyplot(model,
                        img,
                        result,
@@ -18,7 +18,15 @@ def single_gpu_test(model,
                     data_loader,
                     show=False,
                     out_dir=None,
-                    show_score_thr=0.3):
+                    show_score_thr=0.3,
+                    result_writer=None):
+    """Test model with a single gpu.
+
+    Args:
+        result_writer (:obj:`DetResultWriter`, optional): If given, the bbox
+            results are written to it batch by batch instead of being kept
+            in memory, and an empty list is returned.
+    """
     model.eval()
     results = []
     dataset = data_loader.dataset
@@ -72,10 +80,15 @@ def single_gpu_test(model,
                 result[j]['ins_results'] = (bbox_results,
                                             encode_mask_results(mask_results))
 
-        results.extend(result)
+        if result_writer is not None:
+            result_writer.write(result)
+        else:
+            results.extend(result)
 
         for _ in range(batch_size):
             prog_bar.update()
+    if result_writer is not None:
+        result_writer.close()
     return results
 
 
@@ -8,6 +8,8 @@ from .mean_ap import average_precision, eval_map, print_map_summary
 from .panoptic_utils import INSTANCE_OFFSET
 from .recall import (eval_recalls, plot_iou_recall, plot_num_recall,
                      print_recall_summary)
+from .result_writer import (DetResultWriter, iter_det_shards,
+                            load_det_results)
 
 __all__ = [
     'voc_classes', 'imagenet_det_classes', 'imagenet_vid_classes',
@@ -15,5 +17,6 @@ __all__ = [
     'DistEvalHook', 'EvalHook', 'average_precision', 'eval_map',
     'print_map_summary', 'eval_recalls', 'print_recall_summary',
     'plot_num_recall', 'plot_iou_recall', 'oid_v6_classes',
-    'oid_challenge_classes', 'INSTANCE_OFFSET'
+    'oid_challenge_classes', 'INSTANCE_OFFSET', 'DetResultWriter',
+    'iter_det_shards', 'load_det_results'
 ]
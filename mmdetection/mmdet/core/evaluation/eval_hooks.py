@@ -1,6 +1,7 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import bisect
 import os.path as osp
+import warnings
 
 import mmcv
 import torch.distributed as dist
@@ -8,6 +9,8 @@ from mmcv.runner import DistEvalHook as BaseDistEvalHook
 from mmcv.runner import EvalHook as BaseEvalHook
 from torch.nn.modules.batchnorm import _BatchNorm
 
+from .result_writer import DetResultWriter
+
 
 def _calc_dynamic_intervals(start_interval, dynamic_interval_list):
     assert mmcv.is_list_of(dynamic_interval_list, tuple)
@@ -26,10 +29,26 @@ def _save_pkl(results, runner, work_dir):
     mmcv.dump(results, osp.join(work_dir, f"epoch_{runner.epoch + 1}.pkl"))
 
 class EvalHook(BaseEvalHook):
-
-    def __init__(self, *args, work_dir=None, dynamic_intervals=None, **kwargs):
+    """Non-Distributed evaluation hook.
+
+    The results of every evaluation are saved to ``work_dir`` as
+    ``epoch_{N}.pkl``, or, with ``stream_results=True``, written during the
+    test as the ``.npz`` shards of :class:`DetResultWriter` in ``epoch_{N}/``
+    so that the memory does not grow with the test set. The shards are keyed
+    by the image ids of the dataset and evaluated one at a time by
+    ``CocoDataset.evaluate``, see also
+    ``tools/analysis_tools/eval_kaist_mr.py`` which reads both.
+    """
+
+    def __init__(self,
+                 *args,
+                 work_dir=None,
+                 dynamic_intervals=None,
+                 stream_results=False,
+                 **kwargs):
         assert work_dir, 'zx: the work_dir should not be None'
         self.work_dir = work_dir
+        self.stream_results = stream_results
         super(EvalHook, self).__init__(*args, **kwargs)
 
         self.use_dynamic_intervals = dynamic_intervals is not None
@@ -59,9 +78,20 @@ class EvalHook(BaseEvalHook):
             return
 
         from mmdet.apis import single_gpu_test
-        results = single_gpu_test(runner.model, self.dataloader, show=False)
-
-        _save_pkl(results, runner, self.work_dir)
+        if self.stream_results:
+            out_dir = osp.join(self.work_dir, f'epoch_{runner.epoch + 1}')
+            img_ids = getattr(self.dataloader.dataset, 'img_ids', None)
+            single_gpu_test(
+                runner.model,
+                self.dataloader,
+                show=False,
+                result_writer=DetResultWriter(out_dir, img_ids))
+            # the dataset reads the shards from the directory
+            results = out_dir
+        else:
+            results = single_gpu_test(
+                runner.model, self.dataloader, show=False)
+            _save_pkl(results, runner, self.work_dir)
 
         runner.log_buffer.output['eval_iter_num'] = len(self.dataloader)
         key_score = self.evaluate(runner, results)
@@ -76,9 +106,17 @@ class EvalHook(BaseEvalHook):
 # inherit EvalHook but BaseDistEvalHook.
 class DistEvalHook(BaseDistEvalHook):
 
-    def __init__(self, *args, work_dir=None, dynamic_intervals=None, **kwargs):
+    def __init__(self,
+                 *args,
+                 work_dir=None,
+                 dynamic_intervals=None,
+                 stream_results=False,
+                 **kwargs):
         assert work_dir, 'zx: the work_dir should not be None'
         self.work_dir = work_dir
+        if stream_results:
+            warnings.warn('stream_results is not supported by distributed '
+                          'evaluation, the results are saved as pkl files')
         super(DistEvalHook, self).__init__(*args, **kwargs)
 
         self.use_dynamic_intervals = dynamic_intervals is not None
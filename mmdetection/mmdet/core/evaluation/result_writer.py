@@ -0,0 +1,141 @@
+import os
+import os.path as osp
+from glob import glob
+
+import numpy as np
+
+
+class DetResultWriter:
+    """Append-only writer of bbox results to ``.npz`` shards.
+
+    The results are written as they come, in the order of the dataset, so
+    that the memory of a test run no longer grows with the number of images.
+    Every ``shard_size`` images, one shard ``{index:05d}.npz`` is written to
+    ``out_dir`` with the columns of all their boxes:
+
+    - ``img_ids`` (int64): id of the image of the box.
+    - ``labels`` (int64): class of the box.
+    - ``bboxes`` (float32): (n, 5) boxes in (x1, y1, x2, y2, score).
+
+    and, for the images the shard covers, empty ones included,
+    ``shard_img_ids``, their ids in the order of the dataset, ``counts``, the
+    (num_imgs, num_classes) numbers of boxes per image and class, and
+    ``start``, the index of the first one in the dataset. A shard is renamed
+    to its final name once complete, so the shards can be read while the
+    test runs.
+
+    Args:
+        out_dir (str): Directory of the shards. Shards of a previous run are
+            removed.
+        img_ids (Sequence[int], optional): Image ids of the dataset, e.g.
+            ``CocoDataset.img_ids``. If not given, the index of the image in
+            the dataset is used as its id.
+        shard_size (int): Number of images per shard. Default: 500.
+    """
+
+    def __init__(self, out_dir, img_ids=None, shard_size=500):
+        self.out_dir = out_dir
+        self.img_ids = img_ids
+        self.shard_size = shard_size
+        os.makedirs(out_dir, exist_ok=True)
+        for file in glob(osp.join(out_dir, '*.npz')):
+            os.remove(file)
+        self.num_imgs = 0
+        self.num_shards = 0
+        self._buffer = []
+
+    def write(self, results):
+        """Append the results of a batch.
+
+        Args:
+            results (list): The results of ``model(return_loss=False)``,
+                for each image a list of (n, 5) arrays per class, or a tuple
+                whose first item is such a list, e.g. with mask results.
+        """
+        for result in results:
+            self._buffer.append(result[0] if isinstance(result, tuple) else
+                                result)
+            if len(self._buffer) == self.shard_size:
+                self._flush()
+
+    def close(self):
+        """Write the images left in the buffer."""
+        if self._buffer:
+            self._flush()
+
+    def _flush(self):
+        num_imgs = len(self._buffer)
+        if self.img_ids is None:
+            shard_img_ids = np.arange(self.num_imgs, self.num_imgs + num_imgs)
+        else:
+            shard_img_ids = np.asarray(
+                self.img_ids[self.num_imgs:self.num_imgs + num_imgs])
+        counts = np.array([[len(bboxes) for bboxes in result]
+                           for result in self._buffer], np.int64)
+        num_classes = counts.shape[1]
+        file = osp.join(self.out_dir, f'{self.num_shards:05d}.npz')
+        with open(f'{file}.tmp', 'wb') as f:
+            np.savez(
+                f,
+                img_ids=np.repeat(shard_img_ids, counts.sum(1)).astype(
+                    np.int64),
+                labels=np.tile(np.arange(num_classes), num_imgs).repeat(
+                    counts.ravel()),
+                bboxes=np.concatenate([
+                    bboxes for result in self._buffer for bboxes in result
+                ]).astype(np.float32).reshape(-1, 5),
+                shard_img_ids=shard_img_ids.astype(np.int64),
+                counts=counts,
+                start=self.num_imgs)
+        os.replace(f'{file}.tmp', file)
+        self.num_imgs += num_imgs
+        self.num_shards += 1
+        self._buffer = []
+
+
+def iter_det_shards(out_dir):
+    """Iterate over the shards of :class:`DetResultWriter` in order.
+
+    Only one shard is in memory at a time, so evaluators can convert the
+    results shard by shard instead of rebuilding the whole test set.
+
+    Args:
+        out_dir (str): Directory of the shards.
+
+    Yields:
+        dict[str, np.ndarray]: The columns of a shard, see
+            :class:`DetResultWriter`.
+    """
+    num_imgs = 0
+    for file in sorted(glob(osp.join(out_dir, '*.npz'))):
+        with np.load(file) as npz:
+            shard = dict(npz)
+        assert int(shard['start']) == num_imgs, \
+            f'{file} does not follow the previous shards'
+        num_imgs += len(shard['shard_img_ids'])
+        yield shard
+
+
+def load_det_results(out_dir):
+    """Read the shards of :class:`DetResultWriter` back.
+
+    This rebuilds all the results in memory, use :func:`iter_det_shards` to
+    consume them one shard at a time.
+
+    Args:
+        out_dir (str): Directory of the shards.
+
+    Returns:
+        list[list[np.ndarray]]: The results in the format of
+            ``single_gpu_test``, for each image a list of (n, 5) arrays per
+            class.
+    """
+    results = []
+    for shard in iter_det_shards(out_dir):
+        counts = shard['counts']
+        # boxes of a shard are sorted by image, then by class
+        per_class = np.split(shard['bboxes'], np.cumsum(counts)[:-1])
+        num_classes = counts.shape[1]
+        results.extend(per_class[i:i + num_classes]
+                       for i in range(0, counts.size, num_classes))
+    return results
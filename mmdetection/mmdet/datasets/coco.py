@@ -2,6 +2,7 @@
 import contextlib
 import io
 import itertools
+import json
 import logging
 import os.path as osp
 import tempfile
@@ -13,7 +14,7 @@ import numpy as np
 from mmcv.utils import print_log
 from terminaltables import AsciiTable
 
-from mmdet.core import eval_recalls
+from mmdet.core import eval_recalls, iter_det_shards
 from .api_wrappers import COCO, COCOeval
 from .builder import DATASETS
 from .custom import CustomDataset
@@ -291,6 +292,39 @@ class CocoDataset(CustomDataset):
                     segm_json_results.append(data)
         return bbox_json_results, segm_json_results
 
+    def _shards2json(self, out_dir, outfile):
+        """Convert the bbox shards of ``DetResultWriter`` to a COCO json file,
+        one shard at a time."""
+        cat_ids = np.array(self.cat_ids)
+        num_imgs = 0
+        with open(outfile, 'w') as f:
+            f.write('[')
+            sep = ''
+            for shard in iter_det_shards(out_dir):
+                shard_img_ids = shard['shard_img_ids']
+                assert np.array_equal(
+                    shard_img_ids,
+                    self.img_ids[num_imgs:num_imgs + len(shard_img_ids)]), \
+                    f'the shards of {out_dir} are not keyed by the image ids' \
+                    ' of the dataset'
+                num_imgs += len(shard_img_ids)
+                bboxes = shard['bboxes'].astype(np.float64)
+                bboxes[:, 2:4] -= bboxes[:, :2]
+                for img_id, bbox, label in zip(shard['img_ids'].tolist(),
+                                               bboxes.tolist(),
+                                               shard['labels']):
+                    data = dict()
+                    data['image_id'] = img_id
+                    data['bbox'] = bbox[:4]
+                    data['score'] = bbox[4]
+                    data['category_id'] = int(cat_ids[label])
+                    f.write(sep + json.dumps(data))
+                    sep = ','
+            f.write(']')
+        assert num_imgs == len(self), (
+            'The length of results is not equal to the dataset len: {} != {}'.
+            format(num_imgs, len(self)))
+
     def results2json(self, results, outfile_prefix):
         """Dump the detection results to a COCO style json file.
 
@@ -299,8 +333,9 @@ class CocoDataset(CustomDataset):
         automatically recognize the type, and dump them to json files.
 
         Args:
-            results (list[list | tuple | ndarray]): Testing results of the
-                dataset.
+            results (list[list | tuple | ndarray] | str): Testing results of
+                the dataset, or the directory of the bbox shards written by
+                ``DetResultWriter``, converted one shard at a time.
             outfile_prefix (str): The filename prefix of the json files. If the
                 prefix is "somepath/xxx", the json files will be named
                 "somepath/xxx.bbox.json", "somepath/xxx.segm.json",
@@ -311,7 +346,11 @@ class CocoDataset(CustomDataset):
                 values are corresponding filenames.
         """
         result_files = dict()
-        if isinstance(results[0], list):
+        if isinstance(results, str):
+            result_files['bbox'] = f'{outfile_prefix}.bbox.json'
+            result_files['proposal'] = f'{outfile_prefix}.bbox.json'
+            self._shards2json(results, result_files['bbox'])
+        elif isinstance(results[0], list):
             json_results = self._det2json(results)
             result_files['bbox'] = f'{outfile_prefix}.bbox.json'
             result_files['proposal'] = f'{outfile_prefix}.bbox.json'
@@ -359,8 +398,9 @@ class CocoDataset(CustomDataset):
         """Format the results to json (standard format for COCO evaluation).
 
         Args:
-            results (list[tuple | numpy.ndarray]): Testing results of the
-                dataset.
+            results (list[tuple | numpy.ndarray] | str): Testing results of
+                the dataset, or the directory of the bbox shards written by
+                ``DetResultWriter``.
             jsonfile_prefix (str | None): The prefix of json files. It includes
                 the file path and the prefix of filename, e.g., "a/b/prefix".
                 If not specified, a temp file will be created. Default: None.
@@ -370,8 +410,9 @@ class CocoDataset(CustomDataset):
                 the json filepaths, tmp_dir is the temporal directory created \
                 for saving json files when jsonfile_prefix is not specified.
         """
-        assert isinstance(results, list), 'results must be a list'
-        assert len(results) == len(self), (
+        assert isinstance(results, (list, str)), \
+            'results must be a list or a directory of shards'
+        assert isinstance(results, str) or len(results) == len(self), (
             'The length of results is not equal to the dataset len: {} != {}'.
             format(len(results), len(self)))
 
@@ -439,6 +480,9 @@ class CocoDataset(CustomDataset):
             print_log(msg, logger=logger)
 
             if metric == 'proposal_fast':
+                if isinstance(results, str):
+                    raise KeyError('proposal_fast is not supported for '
+                                   'streamed results.')
                 if isinstance(results[0], tuple):
                     raise KeyError('proposal_fast is not supported for '
                                    'instance segmentation result.')
@@ -601,7 +645,9 @@ class CocoDataset(CustomDataset):
         """Evaluation in COCO protocol.
 
         Args:
-            results (list[list | tuple]): Testing results of the dataset.
+            results (list[list | tuple] | str): Testing results of the
+                dataset, or the directory of the bbox shards written by
+                ``DetResultWriter``, which only support the bbox metrics.
             metric (str | list[str]): Metrics to be evaluated. Options are
                 'bbox', 'segm', 'proposal', 'proposal_fast'.
             logger (logging.Logger | str | None): Logger used for printing
@@ -16,10 +16,10 @@ from .transforms import (Albu, CopyPaste, CutOut, Expand, MinIoURandomCrop,
                          RandomFlip, RandomShift, Resize, SegRescale,
                          YOLOXHSVRandomAug)
 
-from .my_load_rgbt_pipeline import (LoadRGBTFromFile, LoadRGBTAnnotations, ResizeRGBT,
+from .my_load_rgbt_pipeline import (LoadRGBTFromFile, LoadRGBTFromWebcam, LoadRGBTAnnotations, ResizeRGBT,
                                     RandomFlipRGBT, NormalizeRGBT, PadRGBT, DefaultFormatBundleRGBT,
                                     CollectRGBT, MultiScaleFlipAugRGBT, RGBTImageToTensor, Mosaic_RGBT,
-                                    RandomAffineRGBT)
+                                    RandomAffineRGBT, PreprocessRGBT)
 
 __all__ = [
     'Compose', 'to_tensor', 'ToTensor', 'ImageToTensor', 'ToDataContainer',
@@ -33,7 +33,8 @@ __all__ = [
     'ContrastTransform', 'Translate', 'RandomShift', 'Mosaic', 'MixUp',
     'RandomAffine', 'YOLOXHSVRandomAug', 'CopyPaste',
     # my dataset pipeline
-    'LoadRGBTFromFile', 'LoadRGBTAnnotations', 'ResizeRGBT', 'RandomFlipRGBT',
+    'LoadRGBTFromFile', 'LoadRGBTFromWebcam', 'LoadRGBTAnnotations', 'ResizeRGBT', 'RandomFlipRGBT',
     'NormalizeRGBT', 'PadRGBT', 'DefaultFormatBundleRGBT', 'CollectRGBT',
-    'MultiScaleFlipAugRGBT', 'RGBTImageToTensor', 'Mosaic_RGBT', 'RandomAffineRGBT'
+    'MultiScaleFlipAugRGBT', 'RGBTImageToTensor', 'Mosaic_RGBT', 'RandomAffineRGBT',
+    'PreprocessRGBT'
 ]
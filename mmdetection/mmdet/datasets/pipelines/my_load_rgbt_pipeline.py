@@ -11,6 +11,7 @@ from numpy import random
 import mmcv
 import numpy as np
 import pycocotools.mask as maskUtils
+import torch
 
 from mmdet.core import BitmapMasks, PolygonMasks, find_inside_bboxes
 from ..builder import PIPELINES
@@ -36,6 +37,12 @@ class LoadRGBTFromFile:
             Defaults to False.
         color_type (str): The flag argument for :func:`mmcv.imfrombytes`.
             Defaults to 'color'.
+        lwir_color_type (str, optional): The flag argument for
+            :func:`mmcv.imfrombytes` used for the lwir image. 'grayscale'
+            loads the thermal image as a single channel (H, W) array, which
+            the RGBT transforms and the backbone stem adapter
+            (:func:`mmdet.models.utils.fold_lwir_stem`) support. Defaults to
+            ``color_type``.
         file_client_args (dict): Arguments to instantiate a FileClient.
             See :class:`mmcv.fileio.FileClient` for details.
             Defaults to ``dict(backend='disk')``.
@@ -44,10 +51,12 @@ class LoadRGBTFromFile:
     def __init__(self,
                  to_float32=False,
                  color_type='color',
+                 lwir_color_type=None,
                  channel_order='bgr',
                  file_client_args=dict(backend='disk')):
         self.to_float32 = to_float32
         self.color_type = color_type
+        self.lwir_color_type = color_type if lwir_color_type is None else lwir_color_type
         self.channel_order = channel_order
         self.file_client_args = file_client_args.copy()
         self.file_client = None
@@ -81,7 +90,7 @@ class LoadRGBTFromFile:
         lwir_img_bytes = self.file_client.get(filename)
         rgb_img_bytes = self.file_client.get(rgb_filename)
         lwir_img = mmcv.imfrombytes(
-            lwir_img_bytes, flag=self.color_type, channel_order=self.channel_order)
+            lwir_img_bytes, flag=self.lwir_color_type, channel_order=self.channel_order)
         rgb_img = mmcv.imfrombytes(
             rgb_img_bytes, flag=self.color_type, channel_order=self.channel_order)
         if self.to_float32:
@@ -97,10 +106,10 @@ class LoadRGBTFromFile:
         results['lwir_img'] = lwir_img
         results['rgb_img'] = rgb_img
 
-        assert lwir_img.shape == rgb_img.shape
-        results['img_shape'] = lwir_img.shape
+        assert lwir_img.shape[:2] == rgb_img.shape[:2]
+        results['img_shape'] = rgb_img.shape
 
-        results['ori_shape'] = lwir_img.shape
+        results['ori_shape'] = rgb_img.shape
 
         results['lwir_img_fields'] = ['lwir_img']
         results['rgb_img_fields'] = ['rgb_img']
@@ -110,11 +119,60 @@ class LoadRGBTFromFile:
         repr_str = (f'{self.__class__.__name__}('
                     f'to_float32={self.to_float32}, '
                     f"color_type='{self.color_type}', "
+                    f"lwir_color_type='{self.lwir_color_type}', "
                     f"channel_order='{self.channel_order}', "
                     f'file_client_args={self.file_client_args})')
         return repr_str
 
 
+@PIPELINES.register_module()
+class LoadRGBTFromWebcam(LoadRGBTFromFile):
+    """Load a pair of rgbt images given in ``results['rgb_img']`` and
+    ``results['lwir_img']``.
+
+    Similar with :obj:`LoadRGBTFromFile`, but each image is either an already
+    decoded array, e.g. a camera frame, or a path. Paths are read with the
+    color types of :obj:`LoadRGBTFromFile`, arrays are used as they are.
+    """
+
+    def _load(self, img, flag):
+        if isinstance(img, str):
+            return img, mmcv.imread(img, flag=flag, channel_order=self.channel_order)
+        return None, img
+
+    def __call__(self, results):
+        """Call functions to add image meta information.
+
+        Args:
+            results (dict): Result dict with the rgb and lwir images (or
+                their paths) in ``results['rgb_img']`` and
+                ``results['lwir_img']``.
+
+        Returns:
+            dict: The dict contains loaded image and meta information.
+        """
+        rgb_filename, rgb_img = self._load(results['rgb_img'], self.color_type)
+        lwir_filename, lwir_img = self._load(results['lwir_img'], self.lwir_color_type)
+        if self.to_float32:
+            lwir_img = lwir_img.astype(np.float32)
+            rgb_img = rgb_img.astype(np.float32)
+
+        results['lwir_filename'] = results['lwir_ori_filename'] = lwir_filename
+        results['rgb_filename'] = results['rgb_ori_filename'] = rgb_filename
+
+        results['lwir_img'] = lwir_img
+        results['rgb_img'] = rgb_img
+
+        assert lwir_img.shape[:2] == rgb_img.shape[:2]
+        results['img_shape'] = rgb_img.shape
+
+        results['ori_shape'] = rgb_img.shape
+
+        results['lwir_img_fields'] = ['lwir_img']
+        results['rgb_img_fields'] = ['rgb_img']
+        return results
+
+
 @PIPELINES.register_module()
 class LoadRGBTAnnotations:
     """Load multiple types of annotations.
@@ -540,7 +598,7 @@ class ResizeRGBT:
             if idx == 0:
                 img_shape = img.shape
             else:
-                assert img.shape == img_shape, 'the size of Resized image is not the same'
+                assert img.shape[:2] == img_shape[:2], 'the size of Resized image is not the same'
             results['img_shape'] = img.shape
 
             # in case that there is no padding
@@ -730,18 +788,8 @@ class RandomFlipRGBT:
             raise ValueError(f"Invalid flipping direction '{direction}'")
         return flipped
 
-    def __call__(self, results):
-        """Call function to flip bounding boxes, masks, semantic segmentation
-        maps.
-
-        Args:
-            results (dict): Result dict from loading pipeline.
-
-        Returns:
-            dict: Flipped results, 'flip', 'flip_direction' keys are added \
-                into result dict.
-        """
-
+    def _random_direction(self, results):
+        """Set the 'flip' and 'flip_direction' keys if not given."""
         if 'flip' not in results:
             if isinstance(self.direction, list):
                 # None means non-flip
@@ -765,25 +813,42 @@ class RandomFlipRGBT:
             results['flip'] = cur_dir is not None
         if 'flip_direction' not in results:
             results['flip_direction'] = cur_dir
+
+    def _flip_annotations(self, results):
+        """Flip bboxes, masks and segs of a flipped image."""
+        # flip bboxes
+        for key in results.get('bbox_fields', []):
+            results[key] = self.bbox_flip(results[key],
+                                          results['img_shape'],
+                                          results['flip_direction'])
+        # flip masks
+        for key in results.get('mask_fields', []):
+            results[key] = results[key].flip(results['flip_direction'])
+
+        # flip segs
+        for key in results.get('seg_fields', []):
+            results[key] = mmcv.imflip(
+                results[key], direction=results['flip_direction'])
+
+    def __call__(self, results):
+        """Call function to flip bounding boxes, masks, semantic segmentation
+        maps.
+
+        Args:
+            results (dict): Result dict from loading pipeline.
+
+        Returns:
+            dict: Flipped results, 'flip', 'flip_direction' keys are added \
+                into result dict.
+        """
+        self._random_direction(results)
         if results['flip']:
             # flip image
             for key in [results.get('lwir_img_fields', ['lwir_img']), results.get('rgb_img_fields', ['rgb_img'])]:
                 key = key[0]
                 results[key] = mmcv.imflip(
                     results[key], direction=results['flip_direction'])
-            # flip bboxes
-            for key in results.get('bbox_fields', []):
-                results[key] = self.bbox_flip(results[key],
-                                              results['img_shape'],
-                                              results['flip_direction'])
-            # flip masks
-            for key in results.get('mask_fields', []):
-                results[key] = results[key].flip(results['flip_direction'])
-
-            # flip segs
-            for key in results.get('seg_fields', []):
-                results[key] = mmcv.imflip(
-                    results[key], direction=results['flip_direction'])
+            self._flip_annotations(results)
         return results
 
     def __repr__(self):
@@ -797,8 +862,11 @@ class NormalizeRGBT:
     Added key is "img_norm_cfg".
 
     Args:
-        mean (sequence): Mean values of 3 channels.
-        std (sequence): Std values of 3 channels.
+        lwir_mean (sequence): Mean values of the lwir channels, a single
+            value for a single channel lwir image.
+        lwir_std (sequence): Std values of the lwir channels.
+        rgb_mean (sequence): Mean values of 3 channels.
+        rgb_std (sequence): Std values of 3 channels.
         to_rgb (bool): Whether to convert the image from BGR to RGB,
             default is true.
     """
@@ -826,8 +894,9 @@ class NormalizeRGBT:
         for key in [results.get('lwir_img_fields', ['lwir_img']), results.get('rgb_img_fields', ['rgb_img'])]:
             key = key[0]
             if key == 'lwir_img':
+                # a single channel lwir image has no channel order to convert
                 results[key] = mmcv.imnormalize(results[key], self.lwir_mean, self.lwir_std,
-                                                self.to_rgb)
+                                                self.to_rgb and results[key].ndim == 3)
             elif key == 'rgb_img':
                 results[key] = mmcv.imnormalize(results[key], self.rgb_mean, self.rgb_std,
                                                 self.to_rgb)
@@ -840,7 +909,8 @@ class NormalizeRGBT:
 
     def __repr__(self):
         repr_str = self.__class__.__name__
-        repr_str += f'(mean={self.mean}, std={self.std}, to_rgb={self.to_rgb})'
+        repr_str += f'(lwir_mean={self.lwir_mean}, lwir_std={self.lwir_std}, '
+        repr_str += f'rgb_mean={self.rgb_mean}, rgb_std={self.rgb_std}, to_rgb={self.to_rgb})'
         return repr_str
 
 
@@ -906,7 +976,7 @@ class PadRGBT:
             if idx == 0:
                 padded_shape = padded_img.shape
             else:
-                assert padded_shape == padded_img.shape, 'the padded sizes of lwir and rgb should be the same'
+                assert padded_shape[:2] == padded_img.shape[:2], 'the padded sizes of lwir and rgb should be the same'
 
         results['pad_shape'] = padded_img.shape
         results['pad_fixed_size'] = self.size
@@ -996,6 +1066,12 @@ class DefaultFormatBundleRGBT:
             key = key[0]
             if key in results:
                 img = results[key]
+                if isinstance(img, torch.Tensor):
+                    # already a (C, H, W) tensor from PreprocessRGBT
+                    results = self._add_default_meta_keys(results, key)
+                    results[key] = DC(
+                        img, padding_value=self.pad_val['img'], stack=True)
+                    continue
                 if self.img_to_float is True and img.dtype == np.uint8:
                     # Normally, image is of uint8 type without normalization.
                     # At this time, it needs to be forced to be converted to
@@ -1059,6 +1135,134 @@ class DefaultFormatBundleRGBT:
                f'(img_to_float={self.img_to_float})'
 
 
+@PIPELINES.register_module()
+class PreprocessRGBT:
+    """Resize, flip, normalize and pad the rgbt images in one pass.
+
+    It is a drop-in replacement of the chain ``ResizeRGBT`` ->
+    ``RandomFlipRGBT`` -> ``NormalizeRGBT`` -> ``PadRGBT``, whose arguments
+    are given as dicts, e.g.
+
+    .. code-block::
+
+        dict(
+            type='PreprocessRGBT',
+            resize=dict(img_scale=img_scale, keep_ratio=True),
+            flip=dict(flip_ratio=0.5),
+            normalize=dict(rgb_mean=rgb_mean, rgb_std=rgb_std,
+                           lwir_mean=lwir_mean, lwir_std=lwir_std,
+                           to_rgb=True),
+            pad=dict(size_divisor=32))
+
+    The bboxes, masks, segmentation maps and meta keys are processed by the
+    chained transforms, so they are the same as with the chain. Each image is
+    resized as uint8, then flipped, converted to rgb and normalized while
+    being written into a single zero padded float32 (C, H, W) buffer, which
+    is returned as a tensor sharing its memory. This saves the float32 copies
+    made at every step of the chain and by the transpose of
+    ``DefaultFormatBundleRGBT``/``RGBTImageToTensor``, which pass the tensors
+    through.
+
+    Args:
+        resize (dict): Arguments of :obj:`ResizeRGBT`.
+        normalize (dict): Arguments of :obj:`NormalizeRGBT`.
+        pad (dict): Arguments of :obj:`PadRGBT`.
+        flip (dict, optional): Arguments of :obj:`RandomFlipRGBT`.
+            Default: ``dict()``, which flips only if 'flip' is set in the
+            results, e.g. by :obj:`MultiScaleFlipAugRGBT`.
+    """
+
+    def __init__(self, resize, normalize, pad, flip=dict()):
+        self.resize = ResizeRGBT(**resize)
+        self.flip = RandomFlipRGBT(**flip)
+        self.normalize = NormalizeRGBT(**normalize)
+        self.pad = PadRGBT(**pad)
+
+    @staticmethod
+    def _fill(buffer, img, mean, std, to_rgb, direction):
+        """Write the normalized ``img`` into the top-left of ``buffer``."""
+        if img.ndim == 2:
+            img = img[..., None]
+        h, w = img.shape[:2]
+        # flip by views, the pixels are only read once below
+        if direction in ('horizontal', 'diagonal'):
+            img = img[:, ::-1]
+        if direction in ('vertical', 'diagonal'):
+            img = img[::-1]
+        stdinv = 1 / np.float64(std)
+        for c in range(buffer.shape[0]):
+            src_c = img.shape[2] - 1 - c if to_rgb else c
+            dst = buffer[c, :h, :w]
+            np.subtract(img[..., src_c], mean[c], out=dst, dtype=np.float32)
+            np.multiply(dst, stdinv[c], out=dst, dtype=np.float32)
+
+    def _pad_shape(self, img_shape):
+        """Padded (h, w) of ``PadRGBT`` for an image of ``img_shape``."""
+        if self.pad.pad_to_square:
+            max_size = max(img_shape[:2])
+            return max_size, max_size
+        if self.pad.size is not None:
+            return tuple(self.pad.size)
+        divisor = self.pad.size_divisor
+        return tuple(
+            int(np.ceil(size / divisor)) * divisor for size in img_shape[:2])
+
+    def __call__(self, results):
+        """Call function to preprocess the images and annotations.
+
+        Args:
+            results (dict): Result dict from loading pipeline.
+
+        Returns:
+            dict: Updated result dict, with the images as (C, H, W) float32
+                tensors, and the keys added by the chained transforms.
+        """
+        results = self.resize(results)
+        self.flip._random_direction(results)
+        if results['flip']:
+            self.flip._flip_annotations(results)
+
+        pad_h, pad_w = self._pad_shape(results['img_shape'])
+        pad_val = self.pad.pad_val.get('img', 0)
+        direction = results['flip_direction'] if results['flip'] else None
+        norm = self.normalize
+        for key in [results.get('lwir_img_fields', ['lwir_img']), results.get('rgb_img_fields', ['rgb_img'])]:
+            key = key[0]
+            img = results[key]
+            if key == 'lwir_img':
+                mean, std = norm.lwir_mean, norm.lwir_std
+                # a single channel lwir image has no channel order to convert
+                to_rgb = norm.to_rgb and img.ndim == 3
+            else:
+                mean, std = norm.rgb_mean, norm.rgb_std
+                to_rgb = norm.to_rgb
+            num_channels = 1 if img.ndim == 2 else img.shape[2]
+            buffer = np.full((num_channels, pad_h, pad_w),
+                             pad_val,
+                             dtype=np.float32)
+            self._fill(buffer, img, np.resize(mean, num_channels),
+                       np.resize(std, num_channels), to_rgb, direction)
+            results[key] = torch.from_numpy(buffer)
+
+        results['RGBT_img_norm_cfg'] = dict(
+            rgb_mean=norm.rgb_mean, rgb_std=norm.rgb_std,
+            lwir_mean=norm.lwir_mean, lwir_std=norm.lwir_std,
+            to_rgb=norm.to_rgb)
+        results['pad_shape'] = (pad_h, pad_w, *results['img_shape'][2:])
+        results['pad_fixed_size'] = (pad_h, pad_w) \
+            if self.pad.pad_to_square else self.pad.size
+        results['pad_size_divisor'] = self.pad.size_divisor
+        self.pad._pad_masks(results)
+        self.pad._pad_seg(results)
+        return results
+
+    def __repr__(self):
+        repr_str = self.__class__.__name__
+        repr_str += f'(resize={self.resize}, flip={self.flip}, '
+        repr_str += f'normalize={self.normalize}, pad={self.pad})'
+        return repr_str
+
+
 @PIPELINES.register_module()
 class CollectRGBT:
     """Collect data from the loader relevant to the specific task.
@@ -1277,6 +1481,9 @@ class RGBTImageToTensor:
         """
         for key in self.keys:
             img = results[key]
+            if isinstance(img, torch.Tensor):
+                # already a (C, H, W) tensor from PreprocessRGBT
+                continue
             if len(img.shape) < 3:
                 img = np.expand_dims(img, -1)
             results[key] = (to_tensor(img.transpose(2, 0, 1))).contiguous()
@@ -1405,7 +1612,7 @@ class Mosaic_RGBT:
         assert 'mix_results' in results
         mosaic_labels = []
         mosaic_bboxes = []
-        assert results['rgb_img'].shape == results['lwir_img'].shape
+        assert results['rgb_img'].shape[:2] == results['lwir_img'].shape[:2]
         if len(results['rgb_img'].shape) == 3:
             rgb_mosaic_img = np.full(
                 (int(self.img_scale[0] * 2), int(self.img_scale[1] * 2), 3),
@@ -1444,7 +1651,7 @@ class Mosaic_RGBT:
 
             rgb_img_i = results_patch['rgb_img']
             lwir_img_i = results_patch['lwir_img']
-            assert rgb_img_i.shape == lwir_img_i.shape
+            assert rgb_img_i.shape[:2] == lwir_img_i.shape[:2]
             h_i, w_i = rgb_img_i.shape[:2]
             # keep_ratio resize
             scale_ratio_i = min(self.img_scale[0] / h_i,
@@ -1501,7 +1708,7 @@ class Mosaic_RGBT:
 
         results['rgb_img'] = rgb_mosaic_img
         results['lwir_img'] = lwir_mosaic_img
-        assert rgb_mosaic_img.shape == lwir_mosaic_img.shape
+        assert rgb_mosaic_img.shape[:2] == lwir_mosaic_img.shape[:2]
         results['img_shape'] = rgb_mosaic_img.shape
         results['gt_bboxes'] = mosaic_bboxes
         results['gt_labels'] = mosaic_labels
@@ -1660,7 +1867,7 @@ class RandomAffineRGBT:
     def __call__(self, results):
         rgb_img = results['rgb_img']
         lwir_img = results['lwir_img']
-        assert rgb_img.shape == lwir_img.shape
+        assert rgb_img.shape[:2] == lwir_img.shape[:2]
         height = rgb_img.shape[0] + self.border[0] * 2
         width = rgb_img.shape[1] + self.border[1] * 2
 
@@ -1835,7 +2042,10 @@ class FillRGBTIgnoredBoxRegionsByMeanValues:
             for box in gt_bboxes_ignore:
                 box = list(map(int, box))
                 rgb_img[box[1]:box[3], box[0]:box[2], :] = np.reshape(self.rgb_mean[::-1], (1, 1, 3)).astype('uint8')
-                lwir_img[box[1]:box[3], box[0]:box[2], :] = np.reshape(self.lwir_mean[::-1], (1, 1, 3)).astype('uint8')
+                if lwir_img.ndim == 2:  # single channel lwir image
+                    lwir_img[box[1]:box[3], box[0]:box[2]] = np.uint8(self.lwir_mean[0])
+                else:
+                    lwir_img[box[1]:box[3], box[0]:box[2], :] = np.reshape(self.lwir_mean[::-1], (1, 1, 3)).astype('uint8')
             # for box in gt_bboxes:
             #     box = list(map(int, box))
             #     rgb_img[box[1]:box[3], box[0]:box[2], :] = rgb_img_ori[box[1]:box[3], box[0]:box[2], :]
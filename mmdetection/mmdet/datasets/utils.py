@@ -15,6 +15,7 @@ from mmdet.models.roi_heads.mask_heads import FusedSemanticHead
 def replace_ImageToTensor(pipelines):
     """Replace the ImageToTensor transform in a data pipeline to
     DefaultFormatBundle, which is normally useful in batch inference.
+    RGBTImageToTensor is replaced by DefaultFormatBundleRGBT likewise.
 
     Args:
         pipelines (list[dict]): Data pipeline configs.
@@ -58,7 +59,7 @@ def replace_ImageToTensor(pipelines):
     """
     pipelines = copy.deepcopy(pipelines)
     for i, pipeline in enumerate(pipelines):
-        if pipeline['type'] == 'MultiScaleFlipAug':
+        if pipeline['type'] in ('MultiScaleFlipAug', 'MultiScaleFlipAugRGBT'):
             assert 'transforms' in pipeline
             pipeline['transforms'] = replace_ImageToTensor(
                 pipeline['transforms'])
@@ -69,6 +70,10 @@ def replace_ImageToTensor(pipelines):
                 'recommended to manually replace it in the test '
                 'data pipeline in your config file.', UserWarning)
             pipelines[i] = {'type': 'DefaultFormatBundle'}
+        elif pipeline['type'] == 'RGBTImageToTensor':
+            # the rgbt test pipelines all use RGBTImageToTensor, so it is
+            # replaced silently
+            pipelines[i] = {'type': 'DefaultFormatBundleRGBT'}
     return pipelines
 
 
@@ -9,7 +9,8 @@ from mmcv.runner import BaseModule
 from torch.nn.modules.batchnorm import _BatchNorm
 
 from ..builder import BACKBONES
-from ..utils.res_layer_shareConv_notshareBN import ResLayer_shareConv_notShareBN
+from ..utils.res_layer_shareConv_notshareBN import (
+    ResLayer_shareConv_notShareBN, modality_split_norm)
 
 
 class BasicBlock(BaseModule):
@@ -82,45 +83,34 @@ class BasicBlock(BaseModule):
         return getattr(self, self.norm2_name_notShare)
 
     def forward(self, x):
-        rgb_x, lwir_x = x
-        """Forward function."""
+        """Forward function of the rgb and lwir features stacked along the
+        batch dimension."""
+
+        def _inner_forward(x):
+            identity = x
 
-        def _inner_forward(rgb_x, lwir_x):
-            rgb_identity, lwir_identity = rgb_x, lwir_x
-
-            # conv1
-            rgb_out = self.conv1(rgb_x)
-            lwir_out = self.conv1(lwir_x)
-            # norm1
-            rgb_out = self.norm1(rgb_out)
-            lwir_out = self.norm1_notShare(lwir_out)
-            rgb_out = self.relu(rgb_out)
-            lwir_out = self.relu(lwir_out)
-
-            # conv2
-            rgb_out = self.conv2(rgb_out)
-            lwir_out = self.conv2(lwir_out)
-            # norm2
-            rgb_out = self.norm2(rgb_out)
-            lwir_out = self.norm2_notShare(lwir_out)
+            out = self.conv1(x)
+            out = modality_split_norm(out, self.norm1, self.norm1_notShare)
+            out = self.relu(out)
+
+            out = self.conv2(out)
+            out = modality_split_norm(out, self.norm2, self.norm2_notShare)
 
             if self.downsample is not None:
-                rgb_identity, lwir_identity = self.downsample(tuple([rgb_x, lwir_x]))
+                identity = self.downsample(x)
 
-            rgb_out = rgb_out + rgb_identity
-            lwir_out = lwir_out + lwir_identity
+            out += identity
 
-            return rgb_out, lwir_out
+            return out
 
-        if self.with_cp and rgb_x.requires_grad and lwir_x.requires_grad:
-            raise NotImplementedError
+        if self.with_cp and x.requires_grad:
+            out = cp.checkpoint(_inner_forward, x, use_reentrant=False)
         else:
-            rgb_out, lwir_out = _inner_forward(rgb_x, lwir_x)
+            out = _inner_forward(x)
 
-        rgb_out = self.relu(rgb_out)
-        lwir_out = self.relu(lwir_out)
+        out = self.relu(out)
 
-        return tuple([rgb_out, lwir_out])
+        return out
 
 
 class Bottleneck(BaseModule):
@@ -269,61 +259,46 @@ class Bottleneck(BaseModule):
         return getattr(self, self.norm3_name)
 
     def forward(self, x):
-        rgb_x, lwir_x = x
-        """Forward function."""
+        """Forward function of the rgb and lwir features stacked along the
+        batch dimension."""
 
-        def _inner_forward(rgb_x, lwir_x):
-            rgb_identity, lwir_identity = rgb_x, lwir_x
-            # conv1
-            rgb_out = self.conv1(rgb_x)
-            lwir_out = self.conv1(lwir_x)
-            # norm1
-            cat_out = self.norm1(torch.cat([rgb_out, lwir_out], 1))
-            cat_out = self.relu(cat_out)
-            rgb_out, lwir_out = torch.chunk(cat_out, 2, 1)
+        def _inner_forward(x):
+            identity = x
+            out = self.conv1(x)
+            out = modality_split_norm(out, self.norm1)
+            out = self.relu(out)
 
             if self.with_plugins:
                 raise NotImplementedError
 
-            # conv2
-            rgb_out = self.conv2(rgb_out)
-            lwir_out = self.conv2(lwir_out)
-            # norm2
-            cat_out = self.norm2(torch.cat([rgb_out, lwir_out], 1))
-            cat_out = self.relu(cat_out)
-            rgb_out, lwir_out = torch.chunk(cat_out, 2, 1)
+            out = self.conv2(out)
+            out = modality_split_norm(out, self.norm2)
+            out = self.relu(out)
 
             if self.with_plugins:
                 raise NotImplementedError
 
-            # conv3
-            rgb_out = self.conv3(rgb_out)
-            lwir_out = self.conv3(lwir_out)
-            # norm3
-            cat_out = self.norm3(torch.cat([rgb_out, lwir_out], 1))
-            rgb_out, lwir_out = torch.chunk(cat_out, 2, 1)
+            out = self.conv3(out)
+            out = modality_split_norm(out, self.norm3)
 
             if self.with_plugins:
                 raise NotImplementedError
 
-            # downsample
             if self.downsample is not None:
-                rgb_identity, lwir_identity = self.downsample(tuple([rgb_x, lwir_x]))
+                identity = self.downsample(x)
 
-            rgb_out = rgb_out + rgb_identity
-            lwir_out = lwir_out + lwir_identity
+            out += identity
 
-            return rgb_out, lwir_out
+            return out
 
-        if self.with_cp and rgb_x.requires_grad and lwir_x.requires_grad:
-            raise NotImplementedError
+        if self.with_cp and x.requires_grad:
+            out = cp.checkpoint(_inner_forward, x, use_reentrant=False)
         else:
-            rgb_out, lwir_out = _inner_forward(rgb_x, lwir_x)
+            out = _inner_forward(x)
 
-        rgb_out = self.relu(rgb_out)
-        lwir_out = self.relu(lwir_out)
+        out = self.relu(out)
 
-        return tuple([rgb_out, lwir_out])
+        return out
 
 
 @BACKBONES.register_module()
@@ -361,6 +336,10 @@ class ResNet_ShareConv_notShareBN(BaseModule):
               should be same as 'num_stages'.
         with_cp (bool): Use checkpoint or not. Using checkpoint will save some
             memory while slowing down the training speed.
+        stage_with_cp (Sequence[bool], optional): Whether to use checkpoint
+            in each stage, which overrides ``with_cp``, e.g.
+            ``(True, True, False, False)`` only recomputes the activations
+            of the two high resolution stages. Default: None.
         zero_init_residual (bool): Whether to use zero init for last norm layer
             in resblocks to let them behave as identity.
         pretrained (str, optional): model pretrained path. Default: None
@@ -410,6 +389,7 @@ class ResNet_ShareConv_notShareBN(BaseModule):
                  stage_with_dcn=(False, False, False, False),
                  plugins=None,
                  with_cp=False,
+                 stage_with_cp=None,
                  zero_init_residual=True,
                  pretrained=None,
                  init_cfg=None):
@@ -473,6 +453,9 @@ class ResNet_ShareConv_notShareBN(BaseModule):
         self.stage_with_dcn = stage_with_dcn
         if dcn is not None:
             assert len(stage_with_dcn) == num_stages
+        self.stage_with_cp = stage_with_cp
+        if stage_with_cp is not None:
+            assert len(stage_with_cp) == num_stages
         self.plugins = plugins
         self.block, stage_blocks = self.arch_settings[depth]
         self.stage_blocks = stage_blocks[:num_stages]
@@ -485,6 +468,7 @@ class ResNet_ShareConv_notShareBN(BaseModule):
             stride = strides[i]
             dilation = dilations[i]
             dcn = self.dcn if self.stage_with_dcn[i] else None
+            stage_cp = with_cp if stage_with_cp is None else stage_with_cp[i]
             if plugins is not None:
                 stage_plugins = self.make_stage_plugins(plugins, i)
             else:
@@ -499,7 +483,7 @@ class ResNet_ShareConv_notShareBN(BaseModule):
                 dilation=dilation,
                 style=self.style,
                 avg_down=self.avg_down,
-                with_cp=with_cp,
+                with_cp=stage_cp,
                 conv_cfg=conv_cfg,
                 norm_cfg=norm_cfg,
                 dcn=dcn,
@@ -632,25 +616,25 @@ class ResNet_ShareConv_notShareBN(BaseModule):
 
     def forward(self, rgb_x, lwir_x):
         """Forward function."""
+        # the shared convs run once on both modalities stacked along the
+        # batch dimension, each modality keeps its own norm layers
+        x = torch.cat([rgb_x, lwir_x])
         if self.deep_stem:
             # 因为我没有使用ResNetv1d,所以不实现deep_stem
             raise NotImplementedError
         else:
-            rgb_x = self.conv1(rgb_x)
-            lwir_x = self.conv1(lwir_x)
-            rgb_x = self.norm1(rgb_x)
-            lwir_x = self.norm1_notShare(lwir_x)
-            rgb_x = self.relu(rgb_x)
-            lwir_x = self.relu(lwir_x)
-
-        rgb_x = self.maxpool(rgb_x)
-        lwir_x = self.maxpool(lwir_x)
+            x = self.conv1(x)
+            x = modality_split_norm(x, self.norm1, self.norm1_notShare)
+            x = self.relu(x)
+
+        x = self.maxpool(x)
         rgb_outs = []
         lwir_outs = []
         for i, layer_name in enumerate(self.res_layers):
             res_layer = getattr(self, layer_name)
-            rgb_x, lwir_x = res_layer(tuple([rgb_x, lwir_x]))
+            x = res_layer(x)
             if i in self.out_indices:
+                rgb_x, lwir_x = x.chunk(2)
                 rgb_outs.append(rgb_x)
                 lwir_outs.append(lwir_x)
         return tuple(rgb_outs), tuple(lwir_outs)
@@ -358,3 +358,70 @@ class BaseDetector(BaseModule, metaclass=ABCMeta):
     def onnx_export(self, img, img_metas):
         raise NotImplementedError(f'{self.__class__.__name__} does '
                                   f'not support ONNX EXPORT')
+
+
+class RGBTAsyncTestMixin:
+    """Async test of the two-stage RGB-T detectors.
+
+    Mixed in before :class:`BaseDetector`, it takes the ``rgb_img`` and
+    ``lwir_img`` of a pair instead of ``img``, and runs the fused features
+    of ``extract_feat`` through the awaited RPN and roi head, mirroring
+    ``simple_test``.
+    """
+
+    async def async_simple_test(self,
+                                rgb_img,
+                                lwir_img,
+                                img_meta,
+                                proposals=None,
+                                rescale=False):
+        """Async test without augmentation."""
+        assert self.with_bbox, 'Bbox head must be implemented.'
+        x = self.extract_feat(rgb_img, lwir_img)
+
+        if proposals is None:
+            proposal_list = await self.rpn_head.async_simple_test_rpn(
+                x, img_meta)
+        else:
+            proposal_list = proposals
+
+        return await self.roi_head.async_simple_test(
+            x, proposal_list, img_meta, rescale=rescale)
+
+    async def aforward_test(self, *, rgb_img, lwir_img, img_metas, **kwargs):
+        """
+        Args:
+            rgb_img (List[Tensor]): The RGB images of each augmentation,
+                of shape (1, C, H, W).
+            lwir_img (List[Tensor]): The LWIR images, in the same layout.
+            img_metas (List[List[dict]]): The image metas of each
+                augmentation.
+        """
+        for var, name in [(rgb_img, 'rgb_img'), (lwir_img, 'lwir_img'),
+                          (img_metas, 'img_metas')]:
+            if not isinstance(var, list):
+                raise TypeError(f'{name} must be a list, but got {type(var)}')
+
+        num_augs = len(rgb_img)
+        if num_augs != len(lwir_img):
+            raise ValueError(f'num of rgb images ({num_augs}) '
+                             f'!= num of lwir images ({len(lwir_img)})')
+        if num_augs != len(img_metas):
+            raise ValueError(f'num of augmentations ({num_augs}) '
+                             f'!= num of image metas ({len(img_metas)})')
+        if num_augs != 1:
+            raise NotImplementedError(
+                f'{self.__class__.__name__} does not support async test '
+                'with test-time augmentation')
+        if rgb_img[0].size(0) != 1:
+            raise ValueError('async test only supports samples_per_gpu=1, '
+                             f'but got {rgb_img[0].size(0)}')
+        if rgb_img[0].size()[-2:] != lwir_img[0].size()[-2:]:
+            raise ValueError(
+                f'rgb image of size {tuple(rgb_img[0].size()[-2:])} and '
+                f'lwir image of size {tuple(lwir_img[0].size()[-2:])} '
+                'are not aligned')
+
+        img_metas[0][0]['batch_input_shape'] = tuple(rgb_img[0].size()[-2:])
+        return await self.async_simple_test(rgb_img[0], lwir_img[0],
+                                            img_metas[0], **kwargs)
@@ -6,6 +6,7 @@ import torch
 
 from .single_stage import SingleStageDetector
 from ..builder import DETECTORS, build_backbone
+from ..utils.zx_lwir_stem import fold_lwir_stem
 import torch.nn as nn
 from mmcv.runner import auto_fp16
 
@@ -47,6 +48,9 @@ class DETR_RGBT(SingleStageDetector):
             self.lwir_backbone = self.rgb_backbone
         else:
             self.lwir_backbone = build_backbone(backbone)
+        # `lwir_in_channels=1` takes single channel lwir images, see LoadRGBTFromFile(lwir_color_type='grayscale')
+        if self.share_weights.get('lwir_in_channels', 3) == 1:
+            fold_lwir_stem(self.lwir_backbone)
 
         self.conv = nn.Sequential(nn.Conv2d(4096, 2048, 1), nn.ReLU(), nn.Conv2d(2048, 2048, 1))
 
@@ -73,7 +77,7 @@ class DETR_RGBT(SingleStageDetector):
         warnings.warn('Warning! MultiheadAttention in DETR does not '
                       'support flops computation! Do not use the '
                       'results in your papers!')
-        assert rgb_img.shape == lwir_img.shape
+        assert rgb_img.shape[-2:] == lwir_img.shape[-2:]
         batch_size, _, height, width = rgb_img.shape
         dummy_img_metas = [
             dict(
@@ -167,7 +171,7 @@ class DETR_RGBT(SingleStageDetector):
         for rgb_img, lwir_img, img_meta in zip(rgb_imgs, lwir_imgs, img_metas):
             batch_size = len(img_meta)
             for img_id in range(batch_size):
-                assert rgb_img.size() == lwir_img.size()
+                assert rgb_img.size()[-2:] == lwir_img.size()[-2:]
                 img_meta[img_id]['batch_input_shape'] = tuple(rgb_img.size()[-2:])
 
         if num_augs == 1:
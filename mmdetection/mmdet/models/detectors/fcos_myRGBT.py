@@ -12,6 +12,8 @@ from mmcv.runner import auto_fp16
 from mmcv.cnn import ConvModule, build_conv_layer, build_norm_layer
 import collections
 from ..utils.csp_layer import CSPLayer
+from ..utils.zx_gt_mask import get_batch_gt_mask
+from ..utils.zx_lwir_stem import fold_lwir_stem
 import torch.nn.functional as F
 from ..backbones.resnet import Bottleneck
 
@@ -43,6 +45,9 @@ class FCOS_RGBT(BaseDetector):
             self.lwir_backbone = self.rgb_backbone
         else:
             self.lwir_backbone = build_backbone(backbone)
+        # `lwir_in_channels=1` takes single channel lwir images, see LoadRGBTFromFile(lwir_color_type='grayscale')
+        if share_weights.get('lwir_in_channels', 3) == 1:
+            fold_lwir_stem(self.lwir_backbone)
         if neck is not None:
             self.neck = build_neck(neck)
         bbox_head.update(train_cfg=train_cfg)
@@ -355,18 +360,11 @@ class TargetAwareFusion(nn.Module):
                 self.add_module(f'bottomUpLayer{layer_idx}', zxBottleneck(in_c, in_channels[layer_idx], 2,))
                 self.downsample_layers.append(f'bottomUpLayer{layer_idx}')
 
-    def get_batch_mask(self, masks):
-        batch_mask = []
-        for mask in masks:
-            mask1img = np.clip(np.sum(mask.masks, 0, keepdims=True), 0, 1)
-            batch_mask.append(mask1img)
-        return torch.from_numpy(np.asarray(batch_mask, np.float32))
-
     def forward(self, rgb_x, lwir_x, gt_masks):
         assert len(rgb_x) == len(self.fusion_layers) == len(lwir_x)
 
         if gt_masks is not None:
-            batch_gt_masks = self.get_batch_mask(gt_masks)
+            batch_gt_masks = get_batch_gt_mask(gt_masks, rgb_x[0].device)
             loss_mask = 0
 
         results = []
@@ -379,7 +377,7 @@ class TargetAwareFusion(nn.Module):
             assert tmp_rx.shape == tmp_lx.shape
             bs, c, h, w = tmp_rx.shape
             if gt_masks is not None and pred_mask is not None:
-                gt_mask_1level = F.interpolate(batch_gt_masks, (h, w), mode='nearest').to(pred_mask.device)
+                gt_mask_1level = F.interpolate(batch_gt_masks, (h, w), mode='nearest')
                 loss_mask_ = self.diceBCELoss(pred_mask, gt_mask_1level)
                 loss_mask += loss_mask_
 
@@ -5,13 +5,14 @@ import torch.nn as nn
 import torchvision.ops
 from mmcv.cnn import ConvModule, ContextBlock, DepthwiseSeparableConvModule
 from ..builder import DETECTORS, build_backbone, build_head, build_neck
-from .base import BaseDetector
+from ..utils.zx_lwir_stem import fold_lwir_stem
+from .base import BaseDetector, RGBTAsyncTestMixin
 from mmcv.runner import auto_fp16
 import torch
 
 
 @DETECTORS.register_module()
-class FasterRCNN_RGBT(BaseDetector):
+class FasterRCNN_RGBT(RGBTAsyncTestMixin, BaseDetector):
     def __init__(self,
                  share_weights:[bool, dict],
                  backbone,
@@ -46,6 +47,9 @@ class FasterRCNN_RGBT(BaseDetector):
             self.lwir_backbone = self.rgb_backbone
         else:
             self.lwir_backbone = build_backbone(backbone)
+        # `lwir_in_channels=1` takes single channel lwir images, see LoadRGBTFromFile(lwir_color_type='grayscale')
+        if self.share_weights.get('lwir_in_channels', 3) == 1:
+            fold_lwir_stem(self.lwir_backbone)
 
         '''neck'''
         if neck is not None:
@@ -210,7 +214,19 @@ class FasterRCNN_RGBT(BaseDetector):
                                 proposals=None,
                                 rescale=False):
         """Async test without augmentation."""
-        raise NotImplementedError
+        assert self.with_bbox, 'Bbox head must be implemented.'
+        rgb_x, lwir_x, rgbT_x = self.extract_feat(rgb_img, lwir_img)
+
+        if proposals is None:
+            rgb_proposal_list = await self.rgb_rpn_head.async_simple_test_rpn(rgb_x, img_meta)
+            lwir_proposal_list = await self.lwir_rpn_head.async_simple_test_rpn(lwir_x, img_meta)
+
+            rgbT_proposal_list = self.merge_proposals(rgb_proposal_list, lwir_proposal_list)
+        else:
+            rgbT_proposal_list = proposals
+
+        return await self.roi_head.async_simple_test(
+            rgbT_x, rgbT_proposal_list, img_meta, rescale=rescale)
 
     def simple_test(self, rgb_img, lwir_img, img_metas, proposals=None, rescale=False):
         """Test without augmentation."""
@@ -247,7 +263,7 @@ class FasterRCNN_RGBT(BaseDetector):
         for rgb_img, lwir_img, img_meta in zip(rgb_imgs, lwir_imgs, img_metas):
             batch_size = len(img_meta)
             for img_id in range(batch_size):
-                assert rgb_img.size() == lwir_img.size()
+                assert rgb_img.size()[-2:] == lwir_img.size()[-2:]
                 img_meta[img_id]['batch_input_shape'] = tuple(rgb_img.size()[-2:])
 
         if num_augs == 1:
@@ -7,15 +7,17 @@ import numpy as np
 from mmcv.runner import auto_fp16
 from mmcv.cnn import ConvModule, build_conv_layer, build_norm_layer
 from ..utils.csp_layer import CSPLayer
+from ..utils.zx_gt_mask import get_batch_gt_mask
+from ..utils.zx_lwir_stem import fold_lwir_stem
 from ..builder import DETECTORS, build_backbone, build_head, build_neck, build_loss
-from .base import BaseDetector
+from .base import BaseDetector, RGBTAsyncTestMixin
 from ..backbones.resnet import Bottleneck
 
 import matplotlib.pyplot as plt
 
 
 @DETECTORS.register_module()
-class FasterRCNN_RGBTwMask(BaseDetector):
+class FasterRCNN_RGBTwMask(RGBTAsyncTestMixin, BaseDetector):
     def __init__(self,
                  share_weights,
                  backbone,
@@ -41,6 +43,9 @@ class FasterRCNN_RGBTwMask(BaseDetector):
         self.backbone = build_backbone(backbone)
         if not self.share_weights['backbone']:
             self.lwir_backbone = build_backbone(backbone)
+        # `lwir_in_channels=1` takes single channel lwir images, see LoadRGBTFromFile(lwir_color_type='grayscale')
+        if self.share_weights.get('lwir_in_channels', 3) == 1:
+            fold_lwir_stem(getattr(self, 'lwir_backbone', self.backbone))
 
         '''neck'''
         if neck is not None:
@@ -173,9 +178,6 @@ class FasterRCNN_RGBTwMask(BaseDetector):
 
         return losses
 
-    async def async_simple_test(self, rgb_img, lwir_img, img_meta, proposals=None, rescale=False):
-        raise NotImplementedError
-
     def simple_test(self, rgb_img, lwir_img, img_metas, proposals=None, rescale=False):
         """Test without augmentation."""
 
@@ -206,7 +208,7 @@ class FasterRCNN_RGBTwMask(BaseDetector):
         for rgb_img, lwir_img, img_meta in zip(rgb_imgs, lwir_imgs, img_metas):
             batch_size = len(img_meta)
             for img_id in range(batch_size):
-                assert rgb_img.size() == lwir_img.size()
+                assert rgb_img.size()[-2:] == lwir_img.size()[-2:]
                 img_meta[img_id]['batch_input_shape'] = tuple(rgb_img.size()[-2:])
 
         if num_augs == 1:
@@ -235,7 +237,7 @@ class FasterRCNN_RGBTwMask(BaseDetector):
             return self.forward_test(rgb_img, lwir_img, img_metas, **kwargs)
 
     def onnx_export(self, rgb_img, lwir_img, img_metas):
-        assert rgb_img.shape == lwir_img.shape
+        assert rgb_img.shape[-2:] == lwir_img.shape[-2:]
         img_shape = torch._shape_as_tensor(rgb_img)[2:]
         img_metas[0]['img_shape_for_onnx'] = img_shape
         x = self.extract_feat(rgb_img, lwir_img)
@@ -396,19 +398,12 @@ class TargetAwareFusion(nn.Module):
                 self.add_module(f'bottomUpLayer{layer_idx}', zxBottleneck(in_c, in_channels[layer_idx], 2,))
                 self.downsample_layers.append(f'bottomUpLayer{layer_idx}')
 
-    def get_batch_mask(self, masks):
-        batch_mask = []
-        for mask in masks:
-            mask1img = np.clip(np.sum(mask.masks, 0, keepdims=True), 0, 1)
-            batch_mask.append(mask1img)
-        return torch.from_numpy(np.asarray(batch_mask, np.float32))
-
     def forward(self, rgb_x, lwir_x, gt_masks):
         rgb_x = rgb_x if isinstance(rgb_x, tuple) else [rgb_x]
         lwir_x = lwir_x if isinstance(lwir_x, tuple) else [lwir_x]
 
         if gt_masks is not None:
-            batch_gt_masks = self.get_batch_mask(gt_masks)
+            batch_gt_masks = get_batch_gt_mask(gt_masks, rgb_x[0].device)
             loss_mask = 0
 
         fused_results = []
@@ -435,7 +430,7 @@ class TargetAwareFusion(nn.Module):
             assert tmp_rx.shape == tmp_lx.shape
             bs, c, h, w = tmp_rx.shape
             if gt_masks is not None:
-                gt_mask_1level = F.interpolate(batch_gt_masks, (h, w), mode='nearest').to(pred_mask.device)
+                gt_mask_1level = F.interpolate(batch_gt_masks, (h, w), mode='nearest')
                 loss_mask_ = self.diceBCELoss(pred_mask, gt_mask_1level)
                 loss_mask += loss_mask_
         if gt_masks is not None:
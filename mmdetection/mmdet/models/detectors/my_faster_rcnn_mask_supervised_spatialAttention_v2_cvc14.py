@@ -14,15 +14,17 @@ import numpy as np
 from mmcv.runner import auto_fp16
 from mmcv.cnn import ConvModule, build_conv_layer, build_norm_layer, DepthwiseSeparableConvModule
 from ..utils.csp_layer import CSPLayer
+from ..utils.zx_gt_mask import get_batch_gt_mask
+from ..utils.zx_lwir_stem import fold_lwir_stem
 from ..builder import DETECTORS, build_backbone, build_head, build_neck, build_loss
-from .base import BaseDetector
+from .base import BaseDetector, RGBTAsyncTestMixin
 from ..backbones.resnet import Bottleneck
 
 import matplotlib.pyplot as plt
 
 
 @DETECTORS.register_module()
-class FasterRCNN_RGBTwMask_wSpaAttV2_CVC14(BaseDetector):
+class FasterRCNN_RGBTwMask_wSpaAttV2_CVC14(RGBTAsyncTestMixin, BaseDetector):
     def __init__(self,
                  share_weights,
                  backbone,
@@ -49,6 +51,9 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_CVC14(BaseDetector):
         self.backbone = build_backbone(backbone)
         if not self.share_weights['backbone']:
             self.lwir_backbone = build_backbone(backbone)
+        # `lwir_in_channels=1` takes single channel lwir images, see LoadRGBTFromFile(lwir_color_type='grayscale')
+        if self.share_weights.get('lwir_in_channels', 3) == 1:
+            fold_lwir_stem(getattr(self, 'lwir_backbone', self.backbone))
 
         '''neck'''
         if neck is not None:
@@ -186,9 +191,6 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_CVC14(BaseDetector):
 
         return losses
 
-    async def async_simple_test(self, rgb_img, lwir_img, img_meta, proposals=None, rescale=False):
-        raise NotImplementedError
-
     def simple_test(self, rgb_img, lwir_img, img_metas, proposals=None, rescale=False):
         """Test without augmentation."""
 
@@ -219,7 +221,7 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_CVC14(BaseDetector):
         for rgb_img, lwir_img, img_meta in zip(rgb_imgs, lwir_imgs, img_metas):
             batch_size = len(img_meta)
             for img_id in range(batch_size):
-                assert rgb_img.size() == lwir_img.size()
+                assert rgb_img.size()[-2:] == lwir_img.size()[-2:]
                 img_meta[img_id]['batch_input_shape'] = tuple(rgb_img.size()[-2:])
 
         if num_augs == 1:
@@ -248,7 +250,7 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_CVC14(BaseDetector):
             return self.forward_test(rgb_img, lwir_img, img_metas, **kwargs)
 
     def onnx_export(self, rgb_img, lwir_img, img_metas):
-        assert rgb_img.shape == lwir_img.shape
+        assert rgb_img.shape[-2:] == lwir_img.shape[-2:]
         img_shape = torch._shape_as_tensor(rgb_img)[2:]
         img_metas[0]['img_shape_for_onnx'] = img_shape
         x = self.extract_feat(rgb_img, lwir_img)
@@ -346,13 +348,6 @@ class TargetAwareFusion(nn.Module):
             self.spatial_att_layers.append(f'spatialAttLayer{layer_idx}')
 
 
-    def get_batch_mask(self, masks):
-        batch_mask = []
-        for mask in masks:
-            mask1img = np.clip(np.sum(mask.masks, 0, keepdims=False), 0, 1)
-            batch_mask.append(mask1img)
-        return np.asarray(batch_mask, np.float32)
-
     def _neg_entropy(self, logits):
         logits = logits.squeeze(-1).squeeze(-1)
         probs = F.softmax(logits, -1)
@@ -363,7 +358,7 @@ class TargetAwareFusion(nn.Module):
         lwir_x = lwir_x if isinstance(lwir_x, tuple) else [lwir_x]
 
         if gt_masks is not None:
-            batch_gt_masks = self.get_batch_mask(gt_masks)
+            batch_gt_masks = get_batch_gt_mask(gt_masks, rgb_x[0].device)
             loss_mask = 0
 
         bu_results_wSpaAtt = []
@@ -387,12 +382,7 @@ class TargetAwareFusion(nn.Module):
             assert tmp_rx.shape == tmp_lx.shape
             bs, c, h, w = tmp_rx.shape
             if gt_masks is not None:
-                assert bs == len(batch_gt_masks)
-                resized_gt_mask = np.empty((bs, 1, h, w), np.float32)
-                for mask_idx, tmp_gt_mask in enumerate(batch_gt_masks):
-                    resized_gt_mask[mask_idx, ...] =\
-                        np.expand_dims(np.array(Image.fromarray(tmp_gt_mask).resize((w, h), resample=Image.NEAREST)), 0)
-                gt_mask_1level = torch.from_numpy(resized_gt_mask).to(pred_mask.device)
+                gt_mask_1level = F.interpolate(batch_gt_masks, (h, w), mode='nearest-exact')
                 assert gt_mask_1level.requires_grad is False, 'the ground-truth mask should not be updated'
                 loss_mask_ = self.diceBCELoss(pred_mask, gt_mask_1level)
                 loss_mask += loss_mask_
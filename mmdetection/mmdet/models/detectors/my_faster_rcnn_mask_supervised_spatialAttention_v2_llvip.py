@@ -9,20 +9,24 @@ import copy
 import torch
 import torch.nn.functional as F
 import torch.nn as nn
+import torch.utils.checkpoint as cp
 import numpy as np
 
 from mmcv.runner import auto_fp16
 from mmcv.cnn import ConvModule, build_conv_layer, build_norm_layer, DepthwiseSeparableConvModule
 from ..utils.csp_layer import CSPLayer
+from ..utils.zx_gt_mask import get_batch_gt_mask
+from ..utils.zx_lwir_stem import fold_lwir_stem
+from ..utils.zx_modality_stack import forward_stacked_modalities, has_training_bn
 from ..builder import DETECTORS, build_backbone, build_head, build_neck, build_loss
-from .base import BaseDetector
+from .base import BaseDetector, RGBTAsyncTestMixin
 from ..backbones.resnet import Bottleneck
 
 import matplotlib.pyplot as plt
 
 
 @DETECTORS.register_module()
-class FasterRCNN_RGBTwMask_wSpaAttV2_LLVIP(BaseDetector):
+class FasterRCNN_RGBTwMask_wSpaAttV2_LLVIP(RGBTAsyncTestMixin, BaseDetector):
     def __init__(self,
                  share_weights,
                  backbone,
@@ -38,6 +42,9 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_LLVIP(BaseDetector):
 
         for _k in ['backbone']:
             assert _k in list(share_weights.keys())
+        # `stack_modalities` runs the shared backbone once on the batch-stacked rgb/lwir images
+        if share_weights.get('stack_modalities', False):
+            assert share_weights['backbone'], 'stack_modalities requires a shared backbone'
         self.share_weights = share_weights
 
         ''''backbone'''
@@ -49,6 +56,9 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_LLVIP(BaseDetector):
         self.backbone = build_backbone(backbone)
         if not self.share_weights['backbone']:
             self.lwir_backbone = build_backbone(backbone)
+        # `lwir_in_channels=1` takes single channel lwir images, see LoadRGBTFromFile(lwir_color_type='grayscale')
+        if self.share_weights.get('lwir_in_channels', 3) == 1:
+            fold_lwir_stem(getattr(self, 'lwir_backbone', self.backbone))
 
         '''neck'''
         if neck is not None:
@@ -82,7 +92,8 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_LLVIP(BaseDetector):
                                      norm_cfg=taf_cfg['norm_cfg'],
                                      act_cfg=taf_cfg['act_cfg'],
                                      dice_weight=taf_cfg['dice_weight'],
-                                     neg_entropy_weight=taf_cfg['neg_entropy_weight'])
+                                     neg_entropy_weight=taf_cfg['neg_entropy_weight'],
+                                     with_cp=taf_cfg.get('with_cp', False))
 
     @property
     def with_rpn(self):
@@ -101,13 +112,19 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_LLVIP(BaseDetector):
 
     def extract_feat(self, rgb_img, lwir_img, gt_masks=None):
         """Directly extract features from the backbone+neck."""
-        rgb_x = self.backbone(rgb_img)
-
-        if self.share_weights['backbone']:
-            assert not hasattr(self, 'lwir_backbone')
-            lwir_x = self.backbone(lwir_img)
+        if self.share_weights.get('stack_modalities', False) and not has_training_bn(self.backbone) \
+                and rgb_img.shape == lwir_img.shape:
+            # batch statistics would mix both modalities, so BN layers in training mode fall back to two calls,
+            # as do single channel lwir images that can not be stacked with the rgb ones
+            rgb_x, lwir_x = forward_stacked_modalities(self.backbone, rgb_img, lwir_img)
         else:
-            lwir_x = self.lwir_backbone(lwir_img)
+            rgb_x = self.backbone(rgb_img)
+
+            if self.share_weights['backbone']:
+                assert not hasattr(self, 'lwir_backbone')
+                lwir_x = self.backbone(lwir_img)
+            else:
+                lwir_x = self.lwir_backbone(lwir_img)
 
 
         # save_dir = '/home/zx/cross-modality-det/code/mmdetection/runs_llvip/FasterRCNN_r50wMask_ROIFocalLoss5_CIOU20_cosineSE_notDetach_negEntropy1/rgbt_feature_cosine_similarities'
@@ -215,9 +232,6 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_LLVIP(BaseDetector):
 
         return losses
 
-    async def async_simple_test(self, rgb_img, lwir_img, img_meta, proposals=None, rescale=False):
-        raise NotImplementedError
-
     def simple_test(self, rgb_img, lwir_img, img_metas, proposals=None, rescale=False):
         """Test without augmentation."""
 
@@ -248,7 +262,7 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_LLVIP(BaseDetector):
         for rgb_img, lwir_img, img_meta in zip(rgb_imgs, lwir_imgs, img_metas):
             batch_size = len(img_meta)
             for img_id in range(batch_size):
-                assert rgb_img.size() == lwir_img.size()
+                assert rgb_img.size()[-2:] == lwir_img.size()[-2:]
                 img_meta[img_id]['batch_input_shape'] = tuple(rgb_img.size()[-2:])
 
         if num_augs == 1:
@@ -277,7 +291,7 @@ class FasterRCNN_RGBTwMask_wSpaAttV2_LLVIP(BaseDetector):
             return self.forward_test(rgb_img, lwir_img, img_metas, **kwargs)
 
     def onnx_export(self, rgb_img, lwir_img, img_metas):
-        assert rgb_img.shape == lwir_img.shape
+        assert rgb_img.shape[-2:] == lwir_img.shape[-2:]
         img_shape = torch._shape_as_tensor(rgb_img)[2:]
         img_metas[0]['img_shape_for_onnx'] = img_shape
         x = self.extract_feat(rgb_img, lwir_img)
@@ -338,8 +352,13 @@ class TargetAwareFusion(nn.Module):
                  norm_cfg,
                  act_cfg,
                  dice_weight,
-                 neg_entropy_weight):
+                 neg_entropy_weight,
+                 with_cp=False):
         super(TargetAwareFusion, self).__init__()
+        # `with_cp` (bool | list[bool]) recomputes the activations of the fusion, mask and spatial attention layers
+        # of every (or of each) level in the backward pass, which saves memory while slowing down the training
+        self.with_cp = with_cp if isinstance(with_cp, (list, tuple)) else [with_cp] * len(in_channels)
+        assert len(self.with_cp) == len(in_channels)
 
         self.diceBCELoss = DiceBCELoss(dice_weight)
         self.neg_entropy_weight = neg_entropy_weight
@@ -375,24 +394,37 @@ class TargetAwareFusion(nn.Module):
             self.spatial_att_layers.append(f'spatialAttLayer{layer_idx}')
 
 
-    def get_batch_mask(self, masks):
-        batch_mask = []
-        for mask in masks:
-            mask1img = np.clip(np.sum(mask.masks, 0, keepdims=False), 0, 1)
-            batch_mask.append(mask1img)
-        return np.asarray(batch_mask, np.float32)
-
     def _neg_entropy(self, logits):
         logits = logits.squeeze(-1).squeeze(-1)
         probs = F.softmax(logits, -1)
         return torch.mean(torch.sum(probs * F.log_softmax(logits, -1), -1), 0)
 
+    def _forward_level(self, layer_idx, rgb_x, lwir_x):
+        """Fuse the features of one level.
+
+        Returns:
+            tuple[Tensor]: The predicted mask, the logits of the cosine
+                similarity gate and the fused features.
+        """
+        fused_res = getattr(self, self.fusion_layers[layer_idx])(torch.cat([rgb_x, lwir_x], 1))
+
+        # mask supervision
+        pred_mask = getattr(self, self.mask_layers[layer_idx])(fused_res)
+
+        # refine the fused result by the cosine similarity between the pred_mask and the first fused result
+        similarity_value = self.cos(pred_mask.flatten(2), fused_res.flatten(2), 2).unsqueeze(-1).unsqueeze(-1)
+        similarity_logits = getattr(self, self.cosV_conv_layers[layer_idx])(similarity_value)
+        refined_fused_res = self.sigmoid(similarity_logits) * fused_res
+
+        out = getattr(self, self.spatial_att_layers[layer_idx])(refined_fused_res)
+        return pred_mask, similarity_logits, out
+
     def forward(self, rgb_x, lwir_x, gt_masks):
         rgb_x = rgb_x if isinstance(rgb_x, tuple) else [rgb_x]
         lwir_x = lwir_x if isinstance(lwir_x, tuple) else [lwir_x]
 
         if gt_masks is not None:
-            batch_gt_masks = self.get_batch_mask(gt_masks)
+            batch_gt_masks = get_batch_gt_mask(gt_masks, rgb_x[0].device)
             loss_mask = 0
 
         bu_results_wSpaAtt = []
@@ -401,43 +433,23 @@ class TargetAwareFusion(nn.Module):
 
         # np_masks = np.empty((len(self.mask_layers), 512, 640))
 
-        for layer_idx, (tmp_rx, tmp_lx, tmp_fusion_name, tmp_mask_name, tmp_spaAtt_name) in \
-                enumerate(zip(rgb_x, lwir_x, self.fusion_layers, self.mask_layers, self.spatial_att_layers)):
-
-            tmp_fusion_layer = getattr(self, tmp_fusion_name)
-            tmp_fused_res = tmp_fusion_layer(torch.cat([tmp_rx, tmp_lx], 1))
-
-            # mask supervision
-            tmp_mask_layer = getattr(self, tmp_mask_name)
-            pred_mask = tmp_mask_layer(tmp_fused_res)
-
-            # np_masks[layer_idx, ...] = np.array(Image.fromarray(pred_mask.squeeze(0).squeeze(0).detach().cpu().numpy()).resize((640, 512), resample=Image.NEAREST))
-
+        for layer_idx, (tmp_rx, tmp_lx) in enumerate(zip(rgb_x, lwir_x)):
             assert tmp_rx.shape == tmp_lx.shape
+            if self.with_cp[layer_idx] and (tmp_rx.requires_grad or tmp_lx.requires_grad):
+                pred_mask, similarity_logits, tmp_out = cp.checkpoint(
+                    self._forward_level, layer_idx, tmp_rx, tmp_lx, use_reentrant=False)
+            else:
+                pred_mask, similarity_logits, tmp_out = self._forward_level(layer_idx, tmp_rx, tmp_lx)
+
             bs, c, h, w = tmp_rx.shape
             if gt_masks is not None:
-                assert bs == len(batch_gt_masks)
-                resized_gt_mask = np.empty((bs, 1, h, w), np.float32)
-                for mask_idx, tmp_gt_mask in enumerate(batch_gt_masks):
-                    resized_gt_mask[mask_idx, ...] =\
-                        np.expand_dims(np.array(Image.fromarray(tmp_gt_mask).resize((w, h), resample=Image.NEAREST)), 0)
-                gt_mask_1level = torch.from_numpy(resized_gt_mask).to(pred_mask.device)
+                gt_mask_1level = F.interpolate(batch_gt_masks, (h, w), mode='nearest-exact')
                 assert gt_mask_1level.requires_grad is False, 'the ground-truth mask should not be updated'
                 loss_mask_ = self.diceBCELoss(pred_mask, gt_mask_1level)
                 loss_mask += loss_mask_
-
-            # refine the fused result by the cosine similarity between the pred_mask and the first fused result
-            similarity_value = self.cos(pred_mask.flatten(2), tmp_fused_res.flatten(2), 2).unsqueeze(-1).unsqueeze(-1)
-            tmp_cosV_cov_layer = getattr(self, self.cosV_conv_layers[layer_idx])
-            similarity_logits = tmp_cosV_cov_layer(similarity_value)
-            similarity_value = self.sigmoid(similarity_logits)
-            refined_tmp_fused_res = similarity_value * tmp_fused_res
-
-            if gt_masks is not None:
                 loss_mask += self._neg_entropy(similarity_logits) * self.neg_entropy_weight
 
-            tmp_spaAtt_layer = getattr(self, tmp_spaAtt_name)
-            bu_results_wSpaAtt.append(tmp_spaAtt_layer(refined_tmp_fused_res))
+            bu_results_wSpaAtt.append(tmp_out)
 
         # save_path = '/home/zx/cross-modality-det/code/mmdetection/runs/FasterRCNN_vgg16_w_mask_SpaAttV2_ROIFocalLoss5_CIOU20_cosineSE_notDetach_negEntropy1/predMasks'
         # next_id = len(glob(save_path + '/*.png')) + 1
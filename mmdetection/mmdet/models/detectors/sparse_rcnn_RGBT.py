@@ -1,5 +1,6 @@
 from .base import BaseDetector
 from ..builder import DETECTORS, build_backbone, build_head, build_neck
+from ..utils.zx_lwir_stem import fold_lwir_stem
 import warnings
 from mmcv.runner import auto_fp16
 import torch
@@ -42,6 +43,9 @@ class SparseRCNN_RGBT(BaseDetector):
             self.lwir_backbone = self.rgb_backbone
         else:
             self.lwir_backbone = build_backbone(backbone)
+        # `lwir_in_channels=1` takes single channel lwir images, see LoadRGBTFromFile(lwir_color_type='grayscale')
+        if self.share_weights.get('lwir_in_channels', 3) == 1:
+            fold_lwir_stem(self.lwir_backbone)
 
         '''neck'''
         if neck is not None:
@@ -251,7 +255,7 @@ class SparseRCNN_RGBT(BaseDetector):
         for rgb_img, lwir_img, img_meta in zip(rgb_imgs, lwir_imgs, img_metas):
             batch_size = len(img_meta)
             for img_id in range(batch_size):
-                assert rgb_img.size() == lwir_img.size()
+                assert rgb_img.size()[-2:] == lwir_img.size()[-2:]
                 img_meta[img_id]['batch_input_shape'] = tuple(rgb_img.size()[-2:])
 
         if num_augs == 1:
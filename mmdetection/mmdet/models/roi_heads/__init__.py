@@ -15,8 +15,8 @@ from .mask_heads import (CoarseMaskHead, FCNMaskHead, FeatureRelayHead,
 from .mask_scoring_roi_head import MaskScoringRoIHead
 from .pisa_roi_head import PISARoIHead
 from .point_rend_roi_head import PointRendRoIHead
-from .roi_extractors import (BaseRoIExtractor, GenericRoIExtractor,
-                             SingleRoIExtractor)
+from .roi_extractors import (BaseRoIExtractor, DualModalityRoIExtractor,
+                             GenericRoIExtractor, SingleRoIExtractor)
 from .scnet_roi_head import SCNetRoIHead
 from .shared_heads import ResLayer
 from .sparse_roi_head import SparseRoIHead
@@ -31,7 +31,7 @@ __all__ = [
     'StandardRoIHead', 'Shared4Conv1FCBBoxHead', 'DoubleConvFCBBoxHead',
     'FCNMaskHead', 'HTCMaskHead', 'FusedSemanticHead', 'GridHead',
     'MaskIoUHead', 'BaseRoIExtractor', 'GenericRoIExtractor',
-    'SingleRoIExtractor', 'PISARoIHead', 'PointRendRoIHead', 'MaskPointHead',
+    'SingleRoIExtractor', 'DualModalityRoIExtractor', 'PISARoIHead', 'PointRendRoIHead', 'MaskPointHead',
     'CoarseMaskHead', 'DynamicRoIHead', 'SparseRoIHead', 'TridentRoIHead',
     'SCNetRoIHead', 'SCNetMaskHead', 'SCNetSemanticHead', 'SCNetBBoxHead',
     'FeatureRelayHead', 'GlobalContextHead',
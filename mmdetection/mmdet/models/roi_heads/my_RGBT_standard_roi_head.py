@@ -1,13 +1,20 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import sys
+
 import torch
 import torch.nn.functional as F
 from mmdet.core import bbox2result, bbox2roi, build_assigner, build_sampler
 from ..builder import HEADS, build_head, build_roi_extractor
 from .base_roi_head import BaseRoIHead
+from .roi_extractors import DualModalityRoIExtractor
 from .test_mixins import BBoxTestMixin, MaskTestMixin
 import torch.nn as nn
 from mmdet.models.roi_heads.attention.utils import split_feature, merge_splits
 
+if sys.version_info >= (3, 7):
+    from mmdet.utils.contextmanagers import completed
+
+
 @HEADS.register_module()
 class StandardRoIHead_RGBT(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
     """Simplest base roi head including one bbox head and one mask head."""
@@ -74,6 +81,9 @@ class StandardRoIHead_RGBT(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
 
     def init_bbox_head(self, bbox_roi_extractor, bbox_head):
         """Initialize ``bbox_head``"""
+        # rgb和lwir特征的RoI在同一次RoIAlign中提取, 结果与分别调用SingleRoIExtractor相同
+        if bbox_roi_extractor['type'] == 'SingleRoIExtractor':
+            bbox_roi_extractor = dict(bbox_roi_extractor, type='DualModalityRoIExtractor')
         self.bbox_roi_extractor = build_roi_extractor(bbox_roi_extractor)
         self.bbox_head = build_head(bbox_head)
 
@@ -149,10 +159,13 @@ class StandardRoIHead_RGBT(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
     def _bbox_forward(self, rgb_x, lwir_x, rois):
         """Box head forward function used in both training and testing."""
         # TODO: a more flexible way to decide which feature maps to use
-        rgb_bbox_feats = self.bbox_roi_extractor(
-            rgb_x[:self.bbox_roi_extractor.num_inputs], rois)
-        lwir_bbox_feats = self.bbox_roi_extractor(
-            lwir_x[:self.bbox_roi_extractor.num_inputs], rois)
+        num_inputs = self.bbox_roi_extractor.num_inputs
+        if isinstance(self.bbox_roi_extractor, DualModalityRoIExtractor):
+            rgb_bbox_feats, lwir_bbox_feats = self.bbox_roi_extractor(
+                rgb_x[:num_inputs], lwir_x[:num_inputs], rois)
+        else:
+            rgb_bbox_feats = self.bbox_roi_extractor(rgb_x[:num_inputs], rois)
+            lwir_bbox_feats = self.bbox_roi_extractor(lwir_x[:num_inputs], rois)
         if self.with_shared_head:   # False
             rgb_bbox_feats = self.shared_head(rgb_bbox_feats)
             lwir_bbox_feats = self.shared_head(lwir_bbox_feats)
@@ -213,12 +226,51 @@ class StandardRoIHead_RGBT(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
     def _mask_forward(self, x, rois=None, pos_inds=None, bbox_feats=None):
         raise NotImplementedError
 
+    async def async_test_bboxes(self,
+                                rgb_x, lwir_x,
+                                img_metas,
+                                proposals,
+                                rcnn_test_cfg,
+                                rescale=False):
+        """Asynchronized test for box head without augmentation."""
+        rois = bbox2roi(proposals)
+        sleep_interval = rcnn_test_cfg.get('async_sleep_interval', 0.017)
+
+        # the roi features of both modalities are fused inside _bbox_forward,
+        # so the whole box branch is awaited on the stream
+        async with completed(
+                __name__, 'bbox_head_forward',
+                sleep_interval=sleep_interval):
+            bbox_results = self._bbox_forward(rgb_x, lwir_x, rois)
+
+        img_shape = img_metas[0]['img_shape']
+        scale_factor = img_metas[0]['scale_factor']
+        det_bboxes, det_labels = self.bbox_head.get_bboxes(
+            rois,
+            bbox_results['cls_score'],
+            bbox_results['bbox_pred'],
+            img_shape,
+            scale_factor,
+            rescale=rescale,
+            cfg=rcnn_test_cfg)
+        return det_bboxes, det_labels
+
     async def async_simple_test(self,
-                                x,
+                                rgb_x, lwir_x,
                                 proposal_list,
                                 img_metas,
                                 proposals=None,
                                 rescale=False):
+        """Async test without augmentation."""
+        assert self.with_bbox, 'Bbox head must be implemented.'
+
+        det_bboxes, det_labels = await self.async_test_bboxes(
+            rgb_x, lwir_x, img_metas, proposal_list, self.test_cfg,
+            rescale=rescale)
+        bbox_results = bbox2result(det_bboxes, det_labels,
+                                   self.bbox_head.num_classes)
+        if not self.with_mask:
+            return bbox_results
         raise NotImplementedError
 
     def simple_test_bboxes(self,
@@ -1,6 +1,10 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 from .base_roi_extractor import BaseRoIExtractor
+from .dual_modality_roi_extractor import DualModalityRoIExtractor
 from .generic_roi_extractor import GenericRoIExtractor
 from .single_level_roi_extractor import SingleRoIExtractor
 
-__all__ = ['BaseRoIExtractor', 'SingleRoIExtractor', 'GenericRoIExtractor']
+__all__ = [
+    'BaseRoIExtractor', 'SingleRoIExtractor', 'GenericRoIExtractor',
+    'DualModalityRoIExtractor'
+]
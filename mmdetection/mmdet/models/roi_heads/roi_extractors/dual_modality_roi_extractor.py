@@ -0,0 +1,76 @@
+import torch
+from mmcv.runner import force_fp32
+
+from mmdet.models.builder import ROI_EXTRACTORS
+from .single_level_roi_extractor import SingleRoIExtractor
+
+
+@ROI_EXTRACTORS.register_module()
+class DualModalityRoIExtractor(SingleRoIExtractor):
+    """Extract the RoI features of the rgb and lwir feature maps at once.
+
+    The RoIs are mapped to levels once and every level runs a single RoI
+    layer over the channel-stacked rgb and lwir feature maps. The result is
+    the same as calling :class:`SingleRoIExtractor` on each modality.
+
+    Args:
+        roi_layer (dict): Specify RoI layer type and arguments.
+        out_channels (int): Output channels of RoI layers, per modality.
+        featmap_strides (List[int]): Strides of input feature maps.
+        finest_scale (int): Scale threshold of mapping to level 0. Default: 56.
+        init_cfg (dict or list[dict], optional): Initialization config dict.
+            Default: None
+    """
+
+    @force_fp32(apply_to=('rgb_feats', 'lwir_feats'), out_fp16=True)
+    def forward(self, rgb_feats, lwir_feats, rois, roi_scale_factor=None):
+        """Forward function.
+
+        Returns:
+            tuple[Tensor]: The rgb and lwir RoI features, each with shape
+                (k, out_channels, *output_size).
+        """
+        if torch.onnx.is_in_onnx_export():
+            # keep the exported graph of SingleRoIExtractor
+            return (super().forward(rgb_feats, rois, roi_scale_factor),
+                    super().forward(lwir_feats, rois, roi_scale_factor))
+
+        out_size = self.roi_layers[0].output_size
+        num_levels = len(rgb_feats)
+        feats = [
+            torch.cat([rgb_feat, lwir_feat], dim=1)
+            for rgb_feat, lwir_feat in zip(rgb_feats, lwir_feats)
+        ]
+        # [2, k, C, h, w] so that the feature of each modality is contiguous
+        roi_feats = feats[0].new_zeros(2, rois.size(0), self.out_channels,
+                                       *out_size)
+
+        def to_modality_first(roi_feats_t):
+            return roi_feats_t.view(-1, 2, self.out_channels,
+                                    *out_size).transpose(0, 1)
+
+        if num_levels == 1:
+            if len(rois) > 0:
+                roi_feats.copy_(
+                    to_modality_first(self.roi_layers[0](feats[0], rois)))
+            return roi_feats[0], roi_feats[1]
+
+        target_lvls = self.map_roi_levels(rois, num_levels)
+
+        if roi_scale_factor is not None:
+            rois = self.roi_rescale(rois, roi_scale_factor)
+
+        for i in range(num_levels):
+            mask = target_lvls == i
+            inds = mask.nonzero(as_tuple=False).squeeze(1)
+            if inds.numel() > 0:
+                rois_ = rois[inds]
+                roi_feats_t = self.roi_layers[i](feats[i], rois_)
+                roi_feats[:, inds] = to_modality_first(roi_feats_t)
+            else:
+                # keep every level in the computation graph, see
+                # SingleRoIExtractor
+                roi_feats += sum(
+                    x.view(-1)[0]
+                    for x in self.parameters()) * 0. + feats[i].sum() * 0.
+        return roi_feats[0], roi_feats[1]
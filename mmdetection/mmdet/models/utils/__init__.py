@@ -20,6 +20,9 @@ from .transformer import (DetrTransformerDecoder, DetrTransformerDecoderLayer,
                           DynamicConv, PatchEmbed, Transformer, nchw_to_nlc,
                           nlc_to_nchw)
 from .zxcbam_layer import zxCBAM
+from .zx_gt_mask import get_batch_gt_mask
+from .zx_modality_stack import forward_stacked_modalities, has_training_bn
+from .zx_lwir_stem import LwirStemConv2d, fold_lwir_stem
 
 __all__ = [
     'ResLayer', 'gaussian_radius', 'gen_gaussian_target',
@@ -33,6 +36,7 @@ __all__ = [
     'preprocess_panoptic_gt', 'DyReLU',
     'get_uncertain_point_coords_with_randomness', 'get_uncertainty',
 
-    'zxCBAM',
+    'zxCBAM', 'get_batch_gt_mask', 'forward_stacked_modalities',
+    'has_training_bn', 'LwirStemConv2d', 'fold_lwir_stem',
 
 ]
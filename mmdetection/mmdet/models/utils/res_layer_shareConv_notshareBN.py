@@ -5,6 +5,30 @@ from mmcv.runner import BaseModule, Sequential
 from torch import nn as nn
 
 
+def modality_split_norm(x, norm, norm_notShare=None):
+    """Normalize the rgb and the lwir halves of a modality-batched tensor.
+
+    The shared convs run once on the rgb and the lwir features stacked along
+    the batch dimension, which are then normalized with their own parameters
+    and running stats.
+
+    Args:
+        x (Tensor): rgb features followed by lwir features along the batch
+            dimension.
+        norm (nn.Module): Norm layer of the rgb half, or, if
+            ``norm_notShare`` is None, a norm layer of twice the channels of
+            ``x`` whose first half is for rgb, as in the ``Bottleneck``.
+        norm_notShare (nn.Module, optional): Norm layer of the lwir half.
+
+    Returns:
+        Tensor: The normalized ``x``.
+    """
+    rgb_x, lwir_x = x.chunk(2)
+    if norm_notShare is None:
+        return torch.cat(norm(torch.cat([rgb_x, lwir_x], 1)).chunk(2, 1))
+    return torch.cat([norm(rgb_x), norm_notShare(lwir_x)])
+
+
 class DownSample(nn.Module):
     def __init__(self, conv_cfg, inplanes, planes, kernel_size, stride, bias,
                  norm_cfg):
@@ -20,11 +44,7 @@ class DownSample(nn.Module):
         self.norm_notShare = build_norm_layer(norm_cfg, planes)[1]
 
     def forward(self, x):
-        rgb_x, lwir_x = x
-        rgb_x = self.conv(rgb_x)
-        lwir_x = self.conv(lwir_x)
-        rgb_x, lwir_x = self.norm(rgb_x), self.norm_notShare(lwir_x)
-        return tuple([rgb_x, lwir_x])
+        return modality_split_norm(self.conv(x), self.norm, self.norm_notShare)
 
 
 class AvgPool2d_Two_Inputs(nn.Module):
@@ -37,13 +57,15 @@ class AvgPool2d_Two_Inputs(nn.Module):
             count_include_pad=count_include_pad)
 
     def forward(self, x):
-        rgb_x, lwir_x = x
-        return tuple([self.pool(rgb_x), self.pool(lwir_x)])
+        return self.pool(x)
 
 
 class ResLayer_shareConv_notShareBN(Sequential):
     """ResLayer to build ResNet style backbone.
 
+    The blocks take and return the rgb and the lwir features stacked along
+    the batch dimension, see :func:`modality_split_norm`.
+
     Args:
         block (nn.Module): block used to build ResLayer.
         inplanes (int): inplanes of block.
@@ -1,17 +1,35 @@
 from mmcv.cnn.bricks.non_local import _NonLocalNd
-from typing import Dict
+from typing import Dict, Optional
 import torch.nn as nn
 import torch
+import torch.utils.checkpoint as cp
 
 class zxCrossNonLocal2d(_NonLocalNd):
+    """Non-local block whose queries come from the rgb features and whose
+    keys/values come from the lwir features.
+
+    Args:
+        sub_sample (bool): Whether to apply max pooling after pairwise
+            function. Default: False.
+        conv_cfg (dict): The config dict for convolution layers.
+            Default: dict(type='Conv2d').
+        chunk_size (int, optional): Number of query positions whose pairwise
+            weights are computed at once. ``None`` builds the whole
+            [N, HxW, HxW] matrix, a chunk size bounds it to
+            [N, chunk_size, HxW]. Every pairwise function normalizes over the
+            keys only, so the output is the same. Default: None.
+    """
 
     def __init__(self,
                  sub_sample: bool = False,
                  conv_cfg: Dict = dict(type='Conv2d'),
+                 chunk_size: Optional[int] = None,
                  **kwargs):
         super().__init__(in_channels=1, conv_cfg=conv_cfg, reduction=1, **kwargs)
 
         self.sub_sample = sub_sample
+        assert chunk_size is None or chunk_size > 0
+        self.chunk_size = chunk_size
 
         if sub_sample:
             max_pool_layer = nn.MaxPool2d(kernel_size=(2, 2))
@@ -21,7 +39,29 @@ class zxCrossNonLocal2d(_NonLocalNd):
             else:
                 self.phi = max_pool_layer
 
+    def _attend(self, theta_x: torch.Tensor, phi_x: torch.Tensor, g_x: torch.Tensor) -> torch.Tensor:
+        pairwise_func = getattr(self, self.mode)
+        return torch.matmul(pairwise_func(theta_x, phi_x), g_x)
+
+    def chunked_attend(self, theta_x: torch.Tensor, phi_x: torch.Tensor, g_x: torch.Tensor) -> torch.Tensor:
+        """Compute ``pairwise_weight @ g_x`` one block of queries at a time.
 
+        Each block still sees all the keys, so the softmax (or the division by
+        the number of keys) of every row is complete and no rescaling across
+        blocks is needed. In training every block is checkpointed, otherwise
+        autograd would keep all the blocks' pairwise weights alive anyway.
+        """
+        # queries are dim 1 of theta_x, or dim 2 in concatenation mode: [N, C, HxW, 1]
+        query_dim = 2 if self.mode == 'concatenation' else 1
+        use_cp = torch.is_grad_enabled() and any(
+            t.requires_grad for t in (theta_x, phi_x, g_x))
+        ys = []
+        for theta_chunk in theta_x.split(self.chunk_size, query_dim):
+            if use_cp:
+                ys.append(cp.checkpoint(self._attend, theta_chunk, phi_x, g_x, use_reentrant=False))
+            else:
+                ys.append(self._attend(theta_chunk, phi_x, g_x))
+        return torch.cat(ys, 1)
 
     def forward(self, rgb_x: torch.Tensor, lwir_x: torch.Tensor) -> torch.Tensor:
         lwir_expectation = torch.sum(torch.softmax(lwir_x, dim=1) * lwir_x, dim=1, keepdim=True)
@@ -45,16 +85,20 @@ class zxCrossNonLocal2d(_NonLocalNd):
             theta_x = theta_x.permute(0, 2, 1)
             phi_x = self.phi(lwir_expectation).view(n, self.inter_channels, -1)
 
-        pairwise_func = getattr(self, self.mode)
-        # NonLocal1d pairwise_weight: [N, H, H]
-        # NonLocal2d pairwise_weight: [N, HxW, HxW]
-        # NonLocal3d pairwise_weight: [N, TxHxW, TxHxW]
-        pairwise_weight = pairwise_func(theta_x, phi_x)
+        # number of query positions: HxW
+        if self.chunk_size is not None and rgb_expectation[0, 0].numel() > self.chunk_size:
+            y = self.chunked_attend(theta_x, phi_x, g_x)
+        else:
+            pairwise_func = getattr(self, self.mode)
+            # NonLocal1d pairwise_weight: [N, H, H]
+            # NonLocal2d pairwise_weight: [N, HxW, HxW]
+            # NonLocal3d pairwise_weight: [N, TxHxW, TxHxW]
+            pairwise_weight = pairwise_func(theta_x, phi_x)
 
-        # NonLocal1d y: [N, H, C]
-        # NonLocal2d y: [N, HxW, C]
-        # NonLocal3d y: [N, TxHxW, C]
-        y = torch.matmul(pairwise_weight, g_x)
+            # NonLocal1d y: [N, H, C]
+            # NonLocal2d y: [N, HxW, C]
+            # NonLocal3d y: [N, TxHxW, C]
+            y = torch.matmul(pairwise_weight, g_x)
         # NonLocal1d y: [N, C, H]
         # NonLocal2d y: [N, C, H, W]
         # NonLocal3d y: [N, C, T, H, W]
@@ -0,0 +1,32 @@
+import numpy as np
+import torch
+
+
+def get_batch_gt_mask(gt_masks, device):
+    """Rasterize the union of every image's instance masks as one device
+    tensor.
+
+    Each image is reduced to the union of its instance masks on the CPU, so
+    only one (N, H, W) bool array is copied to ``device``, from pinned memory
+    when ``device`` is a GPU so that the copy does not synchronize. The
+    per-level targets are then obtained with one batched ``F.interpolate``
+    on the result.
+
+    Args:
+        gt_masks (list[:obj:`BitmapMasks` | :obj:`PolygonMasks`]): Ground
+            truth masks of each image, all padded to the same shape.
+        device (torch.device): Device of the returned tensor.
+
+    Returns:
+        Tensor: Binary foreground mask with shape (N, 1, H, W), float32.
+    """
+    bs = len(gt_masks)
+    h, w = gt_masks[0].height, gt_masks[0].width
+    union = torch.zeros((bs, h, w),
+                        dtype=torch.bool,
+                        pin_memory=device.type == 'cuda')
+    for mask, out in zip(gt_masks, union.numpy()):
+        if len(mask) > 0:
+            np.any(mask.to_ndarray(), axis=0, out=out)
+    union = union.to(device, non_blocking=True)
+    return union.view(bs, 1, h, w).float()
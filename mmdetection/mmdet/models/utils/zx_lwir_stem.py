@@ -0,0 +1,62 @@
+import torch.nn as nn
+
+
+class LwirStemConv2d(nn.Conv2d):
+    """Stem convolution that also accepts single channel lwir images.
+
+    The convolution keeps its 3-channel (pretrained) weight. An input with a
+    third of ``in_channels`` is convolved with the weight summed over every
+    group of 3 input channels, which is the same as running the original
+    convolution on the channel-replicated image at a third of the cost. The
+    grouping also covers the space-to-depth stem of CSPDarknet, whose input
+    channels are 4 concatenated 3-channel patches.
+    """
+
+    def forward(self, x):
+        if x.size(1) * 3 == self.in_channels:
+            weight = self.weight.unflatten(1, (-1, 3)).sum(2)
+            return self._conv_forward(x, weight, self.bias)
+        return super().forward(x)
+
+
+def fold_lwir_stem(backbone):
+    """Make ``backbone`` accept single channel lwir images.
+
+    The first convolution of ``backbone`` is replaced in place by a
+    :class:`LwirStemConv2d` sharing its parameters. Pretrained 3-channel
+    checkpoints therefore load unchanged, and a backbone shared by both
+    modalities still runs the rgb images with the original weight.
+
+    Args:
+        backbone (nn.Module): The lwir backbone, or the backbone shared by
+            both modalities.
+
+    Returns:
+        nn.Module: ``backbone`` itself.
+    """
+    for name, stem in backbone.named_modules():
+        if isinstance(stem, nn.Conv2d):
+            break
+    else:
+        raise ValueError(f'{type(backbone).__name__} has no convolution')
+    if isinstance(stem, LwirStemConv2d):
+        return backbone
+    assert stem.groups == 1 and stem.in_channels % 3 == 0, \
+        f'can not fold the stem {stem} to a single channel'
+
+    folded = LwirStemConv2d(
+        stem.in_channels,
+        stem.out_channels,
+        stem.kernel_size,
+        stride=stem.stride,
+        padding=stem.padding,
+        dilation=stem.dilation,
+        bias=stem.bias is not None,
+        padding_mode=stem.padding_mode)
+    folded.weight = stem.weight
+    folded.bias = stem.bias
+
+    parent_name, _, attr = name.rpartition('.')
+    parent = backbone.get_submodule(parent_name) if parent_name else backbone
+    setattr(parent, attr, folded)
+    return backbone
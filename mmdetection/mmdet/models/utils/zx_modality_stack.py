@@ -0,0 +1,34 @@
+import torch
+from torch.nn.modules.batchnorm import _BatchNorm
+
+
+def has_training_bn(module):
+    """Whether any BatchNorm layer of ``module`` updates batch statistics."""
+    return any(
+        isinstance(m, _BatchNorm) and m.training for m in module.modules())
+
+
+def forward_stacked_modalities(module, rgb_x, lwir_x):
+    """Run a weight-shared ``module`` once on both modalities.
+
+    ``rgb_x`` and ``lwir_x`` are concatenated along the batch dimension and
+    the outputs are split back, so every layer of ``module`` is launched once
+    instead of twice. This is equivalent to calling ``module`` on each
+    modality separately only if no BatchNorm layer is in training mode,
+    which callers should check with :func:`has_training_bn`.
+
+    Args:
+        module (nn.Module): Module shared by both modalities. It may return a
+            tensor or a tuple/list of tensors.
+        rgb_x (Tensor): RGB input with shape (N, C, H, W).
+        lwir_x (Tensor): LWIR input with the same shape as ``rgb_x``.
+
+    Returns:
+        tuple: Outputs of ``module`` for the RGB and the LWIR input.
+    """
+    assert rgb_x.shape == lwir_x.shape
+    bs = rgb_x.size(0)
+    outs = module(torch.cat([rgb_x, lwir_x], 0))
+    if isinstance(outs, torch.Tensor):
+        return outs[:bs], outs[bs:]
+    return tuple(out[:bs] for out in outs), tuple(out[bs:] for out in outs)
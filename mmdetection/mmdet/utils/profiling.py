@@ -1,8 +1,10 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import contextlib
+import json
 import sys
 import time
 
+import numpy as np
 import torch
 
 if sys.version_info >= (3, 7):
@@ -38,3 +40,177 @@ if sys.version_info >= (3, 7):
             msg = f'{trace_name} {name} cpu_time {cpu_time:.2f} ms '
             msg += f'gpu_time {gpu_time:.2f} ms stream {stream}'
             print(msg, end_stream)
+
+
+# (stage name, attribute path in the detector, method to time). The calls of
+# a method shared by both modalities are named by the order of the calls, as
+# are those of the stages whose attributes alias one module, e.g.
+# ``self.lwir_backbone = self.rgb_backbone`` with shared weights.
+RGBT_STAGES = (
+    (('rgb_backbone', 'lwir_backbone'), 'backbone', 'forward'),
+    ('rgb_backbone', 'rgb_backbone', 'forward'),
+    ('lwir_backbone', 'lwir_backbone', 'forward'),
+    ('taf', 'taf', 'forward'),
+    ('neck', 'neck', 'forward'),
+    ('rgb_neck', 'rgb_neck', 'forward'),
+    ('lwir_neck', 'lwir_neck', 'forward'),
+    ('rpn', 'rpn_head', 'simple_test_rpn'),
+    ('rgb_rpn', 'rgb_rpn_head', 'simple_test_rpn'),
+    ('lwir_rpn', 'lwir_rpn_head', 'simple_test_rpn'),
+    ('roi_extractor', 'roi_head.bbox_roi_extractor', 'forward'),
+    ('bbox_head', 'roi_head.bbox_head', 'forward'),
+    ('bbox_post_process', 'roi_head.bbox_head', 'get_bboxes'),
+    ('dense_head', 'bbox_head', 'simple_test'),
+)
+
+
+class StageProfiler:
+    """Latency breakdown of the stages of a RGB-T detector.
+
+    The methods of the stages listed in ``stages`` are wrapped on the
+    detector instance, missing ones are skipped. Every call is timed by a
+    pair of CUDA events on the current stream, or by the CPU clock when the
+    model is not on a GPU, and the events are read back once the forward
+    of the detector returns, so the timing does not add synchronizations
+    inside the forward. The children of ``taf`` whose names end with the
+    level index, e.g. ``fusionLayer1`` and ``maskLayer1``, are also timed
+    as one ``taf.level{i}`` span per level.
+
+    Args:
+        model (nn.Module): The detector, not wrapped by a data parallel.
+        stages (tuple): (name, attribute path, method) of the timed stages.
+            Default: ``RGBT_STAGES``.
+    """
+
+    def __init__(self, model, stages=RGBT_STAGES):
+        self.model = model
+        self.records = {}
+        self._calls = []
+        self._depth = 0
+        self._cuda = False
+        self._patched = []
+        found = {}  # stage names of every (module, method) to time
+        for name, path, method in stages:
+            module = model
+            for attr in path.split('.'):
+                module = getattr(module, attr, None)
+            if module is not None and hasattr(module, method):
+                names = found.setdefault((id(module), method),
+                                         (module, method, []))[2]
+                for n in name if isinstance(name, tuple) else (name, ):
+                    if n not in names:
+                        names.append(n)
+        for module, method, names in found.values():
+            if len(names) > 1 and any(n in other for n in names
+                                      for _, _, other in found.values()
+                                      if other is not names):
+                names = names[:1]  # e.g. the lwir branch has its own backbone
+            self._wrap(module, method,
+                       tuple(names) if len(names) > 1 else names[0])
+        taf = getattr(model, 'taf', None)
+        if taf is not None:
+            for child_name, child in taf.named_children():
+                level = child_name[len(child_name.rstrip('0123456789')):]
+                if level:
+                    self._wrap(child, 'forward', f'taf.level{level}')
+        self._wrap(model, 'forward', 'total')
+
+    def _wrap(self, module, method, name):
+        func = getattr(module, method)
+
+        def timed(*args, **kwargs):
+            if self._depth == 0:
+                self._cuda = next(self.model.parameters()).is_cuda
+            self._depth += 1
+            call = [name, self._event(), None]  # in the order of the calls
+            self._calls.append(call)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                call[2] = self._event()
+                self._depth -= 1
+                if self._depth == 0:
+                    self._collect()
+
+        # instance attribute, so that nn.Module.__call__ picks it up
+        setattr(module, method, timed)
+        self._patched.append((module, method))
+
+    def _event(self):
+        if self._cuda:
+            event = torch.cuda.Event(enable_timing=True)
+            event.record()
+            return event
+        return time.perf_counter()
+
+    @staticmethod
+    def _elapsed(start, end):
+        if isinstance(start, float):
+            return (end - start) * 1000
+        end.synchronize()
+        return start.elapsed_time(end)
+
+    def _collect(self):
+        """Turn the calls of one forward into one latency per stage."""
+        num_shared = {}
+        for name, _, _ in self._calls:
+            if isinstance(name, tuple):  # a module shared by the modalities
+                num_shared[name] = num_shared.get(name, 0) + 1
+        latencies, levels, idx = {}, {}, {}
+        for name, start, end in self._calls:
+            if isinstance(name, tuple):
+                if num_shared[name] == 1:  # both modalities in one batch
+                    stage = '+'.join(name)
+                else:
+                    i = idx.get(name, 0)  # alternates, e.g. in aug test
+                    stage, idx[name] = name[i % len(name)], i + 1
+            elif name.startswith('taf.level'):
+                # from the first to the last module of the level
+                levels[name] = (levels.get(name, (start, end))[0], end)
+                latencies.setdefault(name, 0)
+                continue
+            else:
+                stage = name
+            latencies[stage] = latencies.get(stage, 0) + self._elapsed(
+                start, end)
+        for name, span in levels.items():
+            latencies[name] = self._elapsed(*span)
+        for name, ms in latencies.items():
+            self.records.setdefault(name, []).append(ms)
+        self._calls = []
+
+    def reset(self):
+        """Drop the recorded latencies, e.g. those of warm-up iterations."""
+        self.records = {}
+
+    def summary(self):
+        """dict: mean, p50 and p95 latency in ms and the number of forwards
+        of every stage."""
+        return {
+            name: dict(
+                count=len(times),
+                mean=float(np.mean(times)),
+                p50=float(np.percentile(times, 50)),
+                p95=float(np.percentile(times, 95)))
+            for name, times in self.records.items()
+        }
+
+    def format(self):
+        """str: The summary as a table."""
+        lines = [f'{"stage":<24}{"count":>8}{"mean":>10}{"p50":>10}'
+                 f'{"p95":>10}  (ms)']
+        for name, stat in self.summary().items():
+            lines.append(f'{name:<24}{stat["count"]:>8}{stat["mean"]:>10.2f}'
+                         f'{stat["p50"]:>10.2f}{stat["p95"]:>10.2f}')
+        return '\n'.join(lines)
+
+    def dump(self, file):
+        """Dump the summary to a json file."""
+        with open(file, 'w') as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def remove(self):
+        """Restore the wrapped methods."""
+        for module, method in self._patched:
+            delattr(module, method)
+        self._patched = []
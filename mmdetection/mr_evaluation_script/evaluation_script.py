@@ -15,8 +15,8 @@ import numpy as np
 import os
 import pdb
 import sys
-import tempfile
 import traceback
+from typing import Optional, Union
 
 # matplotlib.use('Agg')
 # from matplotlib.patches import Polygon
@@ -476,6 +476,261 @@ class KAISTPedEval(COCOeval):
         return _summarize(iouThr=.5, maxDets=1000)
 
 
+class KAISTPedEvalVectorized(KAISTPedEval):
+    """KAISTPedEval with array based IoU and matching.
+
+    Detections and ground truths are kept in a flat columnar store (one array per field, grouped per image and
+    category) instead of per-annotation dicts, the IoU matrix is computed with broadcasting and the greedy matching
+    only steps through the detections that can hit a non-ignored ground truth. The per-image results, and therefore
+    ``accumulate`` and ``summarize``, are identical to those of :class:`KAISTPedEval`.
+    """
+
+    def _columns(self, anns, fields):
+        p = self.params
+        catRank = {catId: rank for rank, catId in enumerate(p.catIds)}
+        if not p.useCats:
+            # categories outside p.catIds are never read by KAISTPedEval either
+            anns = [ann for ann in anns if ann['category_id'] in catRank]
+        imgIds = np.asarray([ann['image_id'] for ann in anns], dtype=np.int64)
+        catIds = np.asarray([ann['category_id'] for ann in anns], dtype=np.int64)
+        if p.useCats:
+            keys = catIds
+        else:
+            # all categories of an image form one group, ordered as in p.catIds
+            keys = np.full(len(anns), -1, dtype=np.int64)
+            catIds = np.asarray([catRank[c] for c in catIds], dtype=np.int64)
+        order = np.lexsort((catIds, imgIds))  # stable, keeps the annotation order inside a group
+
+        cols = {'bbox': np.asarray([ann['bbox'] for ann in anns], dtype=np.float64).reshape(-1, 4)[order],
+                'id': np.asarray([ann['id'] for ann in anns], dtype=np.int64)[order]}
+        for field, default in fields.items():
+            cols[field] = np.asarray([ann.get(field, default) for ann in anns], dtype=np.float64)[order]
+
+        # (image_id, category_id) -> slice of the group in the columns
+        imgIds, keys = imgIds[order], keys[order]
+        starts = np.flatnonzero(np.r_[True, (imgIds[1:] != imgIds[:-1]) | (keys[1:] != keys[:-1])]) \
+            if len(anns) else np.zeros(0, dtype=np.int64)
+        stops = np.r_[starts[1:], len(anns)]
+        index = {(int(imgIds[s]), int(keys[s])): slice(s, e) for s, e in zip(starts, stops)}
+        return cols, index
+
+    def _prepare(self, id_setup):
+        '''
+        Build the columnar gt/dt store for params.imgIds and set the ignore flags of the given setup
+        :return: None
+        '''
+        p = self.params
+        if p.useCats:
+            gts = self.cocoGt.loadAnns(self.cocoGt.getAnnIds(imgIds=p.imgIds, catIds=p.catIds))
+            dts = self.cocoDt.loadAnns(self.cocoDt.getAnnIds(imgIds=p.imgIds, catIds=p.catIds))
+        else:
+            gts = self.cocoGt.loadAnns(self.cocoGt.getAnnIds(imgIds=p.imgIds))
+            dts = self.cocoDt.loadAnns(self.cocoDt.getAnnIds(imgIds=p.imgIds))
+
+        self._gtCols, self._gtIndex = self._columns(gts, {'ignore': 0, 'height': 0, 'occlusion': 0})
+        self._dtCols, self._dtIndex = self._columns(dts, {'score': 0})
+        self._gtIgnore = self._setup_ignore(id_setup)
+
+        self.evalImgs = defaultdict(list)   # per-image per-category evaluation results
+        self.eval = {}                      # accumulated evaluation results
+
+    def _setup_ignore(self, id_setup):
+        """Ignore flags of all gts in the store for the given setup, same rules as KAISTPedEval._prepare"""
+        p = self.params
+        g = self._gtCols
+        gbox = g['bbox']
+        return (g['ignore'] != 0) \
+            | (g['height'] < p.HtRng[id_setup][0]) \
+            | (g['height'] > p.HtRng[id_setup][1]) \
+            | ~np.isin(g['occlusion'], p.OccRng[id_setup]) \
+            | (gbox[:, 0] < p.bndRng[0]) \
+            | (gbox[:, 1] < p.bndRng[1]) \
+            | (gbox[:, 0] + gbox[:, 2] > p.bndRng[2]) \
+            | (gbox[:, 1] + gbox[:, 3] > p.bndRng[3])
+
+    def _group(self, imgId, catId):
+        empty = slice(0, 0)
+        return self._gtIndex.get((int(imgId), int(catId)), empty), self._dtIndex.get((int(imgId), int(catId)), empty)
+
+    def computeIoU(self, imgId, catId):
+        p = self.params
+        if p.iouType != 'bbox':
+            raise Exception('only bbox iouType is supported by the vectorized evaluation')
+        gs, ds = self._group(imgId, catId)
+        gbox = self._gtCols['bbox'][gs]
+        dscore = self._dtCols['score'][ds]
+        if len(gbox) == 0 and len(dscore) == 0:
+            return []
+        inds = np.argsort(-dscore, kind='mergesort')[:p.maxDets[-1]]
+        return self.iou(self._dtCols['bbox'][ds][inds], gbox, self._gtIgnore[gs])
+
+    def computeOverlaps(self, imgId, catId):
+        """Same as computeIoU, but stops before the setup dependent union so the result can be reused by all setups"""
+        gs, ds = self._group(imgId, catId)
+        gbox = self._gtCols['bbox'][gs]
+        dscore = self._dtCols['score'][ds]
+        if len(gbox) == 0 and len(dscore) == 0:
+            return None
+        inds = np.argsort(-dscore, kind='mergesort')[:self.params.maxDets[-1]]
+        return self._overlaps(self._dtCols['bbox'][ds][inds], gbox)
+
+    def iou(self, dts, gts, pyiscrowd):
+        return self._iou_from_overlaps(self._overlaps(dts, gts), pyiscrowd)
+
+    @staticmethod
+    def _overlaps(dts, gts):
+        """Setup independent part of the IoU: intersections, areas and the overlap mask of every dt/gt pair"""
+        dts = np.asarray(dts, dtype=np.float64).reshape(-1, 4)
+        gts = np.asarray(gts, dtype=np.float64).reshape(-1, 4)
+
+        dx1, dy1 = dts[:, 0:1], dts[:, 1:2]
+        dx2, dy2 = dx1 + dts[:, 2:3], dy1 + dts[:, 3:4]
+        darea = dts[:, 2:3] * dts[:, 3:4]
+        gx1, gy1 = gts[None, :, 0], gts[None, :, 1]
+        gx2, gy2 = gx1 + gts[None, :, 2], gy1 + gts[None, :, 3]
+        garea = gts[None, :, 2] * gts[None, :, 3]
+
+        unionw = np.minimum(dx2, gx2) - np.maximum(dx1, gx1)
+        unionh = np.minimum(dy2, gy2) - np.maximum(dy1, gy1)
+        t = unionw * unionh
+        overlap = (unionw > 0) & (unionh > 0)
+        return t, darea, garea, overlap
+
+    @staticmethod
+    def _iou_from_overlaps(overlaps, pyiscrowd):
+        t, darea, garea, overlap = overlaps
+        pyiscrowd = np.asarray(pyiscrowd, dtype=bool).reshape(1, -1)
+        unionarea = np.where(pyiscrowd, darea, darea + garea - t)
+        ious = np.zeros(t.shape)
+        np.divide(t, unionarea, out=ious, where=overlap)
+        return ious
+
+    def evaluateImg(self, imgId, catId, hRng, oRng, maxDet):
+        '''
+        perform evaluation for single category and image
+        :return: dict (single image results)
+        '''
+        p = self.params
+        gs, ds = self._group(imgId, catId)
+        G, D = gs.stop - gs.start, ds.stop - ds.start
+        if G == 0 and D == 0:
+            return None
+
+        # sort dt highest score first, sort gt ignore last
+        gtIg = self._gtIgnore[gs].astype(np.int64)
+        gtind = np.argsort(gtIg, kind='mergesort')
+        gtIg = gtIg[gtind]
+        gtIds = self._gtCols['id'][gs][gtind]
+        dtScores = self._dtCols['score'][ds]
+        dtind = np.argsort(-dtScores, kind='mergesort')
+        dtIds = self._dtCols['id'][ds][dtind[0:maxDet]]
+        dtScores = dtScores[dtind[0:maxDet]]
+        D = len(dtIds)
+        if D == 0:
+            return None
+
+        # the rows of self.ious are already score-sorted, indexing them with dtind again mirrors KAISTPedEval
+        ious = self.ious[imgId, catId][dtind, :]
+        ious = ious[:, gtind]
+
+        T = len(p.iouThrs)
+        gtm = np.zeros((T, G))
+        dtm = np.zeros((T, D))
+        dtIg = np.zeros((T, D))
+        regular = gtIg == 0
+        for tind, t in enumerate(p.iouThrs):
+            if G == 0:
+                break
+            hit = ious[:D] >= min([t, 1 - 1e-10])
+            regHit = hit & regular
+            ignHit = hit & ~regular
+            # a dt that is not matched to a regular gt goes to the first ignored gt it reaches
+            bstg = np.where(ignHit.any(1), ignHit.argmax(1), -1)
+            # greedy matching to regular gts, only the dts reaching one of them depend on the earlier matches
+            for dind in np.flatnonzero(regHit.any(1)):
+                cand = regHit[dind] & (gtm[tind] <= 0)
+                if cand.any():
+                    # the last unmatched regular gt with the highest iou wins
+                    gind = G - 1 - np.argmax(np.where(cand, ious[dind], -1)[::-1])
+                    bstg[dind] = gind
+                    gtm[tind, gind] = dtIds[dind]
+            matched = bstg >= 0
+            dtIg[tind, matched] = gtIg[bstg[matched]]
+            dtm[tind, matched] = gtIds[bstg[matched]]
+
+        # store results for given image and category
+        return {
+            'image_id': imgId,
+            'category_id': catId,
+            'hRng': hRng,
+            'oRng': oRng,
+            'maxDet': maxDet,
+            'dtIds': dtIds,
+            'gtIds': gtIds,
+            'dtMatches': dtm,
+            'gtMatches': gtm,
+            'dtScores': dtScores,
+            'gtIgnore': gtIg,
+            'dtIgnore': dtIg,
+        }
+
+    def evaluateSetups(self, id_setups):
+        '''
+        Run per image evaluation of several setups in a single pass over the images: the annotations are loaded and
+        the dt/gt overlaps computed once, only the ignore flags and the matching are redone per setup.
+        Results are stored in self.setupEvalImgs[id_setup] and can be accumulated per image subset with subset()
+        :return: None
+        '''
+        p = self.params
+        p.imgIds = list(np.unique(p.imgIds))
+        if p.useCats:
+            p.catIds = list(np.unique(p.catIds))
+        p.maxDets = sorted(p.maxDets)
+        self.params = p
+
+        self._prepare(id_setups[0])
+        catIds = p.catIds if p.useCats else [-1]
+        maxDet = p.maxDets[-1]
+        overlaps = {(imgId, catId): self.computeOverlaps(imgId, catId)
+                    for imgId in p.imgIds for catId in catIds}
+
+        self.setupEvalImgs = {}
+        for id_setup in id_setups:
+            self._gtIgnore = self._setup_ignore(id_setup)
+            self.ious = {
+                key: [] if ov is None else self._iou_from_overlaps(ov, self._gtIgnore[self._group(*key)[0]])
+                for key, ov in overlaps.items()}
+            HtRng = p.HtRng[id_setup]
+            OccRng = p.OccRng[id_setup]
+            self.setupEvalImgs[id_setup] = [self.evaluateImg(imgId, catId, HtRng, OccRng, maxDet)
+                                            for catId in catIds
+                                            for imgId in p.imgIds]
+
+        self.evalImgs = self.setupEvalImgs[id_setups[0]]
+        self._paramsEval = copy.deepcopy(self.params)
+
+    def subset(self, id_setup, imgIds):
+        '''
+        Evaluation restricted to imgIds for a setup computed by evaluateSetups, ready for accumulate/summarize.
+        The per image results are shared, gives the same result as evaluating imgIds on their own.
+        :return: KAISTPedEvalVectorized
+        '''
+        _pe = self._paramsEval
+        imgIds = list(np.unique(imgIds))
+        catIds = _pe.catIds if _pe.useCats else [-1]
+        I0 = len(_pe.imgIds)
+        imgPos = {imgId: i for i, imgId in enumerate(_pe.imgIds)}
+        evalImgs = self.setupEvalImgs[id_setup]
+
+        sub = copy.copy(self)
+        sub.params = copy.deepcopy(_pe)
+        sub.params.imgIds = imgIds
+        sub._paramsEval = copy.deepcopy(sub.params)
+        sub.evalImgs = [evalImgs[k * I0 + imgPos[imgId]] for k in range(len(catIds)) for imgId in imgIds]
+        sub.eval = {}
+        return sub
+
+
 class KAISTParams(Params):
     """Params for KAISTPed evaluation api"""
 
@@ -488,9 +743,16 @@ class KAISTParams(Params):
 
         # KAISTPed specific settings
         self.fppiThrs = np.array([0.0100, 0.0178, 0.0316, 0.0562, 0.1000, 0.1778, 0.3162, 0.5623, 1.0000])
-        self.HtRng = [[55, 1e5 ** 2], [50, 75], [50, 1e5 ** 2], [20, 1e5 ** 2]]
-        self.OccRng = [[0, 1], [0, 1], [2], [0, 1, 2]]
-        self.SetupLbl = ['Reasonable', 'Reasonable_small', 'Reasonable_occ=heavy', 'All']
+        self.HtRng = [[55, 1e5 ** 2], [50, 75], [50, 1e5 ** 2], [20, 1e5 ** 2],
+                      # scale and occlusion settings of KAISTdevkit-matlab-wrapper/kaist_eval_full.m
+                      [115, 1e5 ** 2], [45, 115], [1, 45],
+                      [1, 1e5 ** 2], [1, 1e5 ** 2], [1, 1e5 ** 2]]
+        self.OccRng = [[0, 1], [0, 1], [2], [0, 1, 2],
+                       [0], [0], [0],
+                       [0], [1], [2]]
+        self.SetupLbl = ['Reasonable', 'Reasonable_small', 'Reasonable_occ=heavy', 'All',
+                         'Scale=near', 'Scale=medium', 'Scale=far',
+                         'Occ=none', 'Occ=partial', 'Occ=heavy']
 
         self.bndRng = [5, 5, 635, 507]  # discard bbs outside this pixel range
 
@@ -521,71 +783,91 @@ class KAIST(COCO):
     def loadRes(self, resFile):
         """
         Load result file and return a result api object.
-        :param   resFile (str)     : file name of result file
+        :param   resFile (str|list): file name of result file, or list of json annotations
         :return: res (obj)         : result api object
         """
 
-        # If resFile is a text file, convert it to json
+        # If resFile is a text file, convert it to json annotations in memory
         if type(resFile) == str and resFile.endswith('.txt'):
-            anns = self.txt2json(resFile)
-            _resFile = next(tempfile._get_candidate_names())
-            with open(_resFile, 'w') as f:
-                json.dump(anns, f, indent=4)
-            res = super().loadRes(_resFile)
-            os.remove(_resFile)
+            res = super().loadRes(self.txt2json(resFile))
         elif type(resFile) == str and resFile.endswith('.json'):
             res = super().loadRes(resFile)
+        elif type(resFile) == list:
+            res = super().loadRes(resFile)
         else:
             raise Exception('[Error] Exception extension : %s \n' % resFile.split('.')[-1]) 
 
         return res
 
 
-def evaluate(test_annotation_file: str, user_submission_file: str, phase_codename: str = 'Multispectral'):
+# settings reported by KAISTdevkit-matlab-wrapper/kaist_eval_full.m: (name, image subset, id_setup of KAISTParams)
+FULL_SETTINGS = [
+    ('Reasonable-all', 'all', 0),
+    ('Reasonable-day', 'day', 0),
+    ('Reasonable-night', 'night', 0),
+    ('Scale=near', 'all', 4),
+    ('Scale=medium', 'all', 5),
+    ('Scale=far', 'all', 6),
+    ('Occ=none', 'all', 7),
+    ('Occ=partial', 'all', 8),
+    ('Occ=heavy', 'all', 9),
+]
+
+
+def split_day_night(imgIds):
+    """All/Day/Night image subsets of the KAIST test set, the first 1455 images are taken at daytime"""
+    imgIds = sorted(imgIds)
+    return {'all': imgIds, 'day': imgIds[:1455], 'night': imgIds[1455:]}
+
+
+def evaluate(test_annotation_file: Union[str, 'KAIST'], user_submission_file: Union[str, list],
+             phase_codename: str = 'Multispectral', vectorized: bool = True, method: Optional[str] = None):
     """Evaluates the submission for a particular challenge phase and returns score
 
     Parameters
     ----------
-    test_annotations_file: str
-        Path to test_annotation_file on the server
-    user_submission_file: str
-        Path to file submitted by the user
+    test_annotations_file: str or KAIST
+        Path to test_annotation_file on the server, or the already loaded annotations
+    user_submission_file: str or list
+        Path to file submitted by the user, or list of json annotations
     phase_codename: str
         Phase to which submission is made
+    vectorized: bool
+        Use KAISTPedEvalVectorized instead of the loop based KAISTPedEval, both give identical results.
+        The vectorized evaluation matches every image once and slices the result into All/Day/Night
+    method: str
+        Method name, defaults to the prefix of the submission file name
 
     Returns
     -------
     Dict
         Evaluated/Accumulated KAISTPedEval objects for All/Day/Night
     """
-    kaistGt = KAIST(test_annotation_file)
+    kaistGt = test_annotation_file if isinstance(test_annotation_file, KAIST) else KAIST(test_annotation_file)
     kaistDt = kaistGt.loadRes(user_submission_file)
 
-    imgIds = sorted(kaistGt.getImgIds())
-    method = os.path.basename(user_submission_file).split('_')[0]
-    kaistEval = KAISTPedEval(kaistGt, kaistDt, 'bbox', method)
-
-    kaistEval.params.catIds = [1]
-
-    eval_result = {
-        'all': copy.deepcopy(kaistEval),
-        'day': copy.deepcopy(kaistEval),
-        'night': copy.deepcopy(kaistEval),
-    }
-
-    eval_result['all'].params.imgIds = imgIds
-    eval_result['all'].evaluate(0)
-    eval_result['all'].accumulate()
+    subsets = split_day_night(kaistGt.getImgIds())
+    if method is None:
+        method = os.path.basename(user_submission_file).split('_')[0]
+
+    if vectorized:
+        kaistEval = KAISTPedEvalVectorized(kaistGt, kaistDt, 'bbox', method)
+        kaistEval.params.catIds = [1]
+        kaistEval.params.imgIds = subsets['all']
+        kaistEval.evaluateSetups([0])
+        eval_result = {name: kaistEval.subset(0, imgIds) for name, imgIds in subsets.items()}
+    else:
+        kaistEval = KAISTPedEval(kaistGt, kaistDt, 'bbox', method)
+        kaistEval.params.catIds = [1]
+        eval_result = {name: copy.deepcopy(kaistEval) for name in subsets}
+        for name, imgIds in subsets.items():
+            eval_result[name].params.imgIds = imgIds
+            eval_result[name].evaluate(0)
+
+    for name in subsets:
+        eval_result[name].accumulate()
     MR_all = eval_result['all'].summarize(0)
-
-    eval_result['day'].params.imgIds = imgIds[:1455]
-    eval_result['day'].evaluate(0)
-    eval_result['day'].accumulate()
     MR_day = eval_result['day'].summarize(0)
-
-    eval_result['night'].params.imgIds = imgIds[1455:]
-    eval_result['night'].evaluate(0)
-    eval_result['night'].accumulate()
     MR_night = eval_result['night'].summarize(0)
 
     recall_all = 1 - eval_result['all'].eval['yy'][0][-1]
@@ -600,6 +882,49 @@ def evaluate(test_annotation_file: str, user_submission_file: str, phase_codenam
     return eval_result
 
 
+def evaluate_full(test_annotation_file: str, user_submission_file: str):
+    """Evaluates the submission on the nine settings of kaist_eval_full.m in a single pass
+
+    The overlaps and the annotations are computed once, each image is matched once per setup and the per-image
+    results are sliced into the All/Day/Night subsets, which replaces the MATLAB devkit for the full-setting table.
+
+    Parameters
+    ----------
+    test_annotations_file: str
+        Path to test_annotation_file on the server
+    user_submission_file: str
+        Path to file submitted by the user
+
+    Returns
+    -------
+    Dict
+        Accumulated KAISTPedEvalVectorized objects keyed by the setting names of FULL_SETTINGS
+    """
+    kaistGt = KAIST(test_annotation_file)
+    kaistDt = kaistGt.loadRes(user_submission_file)
+
+    subsets = split_day_night(kaistGt.getImgIds())
+    method = os.path.basename(user_submission_file).split('_')[0]
+
+    kaistEval = KAISTPedEvalVectorized(kaistGt, kaistDt, 'bbox', method)
+    kaistEval.params.catIds = [1]
+    kaistEval.params.imgIds = subsets['all']
+    kaistEval.evaluateSetups(sorted({id_setup for _, _, id_setup in FULL_SETTINGS}))
+
+    eval_result = {}
+    msg = f'\n########## Method: {method} ##########\n'
+    for name, subset, id_setup in FULL_SETTINGS:
+        eval_result[name] = kaistEval.subset(id_setup, subsets[subset])
+        eval_result[name].accumulate()
+        MR = eval_result[name].summarize(id_setup)
+        recall = 1 - eval_result[name].eval['yy'][0][-1] if eval_result[name].eval['yy'] else 0.
+        msg += f'{name:<20} log-average miss rate = {MR * 100:.2f}% recall = {recall * 100:.2f}%\n'
+    msg += '######################################\n\n'
+    print(msg)
+
+    return eval_result
+
+
 def draw_all(eval_results, filename='figure.jpg'):
     """Draw all results in a single figure as Miss rate versus false positive per-image (FPPI) curve
 
@@ -641,10 +966,17 @@ if __name__ == "__main__":
                         help='Please put the path of the result file. Only support json, txt format.')
     parser.add_argument('--evalFig', type=str, default='KASIT_BENCHMARK.jpg',
                         help='Please put the output path of the Miss rate versus false positive per-image (FPPI) curve')
+    parser.add_argument('--loopEval', action='store_true',
+                        help='Use the loop based reference implementation instead of the vectorized one')
+    parser.add_argument('--full', action='store_true',
+                        help='Also report the reasonable/scale/occlusion settings of kaist_eval_full.m')
     args = parser.parse_args()
 
     phase = "Multispectral"
-    results = [evaluate(args.annFile, rstFile, phase) for rstFile in args.rstFiles]
+    if args.full:
+        for rstFile in args.rstFiles:
+            evaluate_full(args.annFile, rstFile)
+    results = [evaluate(args.annFile, rstFile, phase, vectorized=not args.loopEval) for rstFile in args.rstFiles]
 
     # Sort results by MR_all
     results = sorted(results, key=lambda x: x['all'].summarize(0), reverse=True)
@@ -1,3 +1,5 @@
+# Superseded by tools/analysis_tools/eval_kaist_mr.py, which evaluates all epochs in parallel
+# without writing text files. Kept for the visualization of the detected boxes (show_epoch).
 import copy
 import os
 import shutil
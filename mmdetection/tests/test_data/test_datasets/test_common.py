@@ -13,7 +13,7 @@ import torch.nn as nn
 from mmcv.runner import EpochBasedRunner
 from torch.utils.data import DataLoader
 
-from mmdet.core.evaluation import DistEvalHook, EvalHook
+from mmdet.core.evaluation import DetResultWriter, DistEvalHook, EvalHook
 from mmdet.datasets import DATASETS, CocoDataset, CustomDataset, build_dataset
 
 
@@ -131,6 +131,16 @@ def test_dataset_evaluation():
     assert eval_results['bbox_mAP_50'] == 1
     assert eval_results['bbox_mAP_75'] == 1
 
+    # test coco dataset evaluation of streamed shards
+    shard_dir = osp.join(tmp_dir.name, 'shards')
+    writer = DetResultWriter(shard_dir, coco_dataset.img_ids)
+    writer.write(fake_results)
+    writer.close()
+    eval_results = coco_dataset.evaluate(shard_dir, classwise=True)
+    assert eval_results['bbox_mAP'] == 1
+    assert eval_results['bbox_mAP_50'] == 1
+    assert eval_results['bbox_mAP_75'] == 1
+
     # test concat dataset evaluation
     fake_concat_results = _create_dummy_results() + _create_dummy_results()
 
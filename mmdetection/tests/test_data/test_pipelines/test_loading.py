@@ -6,7 +6,8 @@ import mmcv
 import numpy as np
 
 from mmdet.datasets.pipelines import (LoadImageFromFile, LoadImageFromWebcam,
-                                      LoadMultiChannelImageFromFiles)
+                                      LoadMultiChannelImageFromFiles,
+                                      LoadRGBTFromWebcam)
 
 
 class TestLoading:
@@ -89,3 +90,19 @@ class TestLoading:
         assert results['img'].dtype == np.uint8
         assert results['img_shape'] == (288, 512, 3)
         assert results['ori_shape'] == (288, 512, 3)
+
+    def test_load_rgbt_webcam_img(self):
+        filename = osp.join(self.data_prefix, 'color.jpg')
+        img = mmcv.imread(filename)
+        # the thermal image given by path and read as grayscale
+        results = dict(rgb_img=img, lwir_img=filename)
+        transform = LoadRGBTFromWebcam(lwir_color_type='grayscale')
+        results = transform(copy.deepcopy(results))
+        assert results['rgb_filename'] is None
+        assert results['lwir_filename'] == filename
+        assert results['rgb_img'].shape == (288, 512, 3)
+        assert results['lwir_img'].shape == (288, 512)
+        assert results['img_shape'] == (288, 512, 3)
+        assert results['ori_shape'] == (288, 512, 3)
+        assert results['rgb_img_fields'] == ['rgb_img']
+        assert results['lwir_img_fields'] == ['lwir_img']
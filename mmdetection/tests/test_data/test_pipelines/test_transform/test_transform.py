@@ -1099,3 +1099,51 @@ def test_copypaste():
     src_results['gt_masks'] = src_masks[valid_inds]
     results['mix_results'] = [copy.deepcopy(src_results)]
     copypaste_module(results)
+
+
+def test_preprocess_rgbt():
+    resize = dict(img_scale=(64, 48), keep_ratio=True)
+    normalize = dict(
+        rgb_mean=[123.675, 116.28, 103.53],
+        rgb_std=[58.395, 57.12, 57.375],
+        lwir_mean=[100.],
+        lwir_std=[50.],
+        to_rgb=True)
+    pad = dict(size_divisor=32)
+    chain = [
+        build_from_cfg(dict(type='ResizeRGBT', **resize), PIPELINES),
+        build_from_cfg(dict(type='RandomFlipRGBT'), PIPELINES),
+        build_from_cfg(dict(type='NormalizeRGBT', **normalize), PIPELINES),
+        build_from_cfg(dict(type='PadRGBT', **pad), PIPELINES),
+        build_from_cfg(
+            dict(type='RGBTImageToTensor', keys=['lwir_img', 'rgb_img']),
+            PIPELINES)
+    ]
+    transform = build_from_cfg(
+        dict(
+            type='PreprocessRGBT',
+            resize=resize,
+            normalize=normalize,
+            pad=pad), PIPELINES)
+
+    rng = np.random.RandomState(0)
+    for flip in (False, True):
+        results = dict(
+            rgb_img=rng.randint(0, 256, (60, 90, 3), dtype=np.uint8),
+            lwir_img=rng.randint(0, 256, (60, 90), dtype=np.uint8),
+            gt_bboxes=create_random_bboxes(4, 90, 60),
+            bbox_fields=['gt_bboxes'],
+            flip=flip,
+            flip_direction='horizontal')
+        expected = copy.deepcopy(results)
+        for t in chain:
+            expected = t(expected)
+        results = transform(results)
+
+        for key in ('rgb_img', 'lwir_img'):
+            assert results[key].shape == expected[key].shape
+            assert torch.allclose(results[key], expected[key], atol=1e-5)
+        assert np.allclose(results['gt_bboxes'], expected['gt_bboxes'])
+        for key in ('img_shape', 'pad_shape', 'pad_size_divisor'):
+            assert results[key] == expected[key]
+        assert np.allclose(results['scale_factor'], expected['scale_factor'])
@@ -0,0 +1,166 @@
+import json
+import os.path as osp
+import sys
+
+import numpy as np
+import pytest
+
+MR_ROOT = osp.join(osp.dirname(__file__), '../..')
+sys.path.insert(0, MR_ROOT)
+from mr_evaluation_script.evaluation_script import (  # noqa: E402
+    FULL_SETTINGS, KAIST, KAISTPedEval, KAISTPedEvalVectorized, evaluate,
+    evaluate_full, split_day_night)
+
+ANN_FILE = osp.join(MR_ROOT, 'mr_evaluation_script/KAIST_annotation.json')
+RESULT_DIR = osp.join(MR_ROOT, 'mr_evaluation_script/state_of_arts')
+YOLOV5_ROOT = osp.join(MR_ROOT, '../yolov5-master')
+
+
+@pytest.mark.parametrize('result_file',
+                         ['MLPD_result.txt', 'MLPD_result.json',
+                          'MSDS-RCNN_result.txt'])
+def test_vectorized_mr_matches_loop(result_file):
+    result_file = osp.join(RESULT_DIR, result_file)
+    loop_results = evaluate(ANN_FILE, result_file, vectorized=False)
+    vec_results = evaluate(ANN_FILE, result_file, vectorized=True)
+
+    for subset in ('all', 'day', 'night'):
+        loop_eval, vec_eval = loop_results[subset], vec_results[subset]
+        assert vec_eval.summarize(0) == loop_eval.summarize(0)
+        assert np.array_equal(vec_eval.eval['TP'], loop_eval.eval['TP'])
+        assert np.array_equal(vec_eval.eval['xx'], loop_eval.eval['xx'])
+        assert np.array_equal(vec_eval.eval['yy'], loop_eval.eval['yy'])
+
+
+def test_full_settings_match_loop():
+    result_file = osp.join(RESULT_DIR, 'MLPD_result.txt')
+    full_results = evaluate_full(ANN_FILE, result_file)
+
+    for name, subset, id_setup in FULL_SETTINGS:
+        # KAISTPedEval writes the ignore flags into the annotations, reload
+        kaist_gt = KAIST(ANN_FILE)
+        kaist_dt = kaist_gt.loadRes(result_file)
+        loop_eval = KAISTPedEval(kaist_gt, kaist_dt, 'bbox')
+        loop_eval.params.catIds = [1]
+        loop_eval.params.imgIds = split_day_night(kaist_gt.getImgIds())[subset]
+        loop_eval.evaluate(id_setup)
+        loop_eval.accumulate()
+
+        assert full_results[name].summarize(id_setup) == \
+            loop_eval.summarize(id_setup)
+        assert np.array_equal(full_results[name].eval['TP'],
+                              loop_eval.eval['TP'])
+
+
+
+def _random_kaist(num_imgs, rng):
+    """Random gts and detections, with images without detections, as KAIST
+    json annotations and results and as the tensors of the yolov5 MissRate.
+    """
+    images, anns, results, dets, labels, paths = [], [], [], [], [], []
+    for i in range(num_imgs):
+        name = f'set{"06" if i < num_imgs // 2 else "09"}/I{i:05d}.jpg'
+        images.append(dict(id=i, width=640, height=512, im_name=name))
+        gts = []
+        for _ in range(rng.integers(0, 5)):
+            h = rng.uniform(20, 150)
+            x, y = rng.uniform(0, 640 - 0.4 * h), rng.uniform(0, 512 - h)
+            cls = int(rng.random() < 0.15)  # 1 is an ignore class
+            anns.append(
+                dict(id=len(anns) + 1, image_id=i, category_id=1,
+                     bbox=[x, y, 0.4 * h, h], height=h, occlusion=0,
+                     ignore=cls, area=0.4 * h * h, iscrowd=0))
+            gts.append([cls, x, y, x + 0.4 * h, y + h])
+        img_dets = []
+        # a fifth of the images have no detections
+        for _ in range(rng.integers(1, 15) if rng.random() > 0.2 else 0):
+            if gts and rng.random() < 0.6:
+                box = np.array(gts[rng.integers(len(gts))][1:])
+                box += rng.normal(0, 6, 4)
+            else:
+                h = rng.uniform(20, 150)
+                x, y = rng.uniform(0, 640 - 0.4 * h), rng.uniform(0, 512 - h)
+                box = np.array([x, y, x + 0.4 * h, y + h])
+            img_dets.append([*box, np.round(rng.random(), 3), 0])
+        # the offline ious are indexed as if the detections were sorted
+        img_dets.sort(key=lambda d: -d[4])
+        for x1, y1, x2, y2, score, _ in img_dets:
+            results.append(
+                dict(image_id=i, category_id=1,
+                     bbox=[x1, y1, x2 - x1, y2 - y1], score=score))
+        dets.append(np.array(img_dets, np.float32).reshape(-1, 6))
+        labels.append(np.array(gts, np.float32).reshape(-1, 5))
+        paths.append(name)
+    gt = dict(images=images, annotations=anns,
+              categories=[dict(id=1, name='person')])
+    return gt, results, dets, labels, paths
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_yolov5_miss_rate_matches_offline(seed, tmp_path):
+    torch = pytest.importorskip('torch')
+    sys.path.insert(0, YOLOV5_ROOT)
+    try:
+        metrics = pytest.importorskip('utils.metrics')
+    finally:
+        sys.path.remove(YOLOV5_ROOT)
+
+    num_imgs = 200
+    gt, results, dets, labels, paths = _random_kaist(
+        num_imgs, np.random.default_rng(seed))
+    ann_file = str(tmp_path / 'gt.json')
+    with open(ann_file, 'w') as f:
+        json.dump(gt, f)
+    kaist_gt = KAIST(ann_file)
+    kaist_dt = kaist_gt.loadRes(results)
+    offline = {}
+    img_ids = sorted(kaist_gt.getImgIds())
+    subsets = dict(all=img_ids, day=img_ids[:num_imgs // 2],
+                   night=img_ids[num_imgs // 2:])
+    for name, img_ids in subsets.items():
+        kaist_eval = KAISTPedEval(kaist_gt, kaist_dt, 'bbox')
+        kaist_eval.params.catIds = [1]
+        kaist_eval.params.imgIds = img_ids
+        kaist_eval.evaluate(0)
+        kaist_eval.accumulate()
+        offline[name] = kaist_eval.summarize(0)
+
+    miss_rate = metrics.MissRate(
+        bounds=(5, 5, 635, 507),
+        ignore_classes=[1],
+        subsets=dict(day='set06', night='set09'))
+    for i in range(0, num_imgs, 32):
+        batch = slice(i, i + 32)
+        miss_rate.process_batch([torch.from_numpy(x) for x in dets[batch]],
+                                [torch.from_numpy(x) for x in labels[batch]],
+                                paths[batch])
+    online = miss_rate.compute()
+    for name in ('all', 'day', 'night'):
+        assert online[name] == pytest.approx(offline[name], abs=1e-6)
+
+
+
+def test_vectorized_mr_without_cats_matches_loop(tmp_path):
+    rng = np.random.default_rng(0)
+    gt, results, _, _, _ = _random_kaist(100, rng)
+    # pool two of three categories, the third is not evaluated at all
+    for ann in gt['annotations'] + results:
+        ann['category_id'] = int(rng.choice([1, 2, 3]))
+    gt['categories'] += [dict(id=2, name='cyclist'), dict(id=3, name='people')]
+    ann_file = str(tmp_path / 'gt.json')
+    with open(ann_file, 'w') as f:
+        json.dump(gt, f)
+
+    summaries, evals = [], []
+    for eval_cls in (KAISTPedEval, KAISTPedEvalVectorized):
+        kaist_gt = KAIST(ann_file)
+        kaist_eval = eval_cls(kaist_gt, kaist_gt.loadRes(results), 'bbox')
+        kaist_eval.params.useCats = 0
+        kaist_eval.params.catIds = [3, 1]
+        kaist_eval.params.imgIds = kaist_gt.getImgIds()
+        kaist_eval.evaluate(0)
+        kaist_eval.accumulate()
+        summaries.append(kaist_eval.summarize(0))
+        evals.append(kaist_eval.eval)
+    assert summaries[1] == summaries[0]
+    assert np.array_equal(evals[1]['TP'], evals[0]['TP'])
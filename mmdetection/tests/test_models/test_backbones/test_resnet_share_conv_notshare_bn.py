@@ -0,0 +1,72 @@
+import pytest
+import torch
+
+from mmdet.models.backbones import ResNet_ShareConv_notShareBN
+from mmdet.models.utils.res_layer_shareConv_notshareBN import \
+    modality_split_norm
+
+
+def test_modality_split_norm():
+    rgb_x, lwir_x = torch.rand(2, 4, 8, 8), torch.rand(2, 4, 8, 8) * 3
+    x = torch.cat([rgb_x, lwir_x])
+
+    # two norm layers
+    norm, norm_notShare = torch.nn.BatchNorm2d(4), torch.nn.BatchNorm2d(4)
+    out = modality_split_norm(x, norm, norm_notShare)
+    assert torch.allclose(out[:2], torch.nn.BatchNorm2d(4)(rgb_x))
+    assert torch.allclose(out[2:], torch.nn.BatchNorm2d(4)(lwir_x))
+
+    # one norm layer of twice the channels, the first half being for rgb
+    norm = torch.nn.BatchNorm2d(8)
+    out = modality_split_norm(x, norm)
+    assert torch.allclose(out[:2], torch.nn.BatchNorm2d(4)(rgb_x))
+    assert torch.allclose(out[2:], torch.nn.BatchNorm2d(4)(lwir_x))
+    assert torch.allclose(norm.running_mean[4:],
+                          lwir_x.mean((0, 2, 3)) * norm.momentum)
+
+
+@pytest.mark.parametrize('depth', [18, 50])
+def test_resnet_share_conv_not_share_bn(depth):
+    model = ResNet_ShareConv_notShareBN(depth=depth, out_indices=(1, 3))
+    model.init_weights()
+    model.eval()
+
+    rgb_img, lwir_img = torch.rand(2, 3, 64, 64), torch.rand(2, 3, 64, 64)
+    rgb_outs, lwir_outs = model(rgb_img, lwir_img)
+    expansion = 1 if depth == 18 else 4
+    assert [tuple(out.shape) for out in rgb_outs] == [
+        (2, 128 * expansion, 8, 8), (2, 512 * expansion, 2, 2)
+    ]
+    assert [out.shape for out in lwir_outs] == [out.shape for out in rgb_outs]
+
+    # the modalities are stacked in one batch but stay independent
+    other_rgb_outs, other_lwir_outs = model(rgb_img, torch.rand(2, 3, 64, 64))
+    for out, other_out in zip(rgb_outs, other_rgb_outs):
+        assert torch.allclose(out, other_out)
+    for out, other_out in zip(lwir_outs, other_lwir_outs):
+        assert not torch.allclose(out, other_out)
+
+
+def test_resnet_share_conv_not_share_bn_with_cp():
+    with pytest.raises(AssertionError):
+        # one flag per stage
+        ResNet_ShareConv_notShareBN(depth=18, stage_with_cp=(True, False))
+
+    model = ResNet_ShareConv_notShareBN(depth=18)
+    model_cp = ResNet_ShareConv_notShareBN(
+        depth=18, stage_with_cp=(True, True, False, False))
+    model_cp.load_state_dict(model.state_dict())
+    assert [block.with_cp for block in model_cp.layer2] == [True, True]
+    assert [block.with_cp for block in model_cp.layer3] == [False, False]
+
+    rgb_img = torch.rand(2, 3, 32, 32, requires_grad=True)
+    lwir_img = torch.rand(2, 3, 32, 32, requires_grad=True)
+    grads = []
+    for m in (model, model_cp):
+        rgb_outs, lwir_outs = m(rgb_img, lwir_img)
+        sum(out.sum() for out in rgb_outs + lwir_outs).backward()
+        grads.append([p.grad.clone() for p in m.parameters()] +
+                     [rgb_img.grad.clone(), lwir_img.grad.clone()])
+        rgb_img.grad, lwir_img.grad = None, None
+    for grad, grad_cp in zip(*grads):
+        assert torch.allclose(grad, grad_cp)
@@ -2,7 +2,9 @@
 import pytest
 import torch
 
-from mmdet.models.roi_heads.roi_extractors import GenericRoIExtractor
+from mmdet.models.roi_heads.roi_extractors import (DualModalityRoIExtractor,
+                                                   GenericRoIExtractor,
+                                                   SingleRoIExtractor)
 
 
 def test_groie():
@@ -112,3 +114,37 @@ def test_groie():
     # out_channels does not sum of feat channels
     with pytest.raises(AssertionError):
         _ = groie(feats, rois)
+
+
+def test_dual_modality_roi_extractor():
+    cfg = dict(
+        roi_layer=dict(type='RoIAlign', output_size=7, sampling_ratio=0),
+        out_channels=16,
+        featmap_strides=[4, 8, 16, 32])
+    single = SingleRoIExtractor(**cfg)
+    dual = DualModalityRoIExtractor(**cfg)
+
+    rgb_feats = tuple(
+        torch.rand((2, 16, 128 // s, 160 // s)) for s in (1, 2, 4, 8))
+    lwir_feats = tuple(torch.rand_like(feat) for feat in rgb_feats)
+    # rois of every level in both images
+    rois = torch.tensor([[0., 10., 10., 40., 50.], [1., 20., 30., 150., 200.],
+                         [0., 0., 0., 400., 500.], [1., 50., 60., 250., 300.],
+                         [1., 100., 80., 140., 120.]])
+
+    rgb_res, lwir_res = dual(rgb_feats, lwir_feats, rois)
+    assert rgb_res.shape == lwir_res.shape == torch.Size([5, 16, 7, 7])
+    assert torch.allclose(rgb_res, single(rgb_feats, rois))
+    assert torch.allclose(lwir_res, single(lwir_feats, rois))
+
+    # single level
+    cfg['featmap_strides'] = [4]
+    single = SingleRoIExtractor(**cfg)
+    dual = DualModalityRoIExtractor(**cfg)
+    rgb_res, lwir_res = dual(rgb_feats[:1], lwir_feats[:1], rois)
+    assert torch.allclose(rgb_res, single(rgb_feats[:1], rois))
+    assert torch.allclose(lwir_res, single(lwir_feats[:1], rois))
+
+    # no rois
+    rgb_res, lwir_res = dual(rgb_feats[:1], lwir_feats[:1], rois[:0])
+    assert rgb_res.shape == lwir_res.shape == torch.Size([0, 16, 7, 7])
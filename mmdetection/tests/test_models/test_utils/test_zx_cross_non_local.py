@@ -0,0 +1,35 @@
+import pytest
+import torch
+
+from mmdet.models.utils.zx_cross_non_local import zxCrossNonLocal2d
+
+
+@pytest.mark.parametrize(
+    'mode', ['gaussian', 'embedded_gaussian', 'dot_product', 'concatenation'])
+@pytest.mark.parametrize('sub_sample', [False, True])
+def test_zx_cross_non_local_chunked(mode, sub_sample):
+    module = zxCrossNonLocal2d(mode=mode, sub_sample=sub_sample)
+    module.eval()
+    rgb_x = torch.randn(2, 8, 20, 24)
+    lwir_x = torch.randn(2, 8, 20, 24)
+    with torch.no_grad():
+        expected = module(rgb_x, lwir_x)
+        # 480 queries in blocks of 77, the last one is partial
+        module.chunk_size = 77
+        out = module(rgb_x, lwir_x)
+    assert out.shape == lwir_x.shape
+    assert torch.allclose(out, expected, atol=1e-6)
+
+
+def test_zx_cross_non_local_chunked_backward():
+    module = zxCrossNonLocal2d(mode='embedded_gaussian')
+    rgb_x = torch.randn(2, 8, 20, 24, requires_grad=True)
+    lwir_x = torch.randn(2, 8, 20, 24)
+
+    module(rgb_x, lwir_x).sum().backward()
+    expected = rgb_x.grad.clone()
+    rgb_x.grad = None
+
+    module.chunk_size = 64
+    module(rgb_x, lwir_x).sum().backward()
+    assert torch.allclose(rgb_x.grad, expected, atol=1e-5)
@@ -0,0 +1,24 @@
+import numpy as np
+import torch
+
+from mmdet.core import BitmapMasks
+from mmdet.models.utils import get_batch_gt_mask
+
+
+def test_get_batch_gt_mask():
+    h, w = 32, 40
+    masks_a = np.zeros((2, h, w), dtype=np.uint8)
+    masks_a[0, 2:10, 4:12] = 1
+    masks_a[1, 6:20, 8:30] = 1
+    gt_masks = [
+        BitmapMasks(masks_a, h, w),
+        # image without any instance
+        BitmapMasks(np.zeros((0, h, w), dtype=np.uint8), h, w),
+    ]
+
+    batch_mask = get_batch_gt_mask(gt_masks, torch.device('cpu'))
+    assert batch_mask.shape == (2, 1, h, w)
+    assert batch_mask.dtype == torch.float32
+    expected = np.clip(masks_a.sum(0), 0, 1).astype(np.float32)
+    assert np.array_equal(batch_mask[0, 0].numpy(), expected)
+    assert batch_mask[1].sum() == 0
@@ -0,0 +1,46 @@
+import torch
+import torch.nn as nn
+
+from mmdet.models.utils import LwirStemConv2d, fold_lwir_stem
+
+
+def test_fold_lwir_stem():
+    backbone = nn.Sequential(
+        nn.Conv2d(3, 8, 3, padding=1), nn.ReLU(), nn.Conv2d(8, 8, 3))
+    state_dict = backbone.state_dict()
+    rgb_x = torch.rand(2, 3, 16, 16)
+    rgb_out = backbone(rgb_x)
+
+    fold_lwir_stem(backbone)
+    assert isinstance(backbone[0], LwirStemConv2d)
+    assert not isinstance(backbone[2], LwirStemConv2d)
+    # the 3-channel parameters are kept, pretrained weights load unchanged
+    assert {k: v.shape for k, v in backbone.state_dict().items()} == \
+        {k: v.shape for k, v in state_dict.items()}
+    backbone.load_state_dict(state_dict)
+
+    # rgb images still use the original weight
+    assert torch.allclose(backbone(rgb_x), rgb_out)
+    # a single channel image equals its channel-replicated version
+    lwir_x = torch.rand(2, 1, 16, 16)
+    assert torch.allclose(
+        backbone(lwir_x), backbone(lwir_x.expand(-1, 3, -1, -1)), atol=1e-5)
+
+    # folding twice is a no-op
+    assert fold_lwir_stem(backbone)[0] is backbone[0]
+
+
+def test_fold_lwir_stem_focus():
+    # space-to-depth stem of CSPDarknet: 4 concatenated 3-channel patches
+    stem = nn.Conv2d(12, 8, 3, padding=1)
+    module = nn.Module()
+    module.conv = stem
+    fold_lwir_stem(module)
+
+    x = torch.rand(1, 1, 8, 8)
+    patches = torch.cat(
+        (x[..., ::2, ::2], x[..., 1::2, ::2], x[..., ::2, 1::2],
+         x[..., 1::2, 1::2]), dim=1)
+    replicated = patches.repeat_interleave(3, dim=1)
+    assert torch.allclose(
+        module.conv(patches), module.conv(replicated), atol=1e-5)
@@ -0,0 +1,25 @@
+import torch
+import torch.nn as nn
+
+from mmdet.models.utils import forward_stacked_modalities, has_training_bn
+
+
+def test_forward_stacked_modalities():
+    module = nn.Sequential(nn.Conv2d(3, 8, 3, padding=1), nn.BatchNorm2d(8))
+    assert has_training_bn(module)
+    module.eval()
+    assert not has_training_bn(module)
+
+    rgb_x = torch.rand(2, 3, 16, 16)
+    lwir_x = torch.rand(2, 3, 16, 16)
+    rgb_out, lwir_out = forward_stacked_modalities(module, rgb_x, lwir_x)
+    assert torch.allclose(rgb_out, module(rgb_x), atol=1e-6)
+    assert torch.allclose(lwir_out, module(lwir_x), atol=1e-6)
+
+    # multi-level outputs are split level by level
+    def multi_level(x):
+        return x, x[..., ::2, ::2]
+
+    rgb_outs, lwir_outs = forward_stacked_modalities(multi_level, rgb_x, lwir_x)
+    assert len(rgb_outs) == len(lwir_outs) == 2
+    assert torch.equal(lwir_outs[1], lwir_x[..., ::2, ::2])
@@ -7,9 +7,15 @@ import sys
 
 import asynctest
 import mmcv
+import numpy as np
+import pytest
 import torch
 
-from mmdet.apis import async_inference_detector, init_detector
+from mmdet.apis import (async_inference_detector,
+                        async_inference_rgbt_detector,
+                        inference_rgbt_detector, init_detector,
+                        prepare_dummy_rgbt_data, prepare_rgbt_data)
+from mmdet.models.detectors import RGBTAsyncTestMixin
 
 if sys.version_info >= (3, 7):
     from mmdet.utils.contextmanagers import concurrent
@@ -65,8 +71,6 @@ class AsyncInferenceTestCase(AsyncTestCase):
 
         async def test_simple_inference(self):
             if not torch.cuda.is_available():
-                import pytest
-
                 pytest.skip('test requires GPU and torch+cuda')
 
             ori_grad_enabled = torch.is_grad_enabled()
@@ -81,3 +85,124 @@ class AsyncInferenceTestCase(AsyncTestCase):
             # asy inference detector will hack grad_enabled,
             # so restore here to avoid it to influence other tests
             torch.set_grad_enabled(ori_grad_enabled)
+
+        async def test_rgbt_inference(self):
+            if not torch.cuda.is_available():
+                pytest.skip('test requires GPU and torch+cuda')
+
+            ori_grad_enabled = torch.is_grad_enabled()
+            root_dir = os.path.dirname(os.path.dirname(__name__))
+            model_config = os.path.join(
+                root_dir,
+                'configs/faster_rcnn/faster_rcnn_vgg16_fpn_sanitized-kaist_v2.py'
+            )
+            model = init_detector(model_config, device='cuda:0')
+            streamqueue = asyncio.Queue()
+            streamqueue.put_nowait(torch.cuda.Stream(device='cuda:0'))
+            img = mmcv.imread(os.path.join(root_dir, 'demo/demo.jpg'))
+            async with concurrent(streamqueue):
+                result = await async_inference_rgbt_detector(
+                    model, (img, img))
+            sync_result = inference_rgbt_detector(model, (img, img))
+            self.assertEqual(len(result), len(sync_result))
+            for bboxes, sync_bboxes in zip(result, sync_result):
+                self.assertTrue(np.allclose(bboxes, sync_bboxes, atol=1e-3))
+            torch.set_grad_enabled(ori_grad_enabled)
+
+
+class _RGBTHeadStub:
+
+    async def async_simple_test_rpn(self, x, img_metas):
+        return [torch.zeros(0, 5)]
+
+    async def async_simple_test(self, x, proposal_list, img_metas,
+                                rescale=False):
+        return x, proposal_list, img_metas
+
+
+class _RGBTDetectorStub(RGBTAsyncTestMixin):
+    """The parts of a TAF detector used by its async test."""
+
+    with_bbox = True
+
+    def __init__(self):
+        self.rpn_head = _RGBTHeadStub()
+        self.roi_head = _RGBTHeadStub()
+
+    def extract_feat(self, rgb_img, lwir_img):
+        return (rgb_img + lwir_img, )
+
+
+def test_rgbt_aforward_test():
+    detector = _RGBTDetectorStub()
+    rgb_img, lwir_img = torch.rand(1, 3, 32, 40), torch.rand(1, 3, 32, 40)
+    img_metas = [dict(img_shape=(32, 40, 3))]
+
+    def aforward_test(**kwargs):
+        return asyncio.run(detector.aforward_test(**kwargs))
+
+    x, proposal_list, img_metas_out = aforward_test(
+        rgb_img=[rgb_img],
+        lwir_img=[lwir_img],
+        img_metas=[img_metas])
+    assert torch.equal(x[0], rgb_img + lwir_img)
+    assert proposal_list[0].shape == (0, 5)
+    assert img_metas_out[0]['batch_input_shape'] == (32, 40)
+
+    with pytest.raises(TypeError):
+        aforward_test(rgb_img=rgb_img, lwir_img=[lwir_img],
+                      img_metas=[img_metas])
+    with pytest.raises(ValueError):
+        aforward_test(rgb_img=[rgb_img], lwir_img=[lwir_img, lwir_img],
+                      img_metas=[img_metas])
+    with pytest.raises(ValueError):
+        aforward_test(rgb_img=[rgb_img], lwir_img=[lwir_img],
+                      img_metas=[img_metas, img_metas])
+    # test-time augmentation
+    with pytest.raises(NotImplementedError):
+        aforward_test(rgb_img=[rgb_img, rgb_img],
+                      lwir_img=[lwir_img, lwir_img],
+                      img_metas=[img_metas, img_metas])
+    # samples_per_gpu > 1
+    with pytest.raises(ValueError):
+        aforward_test(rgb_img=[rgb_img.repeat(2, 1, 1, 1)],
+                      lwir_img=[lwir_img.repeat(2, 1, 1, 1)],
+                      img_metas=[img_metas * 2])
+    # unaligned modalities
+    with pytest.raises(ValueError):
+        aforward_test(rgb_img=[rgb_img], lwir_img=[lwir_img[..., :32]],
+                      img_metas=[img_metas])
+
+
+def test_prepare_rgbt_data():
+    root_dir = os.path.dirname(os.path.dirname(__name__))
+    cfg = mmcv.Config.fromfile(
+        os.path.join(
+            root_dir,
+            'configs/faster_rcnn/faster_rcnn_vgg16_fpn_sanitized-kaist_v2.py'))
+    rgb_img = np.random.randint(0, 256, (50, 60, 3), np.uint8)
+    lwir_img = np.random.randint(0, 256, (50, 60, 3), np.uint8)
+    data = prepare_rgbt_data(cfg, [(rgb_img, lwir_img)] * 2,
+                             torch.device('cpu'))
+    # the config is left unchanged
+    assert cfg.data.test.pipeline[0].type == 'LoadRGBTFromFile'
+
+    assert len(data['rgb_img']) == len(data['lwir_img']) == 1
+    assert data['rgb_img'][0].shape[0] == 2
+    assert data['rgb_img'][0].shape[-2:] == data['lwir_img'][0].shape[-2:]
+    assert len(data['img_metas'][0]) == 2
+    assert data['img_metas'][0][0]['ori_shape'][:2] == (50, 60)
+
+
+def test_prepare_dummy_rgbt_data():
+    root_dir = os.path.dirname(os.path.dirname(__name__))
+    cfg = mmcv.Config.fromfile(
+        os.path.join(
+            root_dir, 'configs/faster_rcnn/'
+            'faster_rcnn_vgg16_fpn_sanitized-kaist_v2_lwir1ch.py'))
+    data = prepare_dummy_rgbt_data(cfg, (50, 60), batch_size=2)
+    assert data['rgb_img'][0].shape[:2] == (2, 3)
+    # single channel thermal images with lwir_color_type='grayscale'
+    assert data['lwir_img'][0].shape[:2] == (2, 1)
+    assert data['rgb_img'][0].shape[-2:] == data['lwir_img'][0].shape[-2:]
+    assert data['img_metas'][0][0]['ori_shape'][:2] == (50, 60)
@@ -0,0 +1,114 @@
+import json
+import os.path as osp
+import tempfile
+
+import pytest
+import torch
+import torch.nn as nn
+
+from mmdet.utils.profiling import StageProfiler
+
+
+class ToyTAF(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.fusionLayer1 = nn.Conv2d(8, 4, 1)
+        self.maskLayer1 = nn.Conv2d(4, 1, 1)
+
+    def forward(self, rgb_x, lwir_x):
+        x = self.fusionLayer1(torch.cat([rgb_x, lwir_x], 1))
+        return x * self.maskLayer1(x).sigmoid()
+
+
+class ToyRGBTDetector(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.backbone = nn.Conv2d(3, 4, 3, padding=1)
+        self.taf = ToyTAF()
+        self.neck = nn.Conv2d(4, 4, 1)
+
+    def forward(self, rgb_img, lwir_img, stack=False):
+        if stack:
+            rgb_x, lwir_x = self.backbone(torch.cat([rgb_img, lwir_img],
+                                                    0)).chunk(2)
+        else:
+            rgb_x, lwir_x = self.backbone(rgb_img), self.backbone(lwir_img)
+        return self.neck(self.taf(rgb_x, lwir_x))
+
+
+class ToyTwoStreamDetector(nn.Module):
+    """Per-modality backbones and necks, as FasterRCNN_RGBT."""
+
+    def __init__(self, share_weights):
+        super().__init__()
+        self.rgb_backbone = nn.Conv2d(3, 4, 3, padding=1)
+        self.rgb_neck = nn.Conv2d(4, 4, 1)
+        if share_weights:
+            self.lwir_backbone = self.rgb_backbone
+            self.lwir_neck = self.rgb_neck
+        else:
+            self.lwir_backbone = nn.Conv2d(3, 4, 3, padding=1)
+            self.lwir_neck = nn.Conv2d(4, 4, 1)
+
+    def forward(self, rgb_img, lwir_img):
+        rgb_x = self.rgb_neck(self.rgb_backbone(rgb_img))
+        lwir_x = self.lwir_neck(self.lwir_backbone(lwir_img))
+        return rgb_x + lwir_x
+
+
+def test_stage_profiler():
+    model = ToyRGBTDetector()
+    rgb_img, lwir_img = torch.rand(2, 3, 16, 16), torch.rand(2, 3, 16, 16)
+    expected = model(rgb_img, lwir_img)
+
+    profiler = StageProfiler(model)
+    for _ in range(3):
+        assert torch.equal(model(rgb_img, lwir_img), expected)
+    summary = profiler.summary()
+    assert set(summary) == {
+        'rgb_backbone', 'lwir_backbone', 'taf', 'taf.level1', 'neck', 'total'
+    }
+    for stat in summary.values():
+        assert stat['count'] == 3
+        assert 0 <= stat['p50'] <= stat['p95']
+
+    # one call on the stacked modalities
+    profiler.reset()
+    model(rgb_img, lwir_img, stack=True)
+    assert 'rgb_backbone+lwir_backbone' in profiler.summary()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file = osp.join(tmpdir, 'stages.json')
+        profiler.dump(file)
+        with open(file) as f:
+            assert json.load(f).keys() == profiler.summary().keys()
+
+    profiler.remove()
+    assert 'forward' not in model.__dict__
+    assert 'forward' not in model.backbone.__dict__
+
+
+@pytest.mark.parametrize('share_weights', [False, True])
+def test_stage_profiler_two_streams(share_weights):
+    model = ToyTwoStreamDetector(share_weights)
+    rgb_img, lwir_img = torch.rand(2, 3, 16, 16), torch.rand(2, 3, 16, 16)
+    expected = model(rgb_img, lwir_img)
+
+    profiler = StageProfiler(model)
+    for _ in range(2):
+        assert torch.equal(model(rgb_img, lwir_img), expected)
+    summary = profiler.summary()
+    # the calls of a shared module are split by modality, not summed up
+    assert set(summary) == {
+        'rgb_backbone', 'lwir_backbone', 'rgb_neck', 'lwir_neck', 'total'
+    }
+    for stat in summary.values():
+        assert stat['count'] == 2
+
+    profiler.remove()
+    for module in (model, model.rgb_backbone, model.lwir_backbone,
+                   model.rgb_neck, model.lwir_neck):
+        assert 'forward' not in module.__dict__
+
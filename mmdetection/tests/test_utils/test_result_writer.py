@@ -0,0 +1,73 @@
+import os.path as osp
+import tempfile
+
+import numpy as np
+
+from mmdet.core.evaluation.result_writer import (DetResultWriter,
+                                                 iter_det_shards,
+                                                 load_det_results)
+
+
+def _random_result(num_classes, rng):
+    result = []
+    for _ in range(num_classes):
+        bboxes = rng.rand(rng.randint(0, 4), 5).astype(np.float32)
+        result.append(bboxes)
+    return result
+
+
+def test_det_result_writer():
+    rng = np.random.RandomState(0)
+    results = [_random_result(2, rng) for _ in range(7)]
+    # an image without any detection
+    results[3] = [np.zeros((0, 5), np.float32) for _ in range(2)]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        writer = DetResultWriter(tmpdir, shard_size=3)
+        writer.write(results[:2])
+        # results with masks are tuples
+        writer.write([(result, None) for result in results[2:5]])
+        writer.write(results[5:])
+        writer.close()
+        assert writer.num_imgs == 7
+        assert osp.isfile(osp.join(tmpdir, '00002.npz'))
+
+        loaded = load_det_results(tmpdir)
+        assert len(loaded) == len(results)
+        for result, loaded_result in zip(results, loaded):
+            assert len(loaded_result) == 2
+            for bboxes, loaded_bboxes in zip(result, loaded_result):
+                assert loaded_bboxes.shape == (len(bboxes), 5)
+                np.testing.assert_array_equal(bboxes, loaded_bboxes)
+
+        # the shards are keyed by the dataset index without image ids
+        shards = list(iter_det_shards(tmpdir))
+        assert [len(shard['shard_img_ids']) for shard in shards] == [3, 3, 1]
+        np.testing.assert_array_equal(shards[1]['shard_img_ids'], [3, 4, 5])
+        assert shards[1]['counts'].shape == (3, 2)
+
+        # and by the image ids of the dataset with them
+        img_ids = [10 * i + 1 for i in range(7)]
+        writer = DetResultWriter(tmpdir, img_ids, shard_size=3)
+        writer.write(results)
+        writer.close()
+        img_id_col = np.concatenate(
+            [shard['img_ids'] for shard in iter_det_shards(tmpdir)])
+        np.testing.assert_array_equal(
+            img_id_col,
+            np.repeat(img_ids, [sum(map(len, result)) for result in results]))
+        label_col = np.concatenate(
+            [shard['labels'] for shard in iter_det_shards(tmpdir)])
+        np.testing.assert_array_equal(
+            label_col,
+            np.concatenate([
+                np.full(len(bboxes), label) for result in results
+                for label, bboxes in enumerate(result)
+            ]))
+        assert len(load_det_results(tmpdir)) == 7
+
+        # shards of a previous run are removed
+        writer = DetResultWriter(tmpdir)
+        writer.write(results[:1])
+        writer.close()
+        assert len(load_det_results(tmpdir)) == 1
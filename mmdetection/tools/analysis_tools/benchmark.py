@@ -1,7 +1,9 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import argparse
 import copy
+import itertools
 import os
+import resource
 import time
 
 import torch
@@ -10,10 +12,12 @@ from mmcv.cnn import fuse_conv_bn
 from mmcv.parallel import MMDistributedDataParallel
 from mmcv.runner import init_dist, load_checkpoint, wrap_fp16_model
 
+from mmdet.apis import prepare_dummy_rgbt_data
 from mmdet.datasets import (build_dataloader, build_dataset,
                             replace_ImageToTensor)
 from mmdet.models import build_detector
 from mmdet.utils import update_data_root
+from mmdet.utils.profiling import StageProfiler
 
 
 def parse_args():
@@ -34,6 +38,25 @@ def parse_args():
         action='store_true',
         help='Whether to fuse conv and bn, this will slightly increase'
         'the inference speed')
+    parser.add_argument(
+        '--batch-size', type=int, default=1, help='images per iteration')
+    parser.add_argument(
+        '--fp16', action='store_true', help='run the model in fp16')
+    parser.add_argument(
+        '--cudnn-benchmark',
+        action='store_true',
+        help='enable cudnn.benchmark, whatever the config says')
+    parser.add_argument(
+        '--dummy-shape',
+        type=int,
+        nargs=2,
+        metavar=('H', 'W'),
+        help='benchmark on a random rgbt pair of this size passed through '
+        'the test pipeline, instead of the test dataset')
+    parser.add_argument(
+        '--profile-stages',
+        help='json file to dump the p50/p95 latency of every stage of the '
+        'rgbt detector to, warm-up iterations excluded')
     parser.add_argument(
         '--cfg-options',
         nargs='+',
@@ -56,8 +79,14 @@ def parse_args():
     return args
 
 
-def measure_inference_speed(cfg, checkpoint, max_iter, log_interval,
-                            is_fuse_conv_bn):
+def measure_inference_speed(cfg,
+                            checkpoint,
+                            max_iter,
+                            log_interval,
+                            is_fuse_conv_bn,
+                            profile_stages=None,
+                            batch_size=1,
+                            dummy_shape=None):
     # set cudnn_benchmark
     if cfg.get('cudnn_benchmark', False):
         torch.backends.cudnn.benchmark = True
@@ -65,20 +94,26 @@ def measure_inference_speed(cfg, checkpoint, max_iter, log_interval,
     cfg.data.test.test_mode = True
 
     # build the dataloader
-    samples_per_gpu = cfg.data.test.pop('samples_per_gpu', 1)
-    if samples_per_gpu > 1:
+    cfg.data.test.pop('samples_per_gpu', 1)
+    if batch_size > 1:
         # Replace 'ImageToTensor' to 'DefaultFormatBundle'
         cfg.data.test.pipeline = replace_ImageToTensor(cfg.data.test.pipeline)
-    dataset = build_dataset(cfg.data.test)
-    data_loader = build_dataloader(
-        dataset,
-        samples_per_gpu=1,
-        # Because multiple processes will occupy additional CPU resources,
-        # FPS statistics will be more unstable when workers_per_gpu is not 0.
-        # It is reasonable to set workers_per_gpu to 0.
-        workers_per_gpu=0,
-        dist=True,
-        shuffle=False)
+    if dummy_shape is not None:
+        # the same batch every iteration, scattered to the gpu by the model
+        # wrapper like the batches of the dataloader
+        data = prepare_dummy_rgbt_data(cfg, dummy_shape, batch_size)
+        data_loader = itertools.repeat(data, max_iter)
+    else:
+        dataset = build_dataset(cfg.data.test)
+        data_loader = build_dataloader(
+            dataset,
+            samples_per_gpu=batch_size,
+            # Because multiple processes will occupy additional CPU resources,
+            # FPS statistics will be more unstable when workers_per_gpu is not
+            # 0. It is reasonable to set workers_per_gpu to 0.
+            workers_per_gpu=0,
+            dist=True,
+            shuffle=False)
 
     # build the model and load checkpoint
     cfg.model.train_cfg = None
@@ -89,6 +124,8 @@ def measure_inference_speed(cfg, checkpoint, max_iter, log_interval,
     load_checkpoint(model, checkpoint, map_location='cpu')
     if is_fuse_conv_bn:
         model = fuse_conv_bn(model)
+    if profile_stages:
+        profiler = StageProfiler(model)
 
     model = MMDistributedDataParallel(
         model.cuda(),
@@ -103,6 +140,10 @@ def measure_inference_speed(cfg, checkpoint, max_iter, log_interval,
 
     # benchmark with 2000 image and take the average
     for i, data in enumerate(data_loader):
+        if i == num_warmup:
+            torch.cuda.reset_peak_memory_stats()
+            if profile_stages:
+                profiler.reset()
 
         torch.cuda.synchronize()
         start_time = time.perf_counter()
@@ -116,7 +157,7 @@ def measure_inference_speed(cfg, checkpoint, max_iter, log_interval,
         if i >= num_warmup:
             pure_inf_time += elapsed
             if (i + 1) % log_interval == 0:
-                fps = (i + 1 - num_warmup) / pure_inf_time
+                fps = (i + 1 - num_warmup) * batch_size / pure_inf_time
                 print(
                     f'Done image [{i + 1:<3}/ {max_iter}], '
                     f'fps: {fps:.1f} img / s, '
@@ -124,12 +165,22 @@ def measure_inference_speed(cfg, checkpoint, max_iter, log_interval,
                     flush=True)
 
         if (i + 1) == max_iter:
-            fps = (i + 1 - num_warmup) / pure_inf_time
+            fps = (i + 1 - num_warmup) * batch_size / pure_inf_time
             print(
                 f'Overall fps: {fps:.1f} img / s, '
                 f'times per image: {1000 / fps:.1f} ms / img',
                 flush=True)
             break
+    # ru_maxrss is in KB on Linux
+    print(
+        f'Peak memory: gpu {torch.cuda.max_memory_allocated() / 2**20:.0f} MB'
+        f' (warm-up excluded), cpu '
+        f'{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10:.0f} MB'
+        ' (process)',
+        flush=True)
+    if profile_stages:
+        print(profiler.format(), flush=True)
+        profiler.dump(profile_stages)
     return fps
 
 
@@ -138,7 +189,10 @@ def repeat_measure_inference_speed(cfg,
                                    max_iter,
                                    log_interval,
                                    is_fuse_conv_bn,
-                                   repeat_num=1):
+                                   repeat_num=1,
+                                   profile_stages=None,
+                                   batch_size=1,
+                                   dummy_shape=None):
     assert repeat_num >= 1
 
     fps_list = []
@@ -149,7 +203,8 @@ def repeat_measure_inference_speed(cfg,
 
         fps_list.append(
             measure_inference_speed(cp_cfg, checkpoint, max_iter, log_interval,
-                                    is_fuse_conv_bn))
+                                    is_fuse_conv_bn, profile_stages,
+                                    batch_size, dummy_shape))
 
     if repeat_num > 1:
         fps_list_ = [round(fps, 1) for fps in fps_list]
@@ -177,6 +232,10 @@ def main():
 
     if args.cfg_options is not None:
         cfg.merge_from_dict(args.cfg_options)
+    if args.fp16:
+        cfg.fp16 = dict(loss_scale=512.)
+    if args.cudnn_benchmark:
+        cfg.cudnn_benchmark = True
 
     if args.launcher == 'none':
         raise NotImplementedError('Only supports distributed mode')
@@ -185,7 +244,8 @@ def main():
 
     repeat_measure_inference_speed(cfg, args.checkpoint, args.max_iter,
                                    args.log_interval, args.fuse_conv_bn,
-                                   args.repeat_num)
+                                   args.repeat_num, args.profile_stages,
+                                   args.batch_size, args.dummy_shape)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import os.path as osp
+import time
+from glob import glob
+
+import torch
+
+from mmdet.apis import (async_inference_rgbt_detector, inference_rgbt_detector,
+                        init_detector)
+from mmdet.utils.contextmanagers import concurrent
+
+IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the throughput of the synchronous and the '
+        'async inference of a rgbt two-stage detector')
+    parser.add_argument('config', help='test config file path')
+    parser.add_argument('checkpoint', help='checkpoint file')
+    parser.add_argument(
+        'lwir_dir',
+        help='Directory of lwir images, the visible image of each pair is '
+        'found by replacing "lwir" with "visible" in its path')
+    parser.add_argument(
+        '--max-pairs', type=int, default=200, help='Number of pairs to run')
+    parser.add_argument(
+        '--streamqueue-size',
+        type=int,
+        default=4,
+        help='Number of cuda streams, i.e. pairs that run concurrently')
+    parser.add_argument('--repeat-num', type=int, default=3)
+    parser.add_argument('--device', default='cuda:0')
+    args = parser.parse_args()
+    return args
+
+
+def collect_pairs(lwir_dir, max_pairs):
+    lwir_files = sorted(
+        f for f in glob(osp.join(lwir_dir, '**', '*'), recursive=True)
+        if f.lower().endswith(IMG_EXTENSIONS))[:max_pairs]
+    pairs = []
+    for lwir_file in lwir_files:
+        rgb_file = lwir_file.replace('lwir', 'visible')
+        assert osp.isfile(rgb_file), f'{rgb_file} does not exist'
+        pairs.append((rgb_file, lwir_file))
+    assert pairs, f'no image is found in {lwir_dir}'
+    return pairs
+
+
+async def run_async(model, pairs, streamqueue):
+
+    async def detect(pair):
+        async with concurrent(streamqueue):
+            return await async_inference_rgbt_detector(model, pair)
+
+    # the preprocessing of a pair runs on the cpu while the pairs of the
+    # other streams wait for their gpu work
+    tasks = [asyncio.create_task(detect(pair)) for pair in pairs]
+    return await asyncio.gather(*tasks)
+
+
+def run_sync(model, pairs):
+    with torch.cuda.stream(torch.cuda.default_stream()):
+        return [inference_rgbt_detector(model, pair) for pair in pairs]
+
+
+async def main():
+    args = parse_args()
+    assert args.device.startswith('cuda'), \
+        'async inference overlaps work on cuda streams'
+
+    model = init_detector(args.config, args.checkpoint, device=args.device)
+    pairs = collect_pairs(args.lwir_dir, args.max_pairs)
+
+    # queue is used for concurrent inference of multiple pairs,
+    # its size defines the concurrency level
+    streamqueue = asyncio.Queue()
+    for _ in range(args.streamqueue_size):
+        streamqueue.put_nowait(torch.cuda.Stream(device=args.device))
+
+    # warmup
+    run_sync(model, pairs[:1])
+    await run_async(model, pairs[:1], streamqueue)
+
+    print(f'{len(pairs)} pairs, {args.streamqueue_size} streams')
+    for i in range(args.repeat_num):
+        torch.cuda.synchronize()
+        start = time.perf_counter()
+        run_sync(model, pairs)
+        torch.cuda.synchronize()
+        sync_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await run_async(model, pairs, streamqueue)
+        torch.cuda.synchronize()
+        async_time = time.perf_counter() - start
+
+        print(f'run {i + 1}: sync {len(pairs) / sync_time:.2f} pairs/s, '
+              f'async {len(pairs) / async_time:.2f} pairs/s '
+              f'({async_time / sync_time:.2f} of the sync time)')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+import argparse
+import time
+
+import numpy as np
+import torch
+from mmcv import Config, DictAction
+
+from mmdet.core import BitmapMasks
+from mmdet.models import build_detector
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the peak memory and the training throughput '
+        'of a rgbt detector with activation checkpointing in its backbone '
+        'stages and TAF levels')
+    parser.add_argument('config', help='train config file path')
+    parser.add_argument(
+        '--settings',
+        nargs='+',
+        default=['none', 'backbone', 'taf', 'backbone,taf'],
+        help='Checkpointing settings to compare. "none", or comma separated '
+        'parts "backbone" and "taf", each optionally followed by one 0/1 '
+        'flag per stage/level, e.g. "backbone:1100,taf:100" only '
+        'checkpoints the first two backbone stages and the first TAF level. '
+        'Memory and speed are relative to the first setting that fits')
+    parser.add_argument('--batch-size', type=int, default=2)
+    parser.add_argument(
+        '--shape',
+        type=int,
+        nargs=2,
+        default=[1024, 1280],
+        help='h w of the random input images')
+    parser.add_argument(
+        '--num-gts', type=int, default=8, help='Number of gts per image')
+    parser.add_argument('--repeat-num', type=int, default=10)
+    parser.add_argument('--device', default='cuda')
+    parser.add_argument(
+        '--cfg-options',
+        nargs='+',
+        action=DictAction,
+        help='override some settings in the used config, the key-value pair '
+        'in xxx=yyy format will be merged into config file.')
+    args = parser.parse_args()
+    return args
+
+
+def parse_setting(setting):
+    """Parse a setting into a dict of the checkpointed parts, with one flag
+    per stage/level or None for all of them."""
+    spec = {}
+    if setting == 'none':
+        return spec
+    for part in setting.split(','):
+        name, _, flags = part.partition(':')
+        assert name in ('backbone', 'taf'), f'invalid setting {setting}'
+        spec[name] = [flag == '1' for flag in flags] if flags else None
+    return spec
+
+
+def set_with_cp(model, spec):
+    """Set ``with_cp`` of the res blocks of the backbones and of the TAF
+    levels of ``model`` according to ``spec``."""
+    for name in ('backbone', 'lwir_backbone'):
+        backbone = getattr(model, name, None)
+        if backbone is None:
+            continue
+        if not hasattr(backbone, 'res_layers'):
+            assert 'backbone' not in spec, \
+                f'{type(backbone).__name__} does not support checkpointing'
+            continue
+        flags = spec.get('backbone', [False] * len(backbone.res_layers))
+        flags = flags or [True] * len(backbone.res_layers)
+        assert len(flags) == len(backbone.res_layers)
+        for flag, layer_name in zip(flags, backbone.res_layers):
+            for block in getattr(backbone, layer_name):
+                block.with_cp = flag
+
+    taf = getattr(model, 'taf', None)
+    if taf is None or not hasattr(taf, 'with_cp'):
+        assert 'taf' not in spec, 'the TAF does not support checkpointing'
+        return
+    flags = spec.get('taf', [False] * len(taf.with_cp))
+    flags = flags or [True] * len(taf.with_cp)
+    assert len(flags) == len(taf.with_cp)
+    taf.with_cp = flags
+
+
+def dummy_train_batch(cfg, batch_size, shape, num_gts, device):
+    """Random images, boxes and box masks of a training batch."""
+    h, w = shape
+    lwir_c = cfg.model.get('share_weights', {}).get('lwir_in_channels', 3)
+    img_meta = dict(
+        img_shape=(h, w, 3),
+        ori_shape=(h, w, 3),
+        pad_shape=(h, w, 3),
+        batch_input_shape=(h, w),
+        scale_factor=np.ones(4, dtype=np.float32),
+        flip=False)
+    gt_bboxes, gt_labels, gt_masks = [], [], []
+    for _ in range(batch_size):
+        xy = np.random.uniform(0, [w - 64, h - 128], (num_gts, 2))
+        wh = np.random.uniform([16, 32], [64, 128], (num_gts, 2))
+        bboxes = np.concatenate([xy, xy + wh], 1).astype(np.float32)
+        masks = np.zeros((num_gts, h, w), dtype=np.uint8)
+        for mask, (x1, y1, x2, y2) in zip(masks, bboxes.astype(int)):
+            mask[y1:y2, x1:x2] = 1
+        gt_bboxes.append(torch.from_numpy(bboxes).to(device))
+        gt_labels.append(torch.zeros(num_gts, dtype=torch.long, device=device))
+        gt_masks.append(BitmapMasks(masks, h, w))
+    return dict(
+        rgb_img=torch.randn(batch_size, 3, h, w, device=device),
+        lwir_img=torch.randn(batch_size, lwir_c, h, w, device=device),
+        img_metas=[img_meta] * batch_size,
+        gt_bboxes=gt_bboxes,
+        gt_labels=gt_labels,
+        gt_masks=gt_masks)
+
+
+def measure(model, data, repeat_num):
+    """Return the peak memory in MB (cuda only) and the images per second
+    of training iterations."""
+    is_cuda = data['rgb_img'].is_cuda
+
+    def run():
+        loss, _ = model._parse_losses(model(**data))
+        loss.backward()
+        model.zero_grad(set_to_none=True)
+
+    run()  # warmup
+    if is_cuda:
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    start = time.perf_counter()
+    for _ in range(repeat_num):
+        run()
+    if is_cuda:
+        torch.cuda.synchronize()
+    elapsed = time.perf_counter() - start
+    peak = torch.cuda.max_memory_allocated() / 2**20 \
+        if is_cuda else float('nan')
+    return peak, repeat_num * data['rgb_img'].size(0) / elapsed
+
+
+def main():
+    args = parse_args()
+    cfg = Config.fromfile(args.config)
+    if args.cfg_options is not None:
+        cfg.merge_from_dict(args.cfg_options)
+    device = torch.device(args.device)
+
+    model = build_detector(
+        cfg.model, train_cfg=cfg.get('train_cfg'), test_cfg=cfg.get('test_cfg'))
+    model.to(device).train()
+    data = dummy_train_batch(cfg, args.batch_size, args.shape, args.num_gts,
+                             device)
+
+    header = ('setting', 'peak MB', 'img/s', 'memory', 'speed')
+    print(('{:>24}' + '{:>10}' * (len(header) - 1)).format(*header))
+    base = None  # peak memory and throughput of the first setting that fits
+    for setting in args.settings:
+        set_with_cp(model, parse_setting(setting))
+        try:
+            peak, throughput = measure(model, data, args.repeat_num)
+        except RuntimeError as e:  # out of memory
+            if 'out of memory' not in str(e):
+                raise
+            model.zero_grad(set_to_none=True)
+            torch.cuda.empty_cache()
+            print('{:>24}{:>10}'.format(setting, 'OOM'))
+            continue
+        base = base or (peak, throughput)
+        print('{:>24}{:>10.1f}{:>10.2f}{:>10.2f}{:>10.2f}'.format(
+            setting, peak, throughput, peak / base[0], throughput / base[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.models.utils.zx_cross_non_local import zxCrossNonLocal2d
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the peak memory and time of zxCrossNonLocal2d '
+        'with and without chunked attention')
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[40, 32, 64, 48, 80, 64, 128, 96],
+        help='Feature map sizes as a list of h w pairs, e.g. 80 64 is the '
+        'stride-8 map of a 640x512 image')
+    parser.add_argument(
+        '--chunk-sizes',
+        type=int,
+        nargs='+',
+        default=[0, 1024, 4096],
+        help='Chunk sizes to compare, 0 builds the full pairwise matrix')
+    parser.add_argument('--batch-size', type=int, default=2)
+    parser.add_argument('--channels', type=int, default=256)
+    parser.add_argument(
+        '--mode',
+        default='embedded_gaussian',
+        choices=['gaussian', 'embedded_gaussian', 'dot_product'])
+    parser.add_argument(
+        '--train', action='store_true', help='Also run the backward pass')
+    parser.add_argument('--repeat-num', type=int, default=10)
+    parser.add_argument('--device', default='cuda')
+    args = parser.parse_args()
+    assert len(args.sizes) % 2 == 0, '--sizes must be h w pairs'
+    return args
+
+
+def measure(module, rgb_x, lwir_x, train, repeat_num):
+    """Return the peak memory in MB (cuda only) and mean time in ms."""
+    is_cuda = rgb_x.is_cuda
+
+    def run():
+        with torch.set_grad_enabled(train):
+            out = module(rgb_x, lwir_x)
+            if train:
+                out.sum().backward()
+
+    run()  # warmup
+    if is_cuda:
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+        base = torch.cuda.memory_allocated()
+    start = time.perf_counter()
+    for _ in range(repeat_num):
+        run()
+    if is_cuda:
+        torch.cuda.synchronize()
+    elapsed = (time.perf_counter() - start) / repeat_num * 1000
+    peak = (torch.cuda.max_memory_allocated() - base) / 2**20 \
+        if is_cuda else float('nan')
+    return peak, elapsed
+
+
+def main():
+    args = parse_args()
+    device = torch.device(args.device)
+    module = zxCrossNonLocal2d(mode=args.mode).to(device)
+
+    header = ('h', 'w', 'HxW', 'chunk', 'peak MB', 'time ms')
+    print(('{:>10}' * len(header)).format(*header))
+    for h, w in zip(args.sizes[::2], args.sizes[1::2]):
+        rgb_x = torch.randn(
+            args.batch_size, args.channels, h, w, device=device,
+            requires_grad=args.train)
+        lwir_x = torch.randn_like(rgb_x, requires_grad=args.train)
+        for chunk_size in args.chunk_sizes:
+            module.chunk_size = chunk_size or None
+            try:
+                peak, elapsed = measure(module, rgb_x, lwir_x, args.train,
+                                        args.repeat_num)
+            except RuntimeError as e:  # out of memory
+                if 'out of memory' not in str(e):
+                    raise
+                torch.cuda.empty_cache()
+                peak, elapsed = float('inf'), float('inf')
+            print('{:>10d}{:>10d}{:>10d}{:>10}{:>10.1f}{:>10.2f}'.format(
+                h, w, h * w, chunk_size or 'full', peak, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import contextlib
+import io
+import itertools
+import os.path as osp
+import re
+import sys
+from glob import glob
+from multiprocessing import Pool
+
+import mmcv
+import numpy as np
+from mmcv import Config, DictAction
+
+from mmdet.core import iter_det_shards
+from mmdet.datasets import build_dataset
+from mmdet.utils import update_data_root
+
+sys.path.insert(0, osp.join(osp.dirname(__file__), '../..'))
+from mr_evaluation_script.evaluation_script import (  # noqa: E402
+    KAIST, evaluate)
+
+_worker_gt = None
+_worker_img_ids = None
+_worker_id_map = None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Evaluate the KAIST miss rate (MR_all/day/night) of the '
+        'result pickles of several checkpoints in parallel')
+    parser.add_argument('config', help='Config of the model')
+    parser.add_argument(
+        'pkl_root',
+        help='Directory with the results of each checkpoint saved as '
+        'epoch_{N}.pkl, or streamed as the npz shards of epoch_{N}/')
+    parser.add_argument(
+        '--epochs',
+        type=int,
+        nargs='+',
+        help='Epochs to evaluate, all epoch_{N}.pkl and epoch_{N}/ in '
+        'pkl_root by default')
+    parser.add_argument(
+        '--ann-file',
+        default=osp.join(
+            osp.dirname(__file__),
+            '../../mr_evaluation_script/KAIST_annotation.json'),
+        help='KAIST test annotation file of the MR evaluation')
+    parser.add_argument(
+        '--score-thr',
+        type=float,
+        nargs='+',
+        default=[0.0],
+        help='Detections with a lower score are dropped, several values are '
+        'swept')
+    parser.add_argument(
+        '--aspect-ratio-thr',
+        type=float,
+        nargs='+',
+        default=[1.0],
+        help='Detections with a larger width/height ratio are dropped, '
+        'several values are swept')
+    parser.add_argument(
+        '--class-id',
+        type=int,
+        default=0,
+        help='Index of the person class in the results')
+    parser.add_argument(
+        '--workers', type=int, default=4, help='Number of processes')
+    parser.add_argument(
+        '--out', help='Optional csv file to save the table of results')
+    parser.add_argument(
+        '--cfg-options',
+        nargs='+',
+        action=DictAction,
+        help='override some settings in the used config, the key-value pair '
+        'in xxx=yyy format will be merged into config file.')
+    args = parser.parse_args()
+    return args
+
+
+def get_kaist_img_ids(data_infos, kaist_gt):
+    """Map every image of the test dataset to its KAIST annotation id.
+
+    The images are matched by name: ``set06_V000_I00019.png`` is
+    ``set06/V000/I00019`` in the annotation file.
+    """
+    name2id = {img['im_name']: img['id'] for img in kaist_gt.dataset['images']}
+    return np.array([
+        name2id[osp.splitext(osp.basename(info['filename']))[0].replace(
+            '_', '/')] for info in data_infos
+    ])
+
+
+def det2json(det_results,
+             img_ids,
+             class_id=0,
+             score_thr=0.0,
+             aspect_ratio_thr=1.0):
+    """Convert the results of ``single_gpu_test`` to KAIST json annotations.
+
+    Boxes are converted from (x1, y1, x2, y2) to the (x, y, w, h) of the
+    KAIST evaluation with the same +0.5/+1 offsets as the text files used
+    before, in the dtype of the results.
+    """
+    anns = []
+    for img_id, result in zip(img_ids, det_results):
+        bboxes = result[class_id]
+        if bboxes.shape[0] == 0:
+            continue
+        bboxes = bboxes.copy()
+        bboxes[:, 2:4] = bboxes[:, 2:4] - bboxes[:, 0:2] + 1.0
+        bboxes[:, 0:2] = bboxes[:, 0:2] + 0.5
+        bboxes = bboxes[bboxes[:, 4] >= score_thr]
+        bboxes = bboxes[bboxes[:, 2] / bboxes[:, 3] <= aspect_ratio_thr]
+        img_id = int(img_id)
+        anns.extend(
+            dict(image_id=img_id, category_id=1, bbox=bbox[:4], score=bbox[4])
+            for bbox in bboxes.tolist())
+    return anns
+
+
+def shard2json(shard,
+               id_map,
+               class_id=0,
+               score_thr=0.0,
+               aspect_ratio_thr=1.0):
+    """Convert a shard of ``DetResultWriter`` to KAIST json annotations.
+
+    Same conversion as :func:`det2json`, on the box columns of the shard,
+    whose image ids are mapped to the KAIST ids by ``id_map``.
+    """
+    keep = shard['labels'] == class_id
+    img_ids = shard['img_ids'][keep]
+    bboxes = shard['bboxes'][keep]
+    bboxes[:, 2:4] = bboxes[:, 2:4] - bboxes[:, 0:2] + 1.0
+    bboxes[:, 0:2] = bboxes[:, 0:2] + 0.5
+    keep = (bboxes[:, 4] >= score_thr) & \
+        (bboxes[:, 2] / bboxes[:, 3] <= aspect_ratio_thr)
+    return [
+        dict(
+            image_id=id_map[img_id],
+            category_id=1,
+            bbox=bbox[:4],
+            score=bbox[4])
+        for img_id, bbox in zip(img_ids[keep].tolist(),
+                                bboxes[keep].tolist())
+    ]
+
+
+def _init_worker(ann_file, img_ids, dataset_img_ids):
+    global _worker_gt, _worker_img_ids, _worker_id_map
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_gt = KAIST(ann_file)
+    _worker_img_ids = img_ids
+    _worker_id_map = dict(zip(dataset_img_ids, img_ids.tolist()))
+
+
+def _eval_epoch(task):
+    epoch, pkl_file, thrs, class_id = task
+    if osp.isdir(pkl_file):
+        # the shards are converted one at a time for all the thresholds
+        thr_anns = [[] for _ in thrs]
+        num_imgs = 0
+        for shard in iter_det_shards(pkl_file):
+            num_imgs += len(shard['shard_img_ids'])
+            for anns, (score_thr, aspect_ratio_thr) in zip(thr_anns, thrs):
+                anns.extend(
+                    shard2json(shard, _worker_id_map, class_id, score_thr,
+                               aspect_ratio_thr))
+    else:
+        det_results = mmcv.load(pkl_file)
+        num_imgs = len(det_results)
+        thr_anns = [
+            det2json(det_results, _worker_img_ids, class_id, score_thr,
+                     aspect_ratio_thr)
+            for score_thr, aspect_ratio_thr in thrs
+        ]
+        del det_results
+    assert num_imgs == len(_worker_img_ids), \
+        f'{pkl_file} has {num_imgs} results but the test set ' \
+        f'has {len(_worker_img_ids)} images'
+    rows = []
+    for (score_thr, aspect_ratio_thr), anns in zip(thrs, thr_anns):
+        if not anns:
+            # KAIST.loadRes raises on an empty list, and without any
+            # detection every pedestrian is missed: MR = 100%
+            rows.append((epoch, score_thr, aspect_ratio_thr, 100., 100., 100.))
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            eval_result = evaluate(_worker_gt, anns, method=f'epoch_{epoch}')
+        rows.append((epoch, score_thr, aspect_ratio_thr,
+                     *[eval_result[name].summarize(0) * 100
+                       for name in ('all', 'day', 'night')]))
+    return rows
+
+
+def main():
+    args = parse_args()
+
+    cfg = Config.fromfile(args.config)
+
+    # update data root according to MMDET_DATASETS
+    update_data_root(cfg)
+
+    if args.cfg_options is not None:
+        cfg.merge_from_dict(args.cfg_options)
+    cfg.data.test.test_mode = True
+
+    # the image-id index is built once and shared by all workers
+    dataset = build_dataset(cfg.data.test)
+    with contextlib.redirect_stdout(io.StringIO()):
+        img_ids = get_kaist_img_ids(dataset.data_infos, KAIST(args.ann_file))
+
+    if args.epochs is None:
+        epochs = sorted({
+            int(m.group(1))
+            for m in (re.fullmatch(r'epoch_(\d+)(\.pkl)?', osp.basename(f))
+                      for f in glob(osp.join(args.pkl_root, 'epoch_*')))
+            if m
+        })
+    else:
+        epochs = args.epochs
+    thrs = list(itertools.product(args.score_thr, args.aspect_ratio_thr))
+    tasks = []
+    for epoch in epochs:
+        # the shards streamed by the EvalHook are preferred to the pickle
+        pkl_file = osp.join(args.pkl_root, f'epoch_{epoch}')
+        if not osp.isdir(pkl_file):
+            pkl_file += '.pkl'
+        tasks.append((epoch, pkl_file, thrs, args.class_id))
+
+    with Pool(
+            min(args.workers, len(tasks)),
+            initializer=_init_worker,
+            initargs=(args.ann_file, img_ids,
+                      getattr(dataset, 'img_ids',
+                              list(range(len(dataset)))))) as pool:
+        rows = [row for rows in pool.imap(_eval_epoch, tasks) for row in rows]
+
+    header = ('epoch', 'score_thr', 'ar_thr', 'MR_all', 'MR_day', 'MR_night')
+    print(('{:>8}' * len(header)).format(*header))
+    for row in rows:
+        print('{:>8d}{:>8.2f}{:>8.2f}{:>8.2f}{:>8.2f}{:>8.2f}'.format(*row))
+    best = min(rows, key=lambda row: row[3])
+    print(f'best MR_all: {best[3]:.2f} at epoch {best[0]} '
+          f'(score_thr={best[1]}, ar_thr={best[2]})')
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(','.join(header) + '\n')
+            for row in rows:
+                f.write(','.join(str(v) for v in row) + '\n')
+
+
+if __name__ == '__main__':
+    main()
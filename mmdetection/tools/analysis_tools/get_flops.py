@@ -5,7 +5,9 @@ import numpy as np
 import torch
 from mmcv import Config, DictAction
 
+from mmdet.apis import prepare_dummy_rgbt_data
 from mmdet.models import build_detector
+from mmdet.utils.profiling import StageProfiler
 
 try:
     from mmcv.cnn import get_model_complexity_info
@@ -21,7 +23,8 @@ def parse_args():
         type=int,
         nargs='+',
         default=[1280, 800],
-        help='input image size')
+        help='input image size, for rgbt models the size of the random '
+        'image pair that is passed through the test pipeline')
     parser.add_argument(
         '--cfg-options',
         nargs='+',
@@ -42,6 +45,46 @@ def parse_args():
     return args
 
 
+class StageFlopsCounter(StageProfiler):
+    """FLOPs of every stage of a rgbt detector.
+
+    The FLOPs counted by the hooks of mmcv so far are read when a stage is
+    entered and when it returns, so a backbone shared by both modalities is
+    split into its rgb and lwir calls. Stages must not be leaf modules, whose
+    FLOPs are only counted after their forward returns.
+    """
+
+    def _event(self):
+        return sum(getattr(m, '__flops__', 0) for m in self.model.modules())
+
+    @staticmethod
+    def _elapsed(start, end):
+        return end - start
+
+
+def rgbt_flops(model, cfg, shape):
+    """Count the FLOPs of a rgbt detector on a random image pair passed
+    through its test pipeline, in total and per stage."""
+    data = prepare_dummy_rgbt_data(
+        cfg, shape, device=next(model.parameters()).device)
+    input_shape = (tuple(data['rgb_img'][0].shape[1:]),
+                   tuple(data['lwir_img'][0].shape[1:]))
+
+    counter = StageFlopsCounter(model)
+    with torch.no_grad():
+        flops, params = get_model_complexity_info(
+            model,
+            input_shape[0],
+            input_constructor=lambda _: dict(
+                return_loss=False, rescale=True, **data))
+    counter.remove()
+    stages = {
+        name: stat['mean']
+        for name, stat in counter.summary().items()
+    }
+    return flops, params, input_shape, stages
+
+
 def main():
 
     args = parse_args()
@@ -72,6 +115,26 @@ def main():
         model.cuda()
     model.eval()
 
+    split_line = '=' * 30
+    if cfg.data.test.pipeline[0].type.startswith('LoadRGBT'):
+        # two modalities, fed by the test pipeline
+        flops, params, input_shape, stages = rgbt_flops(
+            model, cfg, ori_shape[1:])
+        print(f'{split_line}\nImage pair of {ori_shape[1:]} resized and '
+              'padded by the test pipeline\n')
+        print(f'{split_line}\nInput shape: rgb {input_shape[0]}, '
+              f'lwir {input_shape[1]}\n'
+              f'Flops: {flops}\nParams: {params}\n{split_line}')
+        total = stages.pop('total')
+        for name, stage_flops in stages.items():
+            print(f'{name:<28}{stage_flops / 1e9:>10.2f} GFLOPs '
+                  f'{100 * stage_flops / max(total, 1):>6.1f}%')
+        print(split_line)
+        print('!!!Please be cautious if you use the results in papers. '
+              'You may need to check if all ops are supported and verify '
+              'that the flops computation is correct.')
+        return
+
     if hasattr(model, 'forward_dummy'):
         model.forward = model.forward_dummy
     else:
@@ -80,7 +143,6 @@ def main():
             format(model.__class__.__name__))
 
     flops, params = get_model_complexity_info(model, input_shape)
-    split_line = '=' * 30
 
     if divisor > 0 and \
             input_shape != ori_shape:
@@ -13,11 +13,13 @@ from mmcv.runner import (get_dist_info, init_dist, load_checkpoint,
                          wrap_fp16_model)
 
 from mmdet.apis import multi_gpu_test, single_gpu_test
+from mmdet.core import DetResultWriter
 from mmdet.datasets import (build_dataloader, build_dataset,
                             replace_ImageToTensor)
 from mmdet.models import build_detector
 from mmdet.utils import (build_ddp, build_dp, compat_cfg, get_device,
                          setup_multi_processes, update_data_root)
+from mmdet.utils.profiling import StageProfiler
 
 
 def parse_args():
@@ -29,6 +31,11 @@ def parse_args():
         '--work-dir',
         help='the directory to save the file containing evaluation metrics')
     parser.add_argument('--out', help='output result file in pickle format')
+    parser.add_argument(
+        '--out-shards',
+        help='directory to stream the bbox results to as npz shards during '
+        'the test instead of keeping them in memory, only for '
+        'non-distributed testing')
     parser.add_argument(
         '--fuse-conv-bn',
         action='store_true',
@@ -66,6 +73,11 @@ def parse_args():
         type=float,
         default=0.3,
         help='score threshold (default: 0.3)')
+    parser.add_argument(
+        '--profile-stages',
+        help='json file to dump the p50/p95 latency of every stage of the '
+        'rgbt detector to, e.g. backbones, taf levels, rpn and bbox head, '
+        'only for non-distributed testing')
     parser.add_argument(
         '--gpu-collect',
         action='store_true',
@@ -120,11 +132,12 @@ def parse_args():
 def main():
     args = parse_args()
 
-    assert args.out or args.eval or args.format_only or args.show \
-        or args.show_dir, \
+    assert args.out or args.out_shards or args.eval or args.format_only \
+        or args.show or args.show_dir or args.profile_stages, \
         ('Please specify at least one operation (save/eval/format/show the '
-         'results / save the results) with the argument "--out", "--eval"'
-         ', "--format-only", "--show" or "--show-dir"')
+         'results / save the results / profile) with the argument "--out", '
+         '"--out-shards", "--eval", "--format-only", "--show", "--show-dir" '
+         'or "--profile-stages"')
 
     if args.eval and args.format_only:
         raise ValueError('--eval and --format_only cannot be both specified')
@@ -230,10 +243,31 @@ def main():
         model.CLASSES = dataset.CLASSES
 
     if not distributed:
+        if args.profile_stages:
+            profiler = StageProfiler(model)
         model = build_dp(model, cfg.device, device_ids=cfg.gpu_ids)
+        result_writer = DetResultWriter(
+            args.out_shards, getattr(dataset, 'img_ids',
+                                     None)) if args.out_shards else None
         outputs = single_gpu_test(model, data_loader, args.show, args.show_dir,
-                                  args.show_score_thr)
+                                  args.show_score_thr, result_writer)
+        if args.out_shards:
+            print(f'\nresults are written to {args.out_shards}')
+            # the dataset reads the shards one at a time from the directory
+            outputs = args.out_shards
+            if args.out:
+                warnings.warn('--out is ignored with --out-shards, the '
+                              'results are only saved as shards')
+                args.out = None
+        if args.profile_stages:
+            print(f'\n{profiler.format()}')
+            print(f'writing stage latencies to {args.profile_stages}')
+            profiler.dump(args.profile_stages)
     else:
+        if args.profile_stages:
+            warnings.warn('--profile-stages is ignored in distributed mode')
+        if args.out_shards:
+            warnings.warn('--out-shards is ignored in distributed mode')
         model = build_ddp(
             model,
             cfg.device,
@@ -255,7 +289,7 @@ def main():
             # hard-code way to remove EvalHook args
             for key in [
                     'interval', 'tmpdir', 'start', 'gpu_collect', 'save_best',
-                    'rule', 'dynamic_intervals'
+                    'rule', 'dynamic_intervals', 'stream_results'
             ]:
                 eval_kwargs.pop(key, None)
             eval_kwargs.update(dict(metric=args.eval, **kwargs))
@@ -67,6 +67,8 @@ if str(ROOT) not in sys.path:
 if platform.system() != 'Windows':
     ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 
+from models import yolo_mediumFusion
+from models.common import DeformConv2dPack, TargetAwareFusion, is_rgbt, rgbt_channels, switch_deform_conv
 from models.experimental import attempt_load
 from models.yolo import ClassificationModel, Detect, DetectionModel, SegmentationModel
 from utils.dataloaders import LoadImages
@@ -163,7 +165,7 @@ def export_onnx(model, im, file, opset, dynamic, simplify, prefix=colorstr('ONNX
         if isinstance(model, SegmentationModel):
             dynamic['output0'] = {0: 'batch', 1: 'anchors'}  # shape(1,25200,85)
             dynamic['output1'] = {0: 'batch', 2: 'mask_height', 3: 'mask_width'}  # shape(1,32,160,160)
-        elif isinstance(model, DetectionModel):
+        elif isinstance(model, (DetectionModel, yolo_mediumFusion.DetectionModel)):
             dynamic['output0'] = {0: 'batch', 1: 'anchors'}  # shape(1,25200,85)
 
     torch.onnx.export(
@@ -743,15 +745,24 @@ def run(
     # Input
     gs = int(max(model.stride))  # grid size (max stride)
     imgsz = [check_img_size(x, gs) for x in imgsz]  # verify img_size are gs-multiples
-    im = torch.zeros(batch_size, 3, *imgsz).to(device)  # image size(1,3,320,192) BCHW iDetection
+    ch = rgbt_channels(model) if is_rgbt(model) else 3  # RGB-T models stack visible and lwir images to 6 (4) channels
+    im = torch.zeros(batch_size, ch, *imgsz).to(device)  # image size(1,3,320,192) BCHW iDetection
+    if ch > 3 and opset < 16:
+        LOGGER.warning(f'WARNING ⚠️ RGB-T deformable convolutions export to GridSample, updating --opset {opset} to 16')
+        opset = 16
 
     # Update model
     model.eval()
+    switch_deform_conv(model)  # the mmcv deformable convolution op can not be exported
     for k, m in model.named_modules():
-        if isinstance(m, Detect):
+        if isinstance(m, (Detect, yolo_mediumFusion.Detect)):
             m.inplace = inplace
             m.dynamic = dynamic
             m.export = True
+        elif isinstance(m, DeformConv2dPack):
+            m.export = True  # grid_sample and matmul instead of the torchvision op
+        elif isinstance(m, TargetAwareFusion):
+            m.deploy = True  # no mask-supervision outputs
 
     for _ in range(2):
         y = model(im)  # dry runs
@@ -806,6 +817,7 @@ def run(
     f = [str(x) for x in f if x]  # filter out '' and None
     if any(f):
         cls, det, seg = (isinstance(model, x) for x in (ClassificationModel, DetectionModel, SegmentationModel))  # type
+        det |= isinstance(model, yolo_mediumFusion.DetectionModel)  # RGB-T
         det &= not seg  # segmentation models inherit from SegmentationModel(DetectionModel)
         dir = Path('segment' if seg else 'classify' if cls else '')
         h = '--half' if half else ''  # --half FP16 inference arg
@@ -7,7 +7,9 @@ import ast
 import contextlib
 import json
 import math
+import pickle
 import platform
+import types
 import warnings
 import zipfile
 from collections import OrderedDict, namedtuple
@@ -23,7 +25,13 @@ import torch
 import torch.nn as nn
 from PIL import Image
 from torch.cuda import amp
-from mmcv.ops import ModulatedDeformConv2dPack
+from torch.nn.modules.utils import _pair, _single
+from torchvision.ops import deform_conv2d
+
+try:
+    from mmcv.ops import ModulatedDeformConv2dPack
+except ImportError:  # mmcv CUDA extension not installed, TargetAwareFusion falls back to DeformConv2dPack
+    ModulatedDeformConv2dPack = None
 
 # Import 'ultralytics' package or install if if missing
 try:
@@ -349,12 +357,19 @@ class DetectMultiBackend(nn.Module):
         fp16 &= pt or jit or onnx or engine or triton  # FP16
         nhwc = coreml or saved_model or pb or tflite or edgetpu  # BHWC formats (vs torch BCWH)
         stride = 32  # default stride
+        ch = None  # input channels (3, or 6/4 for RGB-T models), None if the format does not tell
         cuda = torch.cuda.is_available() and device.type != 'cpu'  # use CUDA
         if not (pt or triton):
             w = attempt_download(w)  # download if not local
 
         if pt:  # PyTorch
             model = attempt_load(weights if isinstance(weights, list) else w, device=device, inplace=True, fuse=fuse)
+            if not cuda:
+                switch_deform_conv(model)  # mmcv deformable convolutions require its CUDA extension
+            ch = rgbt_channels(model) if is_rgbt(model) else 3
+            for m in model.modules():
+                if isinstance(m, TargetAwareFusion):
+                    m.deploy = True  # inference only
             stride = max(int(model.stride.max()), 32)  # model stride
             names = model.module.names if hasattr(model, 'module') else model.names  # get class names
             model.half() if fp16 else model.float()
@@ -370,10 +385,14 @@ class DetectMultiBackend(nn.Module):
                                    int(k) if k.isdigit() else k: v
                                    for k, v in d.items()})
                 stride, names = int(d['stride']), d['names']
+                ch = d['shape'][1]
         elif dnn:  # ONNX OpenCV DNN
             LOGGER.info(f'Loading {w} for ONNX OpenCV DNN inference...')
             check_requirements('opencv-python>=4.5.4')
             net = cv2.dnn.readNetFromONNX(w)
+            with contextlib.suppress(ImportError):
+                import onnx
+                ch = onnx.load(w).graph.input[0].type.tensor_type.shape.dim[1].dim_value or None
         elif onnx:  # ONNX Runtime
             LOGGER.info(f'Loading {w} for ONNX Runtime inference...')
             check_requirements(('onnx', 'onnxruntime-gpu' if cuda else 'onnxruntime'))
@@ -381,6 +400,8 @@ class DetectMultiBackend(nn.Module):
             providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] if cuda else ['CPUExecutionProvider']
             session = onnxruntime.InferenceSession(w, providers=providers)
             output_names = [x.name for x in session.get_outputs()]
+            ch = session.get_inputs()[0].shape[1]
+            ch = ch if isinstance(ch, int) else None  # dynamic axes are named
             meta = session.get_modelmeta().custom_metadata_map  # metadata
             if 'stride' in meta:
                 stride, names = int(meta['stride']), eval(meta['names'])
@@ -394,6 +415,8 @@ class DetectMultiBackend(nn.Module):
             ov_model = core.read_model(model=w, weights=Path(w).with_suffix('.bin'))
             if ov_model.get_parameters()[0].get_layout().empty:
                 ov_model.get_parameters()[0].set_layout(Layout('NCHW'))
+            ch_dim = ov_model.get_parameters()[0].get_partial_shape()[1]
+            ch = ch_dim.get_length() if ch_dim.is_static else None
             batch_dim = get_batch(ov_model)
             if batch_dim.is_static:
                 batch_size = batch_dim.get_length()
@@ -430,6 +453,7 @@ class DetectMultiBackend(nn.Module):
                 bindings[name] = Binding(name, dtype, shape, im, int(im.data_ptr()))
             binding_addrs = OrderedDict((n, d.ptr) for n, d in bindings.items())
             batch_size = bindings['images'].shape[0]  # if dynamic, this is instead max batch size
+            ch = bindings['images'].shape[1]
         elif coreml:  # CoreML
             LOGGER.info(f'Loading {w} for CoreML inference...')
             import coremltools as ct
@@ -602,9 +626,11 @@ class DetectMultiBackend(nn.Module):
         return torch.from_numpy(x).to(self.device) if isinstance(x, np.ndarray) else x
 
     def warmup(self, imgsz=(1, 3, 640, 640)):
-        # Warmup model by running inference once
+        # Warmup model by running inference once, the channels of imgsz follow the model input (RGB-T 6/4) if known
         warmup_types = self.pt, self.jit, self.onnx, self.engine, self.saved_model, self.pb, self.triton
         if any(warmup_types) and (self.device.type != 'cpu' or self.triton):
+            if self.ch:
+                imgsz = (imgsz[0], self.ch, *imgsz[2:])
             im = torch.empty(*imgsz, dtype=torch.half if self.fp16 else torch.float, device=self.device)  # input
             for _ in range(2 if self.jit else 1):  #
                 self.forward(im)  # warmup
@@ -934,18 +960,117 @@ class SELayer(nn.Module):
         y = self.fc(y).view(b, c, 1, 1)
         return x * y.expand_as(x)
 
+class DeformConv2dPack(nn.Module):
+    # Modulated deformable convolution (DCNv2) with the attributes and state_dict layout of mmcv
+    # ModulatedDeformConv2dPack, run by torchvision.ops.deform_conv2d or, in export mode, by grid_sample and matmul
+    export = False  # export mode, plain ONNX/TorchScript ops instead of the torchvision custom op
+
+    def __init__(self, in_channels, out_channels, kernel_size, stride=1, padding=0, dilation=1, groups=1,
+                 deform_groups=1, bias=True):
+        super().__init__()
+        self.in_channels = in_channels
+        self.out_channels = out_channels
+        self.kernel_size = _pair(kernel_size)
+        self.stride = _pair(stride)
+        self.padding = _pair(padding)
+        self.dilation = _pair(dilation)
+        self.groups = groups
+        self.deform_groups = deform_groups
+        self.transposed = False  # nn.Conv2d compatibility
+        self.output_padding = _single(0)
+        self.weight = nn.Parameter(torch.empty(out_channels, in_channels // groups, *self.kernel_size))
+        self.bias = nn.Parameter(torch.empty(out_channels)) if bias else None
+        self.conv_offset = nn.Conv2d(in_channels,
+                                     deform_groups * 3 * self.kernel_size[0] * self.kernel_size[1],
+                                     kernel_size=self.kernel_size,
+                                     stride=self.stride,
+                                     padding=self.padding,
+                                     dilation=self.dilation,
+                                     bias=True)
+        self.init_weights()
+
+    def init_weights(self):
+        # mmcv initialization, zero offsets and 0.5 masks start as a regular convolution at half gain
+        stdv = 1. / math.sqrt(self.in_channels * self.kernel_size[0] * self.kernel_size[1])
+        self.weight.data.uniform_(-stdv, stdv)
+        if self.bias is not None:
+            self.bias.data.zero_()
+        self.conv_offset.weight.data.zero_()
+        self.conv_offset.bias.data.zero_()
+
+    def forward(self, x):
+        o1, o2, mask = torch.chunk(self.conv_offset(x), 3, dim=1)
+        offset = torch.cat((o1, o2), dim=1)  # (dy, dx) pairs of every kernel tap
+        mask = torch.sigmoid(mask)
+        if self.export:
+            return self.forward_export(x, offset, mask)
+        return deform_conv2d(x, offset, self.weight, self.bias, self.stride, self.padding, self.dilation, mask)
+
+    def forward_export(self, x, offset, mask):
+        # Bilinear samples of every kernel tap via grid_sample, outside samples are zero as in deform_conv2d
+        assert self.groups == 1 and self.deform_groups == 1, 'export supports groups=1 and deform_groups=1 only'
+        b, c, h, w = x.shape
+        ho, wo = offset.shape[2:]
+        kh, kw = self.kernel_size
+        k = kh * kw  # kernel taps
+        ky = torch.arange(kh, device=x.device, dtype=x.dtype) * self.dilation[0] - self.padding[0]
+        kx = torch.arange(kw, device=x.device, dtype=x.dtype) * self.dilation[1] - self.padding[1]
+        ky, kx = torch.meshgrid(ky, kx, indexing='ij')
+        gy = torch.arange(ho, device=x.device, dtype=x.dtype).view(1, 1, ho, 1) * self.stride[0]
+        gx = torch.arange(wo, device=x.device, dtype=x.dtype).view(1, 1, 1, wo) * self.stride[1]
+        py = gy + ky.reshape(1, k, 1, 1) + offset[:, 0::2]  # sampling rows (b,k,ho,wo)
+        px = gx + kx.reshape(1, k, 1, 1) + offset[:, 1::2]  # sampling columns (b,k,ho,wo)
+        # normalized xy with align_corners=False, pixel centers at (2p+1)/size-1, defined for 1-pixel inputs too
+        grid = torch.stack(((2 * px + 1) / w - 1, (2 * py + 1) / h - 1), -1)
+        samples = nn.functional.grid_sample(x, grid.view(b, k * ho, wo, 2), align_corners=False)  # (b,c,k*ho,wo)
+        samples = samples.view(b, c, k, ho, wo) * mask.view(b, 1, k, ho, wo)
+        out = torch.matmul(self.weight.view(self.out_channels, c * k), samples.view(b, c * k, ho * wo))
+        out = out.view(b, self.out_channels, ho, wo)
+        return out if self.bias is None else out + self.bias.view(1, -1, 1, 1)
+
+
+def switch_deform_conv(model, impl='torchvision'):
+    # Swap the deformable convolutions of `model` in place to the 'torchvision' (DeformConv2dPack) or 'mmcv'
+    # (ModulatedDeformConv2dPack) implementation, parameters are shared so the state_dict is unchanged
+    cls = DeformConv2dPack if impl == 'torchvision' else ModulatedDeformConv2dPack
+    assert cls is not None, f'{impl} deformable convolution requires mmcv, use impl=torchvision'
+    others = tuple(x for x in (DeformConv2dPack, ModulatedDeformConv2dPack) if x not in (None, cls))
+    for name, m in list(model.named_modules()):
+        if isinstance(m, others):
+            dcn = cls(m.in_channels, m.out_channels, m.kernel_size, m.stride, m.padding, m.dilation, m.groups,
+                      m.deform_groups, m.bias is not None)
+            dcn.weight, dcn.bias, dcn.conv_offset = m.weight, m.bias, m.conv_offset
+            dcn.train(m.training)
+            parent, _, attr = name.rpartition('.')
+            setattr(model.get_submodule(parent) if parent else model, attr, dcn)
+    return model
+
+
+class _DeformConvUnpickler(pickle.Unpickler):
+    # Unpickle models saved with mmcv deformable convolutions where mmcv is not installed
+    def find_class(self, module, name):
+        if module.startswith('mmcv.') and name == 'ModulatedDeformConv2dPack':
+            return DeformConv2dPack
+        return super().find_class(module, name)
+
+
+deform_conv_pickle = types.ModuleType('deform_conv_pickle')  # torch.load(pickle_module=) for checkpoints without mmcv
+deform_conv_pickle.Unpickler, deform_conv_pickle.load = _DeformConvUnpickler, pickle.load
+
+
 # tnnls version
 class TargetAwareFusion(nn.Module):
     # zxue defined fusion module
+    deploy = False  # inference only, skip the mask-supervision outputs that only feed ComputeLoss
+
     def __init__(self, c, layer_idx):
         super(TargetAwareFusion, self).__init__()
         self.layer_idx = layer_idx
         self.cos = torch.nn.functional.cosine_similarity
         self.sigmoid = torch.nn.Sigmoid()
-        self.add_module(f'rgb_deformable_layer_{layer_idx}',
-                        ModulatedDeformConv2dPack(c, c, kernel_size=3, padding=1))
-        self.add_module(f'lwir_deformable_layer_{layer_idx}',
-                        ModulatedDeformConv2dPack(c, c, kernel_size=3, padding=1))
+        dcn = ModulatedDeformConv2dPack or DeformConv2dPack  # same weights, see switch_deform_conv()
+        self.add_module(f'rgb_deformable_layer_{layer_idx}', dcn(c, c, kernel_size=3, padding=1))
+        self.add_module(f'lwir_deformable_layer_{layer_idx}', dcn(c, c, kernel_size=3, padding=1))
         self.add_module(f'group_conv3d_layer_{layer_idx}',
                         nn.Sequential(
                             nn.Conv3d(c, c, (2, 1, 1), groups=c, bias=False),
@@ -983,4 +1108,60 @@ class TargetAwareFusion(nn.Module):
         tmp_fused_res = self.sigmoid(s_logits) * tmp_fused_res
         tmp_fused_res = getattr(self, f'spatial_layer_{self.layer_idx}')(tmp_fused_res)
 
+        if self.deploy:
+            return tmp_fused_res, None, None
         return tmp_fused_res, pred_mask_logits, s_logits
+
+    def fuse(self):
+        # Fold BatchNorm3d into the grouped Conv3d that weighs the rgb and lwir response of every channel, the Conv()
+        # layers of the module are fused by BaseModel.fuse()
+        name = f'group_conv3d_layer_{self.layer_idx}'
+        conv, bn, act = getattr(self, name)
+        if not isinstance(bn, nn.BatchNorm3d):
+            return self  # already fused
+        fusedconv = nn.Conv3d(conv.in_channels, conv.out_channels, conv.kernel_size, groups=conv.groups,
+                              bias=True).requires_grad_(False).to(conv.weight.device)
+        w_bn = bn.weight.div(torch.sqrt(bn.eps + bn.running_var))
+        fusedconv.weight.copy_(conv.weight * w_bn.view(-1, 1, 1, 1, 1))
+        fusedconv.bias.copy_(bn.bias - bn.running_mean * w_bn)
+        setattr(self, name, nn.Sequential(fusedconv, act))
+        return self
+
+
+def is_rgbt(model):
+    # RGB-T models take visible and lwir images stacked to 6 input channels, or 4 with a grayscale lwir image
+    return any(isinstance(m, TargetAwareFusion) for m in model.modules())
+
+
+def rgbt_channels(model):
+    # Input channels of RGB-T `model`, 3 visible and 3 lwir channels, or 1 with a folded lwir stem (yaml lwir_ch: 1)
+    return 3 + getattr(model, 'lwir_ch', 3)
+
+
+class LwirStemConv2d(nn.Conv2d):
+    # Stem convolution that also takes 1-channel (grayscale) lwir images. The 3-channel weight is kept and summed over
+    # its input channels for 1-channel inputs, equal to convolving the channel-replicated image at a third of the cost
+    def forward(self, x):
+        if x.shape[1] * 3 == self.in_channels:
+            return self._conv_forward(x, self.weight.unflatten(1, (-1, 3)).sum(2), self.bias)
+        return super().forward(x)
+
+
+def fold_lwir_stem(module):
+    # Replace the first nn.Conv2d of `module` in place by a LwirStemConv2d sharing its parameters, so 3-channel weights
+    # load unchanged and a stem shared by both modalities still runs the visible images with the original weight
+    name, conv = next((k, m) for k, m in module.named_modules() if isinstance(m, nn.Conv2d))
+    if isinstance(conv, LwirStemConv2d):
+        return module
+    assert conv.groups == 1 and conv.in_channels % 3 == 0, f'can not fold the stem {conv} to a single channel'
+    stem = LwirStemConv2d(conv.in_channels,
+                          conv.out_channels,
+                          conv.kernel_size,
+                          conv.stride,
+                          conv.padding,
+                          conv.dilation,
+                          bias=conv.bias is not None).to(conv.weight.device)
+    stem.weight, stem.bias = conv.weight, conv.bias
+    parent, _, attr = name.rpartition('.')
+    setattr(module.get_submodule(parent), attr, stem)
+    return module
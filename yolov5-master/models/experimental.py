@@ -72,11 +72,19 @@ class Ensemble(nn.ModuleList):
 
 def attempt_load(weights, device=None, inplace=True, fuse=True):
     # Loads an ensemble of models weights=[a,b,c] or a single model weights=[a] or weights=a
+    from models.common import deform_conv_pickle
     from models.yolo import Detect, Model
+    from models.yolo_mediumFusion import Detect as RGBTDetect
+    from models.yolo_mediumFusion import Model as RGBTModel
 
     model = Ensemble()
     for w in weights if isinstance(weights, list) else [weights]:
-        ckpt = torch.load(attempt_download(w), map_location='cpu')  # load
+        try:
+            ckpt = torch.load(attempt_download(w), map_location='cpu')  # load
+        except ModuleNotFoundError as e:  # RGB-T model saved with mmcv deformable convolutions, mmcv not installed
+            if not (e.name or '').startswith('mmcv'):
+                raise
+            ckpt = torch.load(attempt_download(w), map_location='cpu', pickle_module=deform_conv_pickle)
         ckpt = (ckpt.get('ema') or ckpt['model']).to(device).float()  # FP32 model
 
         # Model compatibility updates
@@ -90,9 +98,9 @@ def attempt_load(weights, device=None, inplace=True, fuse=True):
     # Module updates
     for m in model.modules():
         t = type(m)
-        if t in (nn.Hardswish, nn.LeakyReLU, nn.ReLU, nn.ReLU6, nn.SiLU, Detect, Model):
+        if t in (nn.Hardswish, nn.LeakyReLU, nn.ReLU, nn.ReLU6, nn.SiLU, Detect, Model, RGBTDetect, RGBTModel):
             m.inplace = inplace
-            if t is Detect and not isinstance(m.anchor_grid, list):
+            if t in (Detect, RGBTDetect) and not isinstance(m.anchor_grid, list):
                 delattr(m, 'anchor_grid')
                 setattr(m, 'anchor_grid', [torch.zeros(1)] * m.nl)
         elif t is nn.Upsample and not hasattr(m, 'recompute_scale_factor'):
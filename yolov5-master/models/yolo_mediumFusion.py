@@ -111,25 +111,33 @@ class Segment(Detect):
 
 class BaseModel(nn.Module):
     # YOLOv5 base model
+    stack_modalities = False  # run shared pre-fusion layers once on a batch-stacked RGB-T tensor
+    lwir_ch = 3  # lwir input channels, 1 for grayscale lwir images with a folded stem (yaml lwir_ch: 1)
+
     def forward(self, x, profile=False, visualize=False):
         return self._forward_once(x, profile, visualize)  # single-scale inference, train
 
     def _forward_once(self, x, profile=False, visualize=False):
-        rgb, thermal = torch.chunk(x, 2, 1)
-        assert rgb.shape == thermal.shape
+        rgb, thermal = x.split((x.shape[1] - self.lwir_ch, self.lwir_ch), 1)  # views of the packed input, no copy
+        assert rgb.shape[1] == 3, f'expected 3 rgb and {self.lwir_ch} lwir input channels, got {x.shape[1]}'
+        stack = self._can_stack_modalities() and not profile
+        if stack:  # (2*bs,3,h,w), rgb first, stacked after the stem for 1-channel lwir images
+            rgbt = torch.cat([rgb, thermal], 0) if rgb.shape == thermal.shape else None
         y, dt = [], []  # outputs
         taf_loss_inputs = []
         for m in self.model:
             if m.i <= 11:
                 assert m.f == -1
                 if profile:
-                    if isinstance(m, TargetAwareFusion):
-                        self._profile_one_layer(m, torch.cat([rgb, thermal], dim=1), dt)
-                    else:
-                        self._zxMediumFuse_profile_one_layer(m, rgb, thermal, dt)
+                    self._zxMediumFuse_profile_one_layer(m, rgb, thermal, dt)
                 if isinstance(m, TargetAwareFusion):
+                    if stack:
+                        rgb, thermal = torch.chunk(rgbt, 2, 0)  # views, no copy
                     x, pred_mask_logits, s_logits = m(rgb, thermal)
                     taf_loss_inputs.append([pred_mask_logits, s_logits])
+                elif stack:
+                    rgbt = m(rgbt) if rgbt is not None else torch.cat([m(rgb), m(thermal)], 0)  # run both at once
+                    x = None
                 else:
                     rgb = m(rgb)  # run
                     thermal = m(thermal)  # run
@@ -146,6 +154,14 @@ class BaseModel(nn.Module):
                     feature_visualization(x, m.type, m.i, save_dir=visualize)
         return x, taf_loss_inputs
 
+    def _can_stack_modalities(self):
+        # Batch-stacking both modalities is only equivalent to running them one after the other when no shared
+        # BatchNorm2d is in training mode, since batch statistics would otherwise be computed over both modalities
+        if not self.stack_modalities:
+            return False
+        return not any(isinstance(x, nn.BatchNorm2d) and x.training
+                       for m in self.model if m.i <= 11 and not isinstance(m, TargetAwareFusion) for x in m.modules())
+
     def _profile_one_layer(self, m, x, dt):
         c = m == self.model[-1]  # is final layer, copy input as inplace fix
         o = thop.profile(m, inputs=(x.copy() if c else x,), verbose=False)[0] / 1E9 * 2 if thop else 0  # FLOPs
@@ -161,14 +177,21 @@ class BaseModel(nn.Module):
 
     def _zxMediumFuse_profile_one_layer(self, m, x1, x2, dt):
         c = m == self.model[-1]  # is final layer, copy input as inplace fix
-        o1 = thop.profile(m, inputs=(x1.copy() if c else x1,), verbose=False)[0] / 1E9 * 2 if thop else 0  # FLOPs
-        o2 = thop.profile(m, inputs=(x2.copy() if c else x2,), verbose=False)[0] / 1E9 * 2 if thop else 0  # FLOPs
-        o = o1 + o2
-        t = time_sync()
-        for _ in range(10):
-            m(x1.copy() if c else x1)
-            m(x2.copy() if c else x2)
-        dt.append((time_sync() - t) * 100)
+        if isinstance(m, TargetAwareFusion):  # fuses both modalities in one call
+            o = thop.profile(m, inputs=(x1, x2), verbose=False)[0] / 1E9 * 2 if thop else 0  # FLOPs
+            t = time_sync()
+            for _ in range(10):
+                m(x1, x2)
+            dt.append((time_sync() - t) * 100)
+        else:
+            o1 = thop.profile(m, inputs=(x1.copy() if c else x1,), verbose=False)[0] / 1E9 * 2 if thop else 0  # FLOPs
+            o2 = thop.profile(m, inputs=(x2.copy() if c else x2,), verbose=False)[0] / 1E9 * 2 if thop else 0  # FLOPs
+            o = o1 + o2
+            t = time_sync()
+            for _ in range(10):
+                m(x1.copy() if c else x1)
+                m(x2.copy() if c else x2)
+            dt.append((time_sync() - t) * 100)
         if m == self.model[0]:
             LOGGER.info(f"{'time (ms)':>10s} {'GFLOPs':>10s} {'params':>10s}  module")
         LOGGER.info(f'{dt[-1]:10.2f} {o:10.2f} {m.np:10.0f}  {m.type}')
@@ -182,6 +205,10 @@ class BaseModel(nn.Module):
                 m.conv = fuse_conv_and_bn(m.conv, m.bn)  # update conv
                 delattr(m, 'bn')  # remove batchnorm
                 m.forward = m.forward_fuse  # update forward
+                if m is self.model[0] and self.lwir_ch == 1:
+                    fold_lwir_stem(m)  # fused stem still takes 1-channel lwir images
+            elif isinstance(m, TargetAwareFusion):
+                m.fuse()  # Conv3d() + BatchNorm3d()
         self.info()
         return self
 
@@ -214,6 +241,7 @@ class DetectionModel(BaseModel):
 
         # Define model
         ch = self.yaml['ch'] = self.yaml.get('ch', ch)  # input channels
+        self.lwir_ch = self.yaml['lwir_ch'] = self.yaml.get('lwir_ch', 3)  # lwir input channels, 3 or 1 (grayscale)
         if nc and nc != self.yaml['nc']:
             LOGGER.info(f"Overriding model.yaml nc={self.yaml['nc']} with nc={nc}")
             self.yaml['nc'] = nc  # override yaml value
@@ -223,6 +251,8 @@ class DetectionModel(BaseModel):
         self.model, self.save = parse_model(deepcopy(self.yaml), ch=[ch])  # model, savelist
         self.names = [str(i) for i in range(self.yaml['nc'])]  # default names
         self.inplace = self.yaml.get('inplace', True)
+        if self.lwir_ch == 1:
+            fold_lwir_stem(self.model[0])  # shared stem takes 3-channel rgb and 1-channel lwir images
 
         # Build strides, anchors
         m = self.model[-1]  # Detect()
@@ -230,7 +260,8 @@ class DetectionModel(BaseModel):
             s = 256  # 2x min stride
             m.inplace = self.inplace
             forward = lambda x: self.forward(x)[0] if isinstance(m, Segment) else self.forward(x)
-            m.stride = torch.tensor([s / x.shape[-2] for x in forward(torch.zeros(1, ch*2, s, s))[0]])  # forward
+            im = torch.zeros(1, ch + self.lwir_ch, s, s)  # rgb and lwir
+            m.stride = torch.tensor([s / x.shape[-2] for x in forward(im)[0]])  # forward
             check_anchor_order(m)
             m.anchors /= m.stride.view(-1, 1, 1)
             self.stride = m.stride
@@ -244,7 +275,8 @@ class DetectionModel(BaseModel):
     def forward(self, x, augment=False, profile=False, visualize=False):
         if augment:
             return self._forward_augment(x)  # augmented inference, None
-        return self._forward_once(x, profile, visualize)  # single-scale inference, train
+        y = self._forward_once(x, profile, visualize)  # single-scale inference, train
+        return y[0] if self.model[-1].export else y  # exported graphs output detections only, no TAF mask logits
 
     def _forward_augment(self, x):
         img_size = x.shape[-2:]  # height, width
@@ -407,6 +439,7 @@ if __name__ == '__main__':
     parser.add_argument('--device', default='', help='cuda device, i.e. 0 or 0,1,2,3 or cpu')
     parser.add_argument('--profile', action='store_true', help='profile model speed')
     parser.add_argument('--line-profile', action='store_true', help='profile model speed layer by layer')
+    parser.add_argument('--deploy', action='store_true', help='with --line-profile, profile again fused for inference')
     parser.add_argument('--test', action='store_true', help='test all yolo*.yaml')
     opt = parser.parse_args()
     opt.cfg = check_yaml(opt.cfg)  # check YAML
@@ -414,12 +447,20 @@ if __name__ == '__main__':
     device = select_device(opt.device)
 
     # Create model
-    im = torch.rand(opt.batch_size, 3, 640, 640).to(device)
     model = Model(opt.cfg).to(device)
+    im = torch.rand(opt.batch_size, rgbt_channels(model), 640, 640).to(device)  # rgb and lwir
 
     # Options
     if opt.line_profile:  # profile layer by layer
+        if opt.deploy:
+            model.eval()
         model(im, profile=True)
+        if opt.deploy:  # fused Conv+BN and TargetAwareFusion without mask-supervision outputs
+            model.fuse()
+            for m in model.modules():
+                if isinstance(m, TargetAwareFusion):
+                    m.deploy = True
+            model(im, profile=True)
 
     elif opt.profile:  # profile forward-backward
         results = profile(input=im, ops=[model], n=3)
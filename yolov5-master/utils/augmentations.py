@@ -21,25 +21,31 @@ IMAGENET_STD = 0.229, 0.224, 0.225  # RGB standard deviation
 
 class Albumentations:
     # YOLOv5 Albumentations class (optional, only used if package is installed)
-    def __init__(self, size=640):
+    def __init__(self, size=640, modalities=1, photometric_modalities=(0,)):
         self.transform = None
+        self.modalities = modalities  # >1 transforms a stack of aligned images im(n,h,w,3) with one parameter draw
+        self.photometric_modalities = list(photometric_modalities)  # stack indices the pixel-level ops are applied to
         prefix = colorstr('albumentations: ')
         try:
             import albumentations as A
             check_version(A.__version__, '1.0.3', hard=True)  # version requirement
 
+            S = [A.RandomResizedCrop(height=size, width=size, scale=(0.8, 1.0), ratio=(0.9, 1.11), p=0.0)]  # spatial
             T = [
-                A.RandomResizedCrop(height=size, width=size, scale=(0.8, 1.0), ratio=(0.9, 1.11), p=0.0),
                 A.Blur(p=0.01),
                 A.MedianBlur(p=0.01),
                 A.ToGray(p=0.01),
                 A.CLAHE(p=0.01),
                 A.RandomBrightnessContrast(p=0.0),
                 A.RandomGamma(p=0.0),
-                A.ImageCompression(quality_lower=75, p=0.0)]  # transforms
-            self.transform = A.Compose(T, bbox_params=A.BboxParams(format='yolo', label_fields=['class_labels']))
-
-            LOGGER.info(prefix + ', '.join(f'{x}'.replace('always_apply=False, ', '') for x in T if x.p))
+                A.ImageCompression(quality_lower=75, p=0.0)]  # photometric transforms
+            self.transform = A.Compose(S,
+                                       bbox_params=A.BboxParams(format='yolo', label_fields=['class_labels']),
+                                       additional_targets={f'image{i}': 'image' for i in range(1, modalities)})
+            n = len(self.photometric_modalities) if modalities > 1 else 1
+            self.photometric = A.Compose(T, additional_targets={f'image{i}': 'image' for i in range(1, n)})
+
+            LOGGER.info(prefix + ', '.join(f'{x}'.replace('always_apply=False, ', '') for x in S + T if x.p))
         except ImportError:  # package not installed, skip
             pass
         except Exception as e:
@@ -48,8 +54,18 @@ class Albumentations:
     def __call__(self, im, labels, p=1.0):
         if self.transform and random.random() < p:
             assert 'albumentations transforms are not allowed!'
-            new = self.transform(image=im, bboxes=labels[:, 1:], class_labels=labels[:, 0])  # transformed
-            im, labels = new['image'], np.array([[c, *b] for c, b in zip(new['class_labels'], new['bboxes'])])
+            ims = {f'image{i}': x for i, x in enumerate(im[1:], 1)} if self.modalities > 1 else {}
+            new = self.transform(image=im[0] if ims else im, bboxes=labels[:, 1:], class_labels=labels[:, 0],
+                                 **ims)  # transformed
+            im = np.stack([new['image']] + [new[k] for k in ims]) if ims else new['image']
+            labels = np.array([[c, *b] for c, b in zip(new['class_labels'], new['bboxes'])])
+            if ims and self.photometric_modalities:  # pixel-level ops only on the selected modalities (not thermal)
+                i, *rest = self.photometric_modalities
+                new = self.photometric(image=im[i], **{f'image{k}': im[j] for k, j in enumerate(rest, 1)})
+                for k, j in enumerate(self.photometric_modalities):
+                    im[j] = new[f'image{k}' if k else 'image']
+            elif not ims:
+                im = self.photometric(image=im)['image']
         return im, labels
 
 
@@ -81,23 +97,16 @@ def augment_hsv(im, hgain=0.5, sgain=0.5, vgain=0.5):
         cv2.cvtColor(im_hsv, cv2.COLOR_HSV2BGR, dst=im)  # no return needed
 
 
-def augment_hsv_RGBT(rgb, thermal, hgain=0.5, sgain=0.5, vgain=0.5):
-    # HSV color-space augmentation
-    if hgain or sgain or vgain:
-        r = np.random.uniform(-1, 1, 3) * [hgain, sgain, vgain] + 1  # random gains
-        rgb_hue, rgb_sat, rgb_val = cv2.split(cv2.cvtColor(rgb, cv2.COLOR_BGR2HSV))
-        thermal_hue, thermal_sat, thermal_val = cv2.split(cv2.cvtColor(thermal, cv2.COLOR_BGR2HSV))
-        dtype = rgb.dtype  # uint8
-
-        x = np.arange(0, 256, dtype=r.dtype)
-        lut_hue = ((x * r[0]) % 180).astype(dtype)
-        lut_sat = np.clip(x * r[1], 0, 255).astype(dtype)
-        lut_val = np.clip(x * r[2], 0, 255).astype(dtype)
-
-        rgb_hsv = cv2.merge((cv2.LUT(rgb_hue, lut_hue), cv2.LUT(rgb_sat, lut_sat), cv2.LUT(rgb_val, lut_val)))
-        thermal_hsv = cv2.merge((cv2.LUT(thermal_hue, lut_hue), cv2.LUT(thermal_sat, lut_sat), cv2.LUT(thermal_val, lut_val)))
-        cv2.cvtColor(rgb_hsv, cv2.COLOR_HSV2BGR, dst=rgb)  # no return needed
-        cv2.cvtColor(thermal_hsv, cv2.COLOR_HSV2BGR, dst=thermal)  # no return needed
+def augment_hsv_RGBT(ims, hgain=0.5, sgain=0.5, vgain=0.5, modalities=None):
+    # HSV color-space augmentation of a stack of aligned BGR images ims(n,h,w,3), e.g. RGB and thermal, in place. The
+    # images in 'modalities' (all by default) share one gain draw and are converted as a single (n*h,w,3) image
+    assert ims.flags.c_contiguous, 'ims is augmented through a view'
+    if modalities is None:
+        augment_hsv(ims.reshape(-1, *ims.shape[2:]), hgain, sgain, vgain)  # no copy
+    else:
+        x = ims[list(modalities)]  # copy
+        augment_hsv(x.reshape(-1, *x.shape[2:]), hgain, sgain, vgain)
+        ims[list(modalities)] = x
 
 
 def hist_equalize(im, clahe=True, bgr=False):
@@ -129,8 +138,8 @@ def replicate(im, labels):
 
 
 def letterbox(im, new_shape=(640, 640), color=(114, 114, 114), auto=True, scaleFill=False, scaleup=True, stride=32):
-    # Resize and pad image while meeting stride-multiple constraints
-    shape = im.shape[:2]  # current shape [height, width]
+    # Resize and pad image while meeting stride-multiple constraints, im(h,w,c) or a stack of aligned images im(n,h,w,c)
+    shape = im.shape[1:3] if im.ndim == 4 else im.shape[:2]  # current shape [height, width]
     if isinstance(new_shape, int):
         new_shape = (new_shape, new_shape)
 
@@ -153,11 +162,15 @@ def letterbox(im, new_shape=(640, 640), color=(114, 114, 114), auto=True, scaleF
     dw /= 2  # divide padding into 2 sides
     dh /= 2
 
-    if shape[::-1] != new_unpad:  # resize
-        im = cv2.resize(im, new_unpad, interpolation=cv2.INTER_LINEAR)
     top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
     left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
-    im = cv2.copyMakeBorder(im, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)  # add border
+
+    def resize_pad(im):
+        if shape[::-1] != new_unpad:  # resize
+            im = cv2.resize(im, new_unpad, interpolation=cv2.INTER_LINEAR)
+        return cv2.copyMakeBorder(im, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)  # add border
+
+    im = np.stack([resize_pad(x) for x in im]) if im.ndim == 4 else resize_pad(im)
     return im, ratio, (dw, dh)
 
 
@@ -172,14 +185,16 @@ def random_perspective(im,
                        border=(0, 0)):
     # torchvision.transforms.RandomAffine(degrees=(-10, 10), translate=(0.1, 0.1), scale=(0.9, 1.1), shear=(-10, 10))
     # targets = [cls, xyxy]
+    # im(h,w,c), or a stack of aligned images im(n,h,w,c) that are all warped by the same random transform
 
-    height = im.shape[0] + border[0] * 2  # shape(h,w,c)
-    width = im.shape[1] + border[1] * 2
+    shape = im.shape[1:3] if im.ndim == 4 else im.shape[:2]
+    height = shape[0] + border[0] * 2  # shape(h,w,c)
+    width = shape[1] + border[1] * 2
 
     # Center
     C = np.eye(3)
-    C[0, 2] = -im.shape[1] / 2  # x translation (pixels)
-    C[1, 2] = -im.shape[0] / 2  # y translation (pixels)
+    C[0, 2] = -shape[1] / 2  # x translation (pixels)
+    C[1, 2] = -shape[0] / 2  # y translation (pixels)
 
     # Perspective
     P = np.eye(3)
@@ -208,9 +223,10 @@ def random_perspective(im,
     M = T @ S @ R @ P @ C  # order of operations (right to left) is IMPORTANT
     if (border[0] != 0) or (border[1] != 0) or (M != np.eye(3)).any():  # image changed
         if perspective:
-            im = cv2.warpPerspective(im, M, dsize=(width, height), borderValue=(114, 114, 114))
+            warp = lambda x: cv2.warpPerspective(x, M, dsize=(width, height), borderValue=(114, 114, 114))
         else:  # affine
-            im = cv2.warpAffine(im, M[:2], dsize=(width, height), borderValue=(114, 114, 114))
+            warp = lambda x: cv2.warpAffine(x, M[:2], dsize=(width, height), borderValue=(114, 114, 114))
+        im = np.stack([warp(x) for x in im]) if im.ndim == 4 else warp(im)
 
     # Visualize
     # import matplotlib.pyplot as plt
@@ -257,104 +273,6 @@ def random_perspective(im,
     return im, targets
 
 
-def random_perspective_RGBT(rgb, thermal,
-                            targets=(),
-                            segments=(),
-                            degrees=10,
-                            translate=.1,
-                            scale=.1,
-                            shear=10,
-                            perspective=0.0,
-                            border=(0, 0)):
-            # torchvision.transforms.RandomAffine(degrees=(-10, 10), translate=(0.1, 0.1), scale=(0.9, 1.1), shear=(-10, 10))
-            # targets = [cls, xyxy]
-
-            height = rgb.shape[0] + border[0] * 2  # shape(h,w,c)
-            width = rgb.shape[1] + border[1] * 2
-
-            # Center
-            C = np.eye(3)
-            C[0, 2] = -rgb.shape[1] / 2  # x translation (pixels)
-            C[1, 2] = -rgb.shape[0] / 2  # y translation (pixels)
-
-            # Perspective
-            P = np.eye(3)
-            P[2, 0] = random.uniform(-perspective, perspective)  # x perspective (about y)
-            P[2, 1] = random.uniform(-perspective, perspective)  # y perspective (about x)
-
-            # Rotation and Scale
-            R = np.eye(3)
-            a = random.uniform(-degrees, degrees)
-            # a += random.choice([-180, -90, 0, 90])  # add 90deg rotations to small rotations
-            s = random.uniform(1 - scale, 1 + scale)
-            # s = 2 ** random.uniform(-scale, scale)
-            R[:2] = cv2.getRotationMatrix2D(angle=a, center=(0, 0), scale=s)
-
-            # Shear
-            S = np.eye(3)
-            S[0, 1] = math.tan(random.uniform(-shear, shear) * math.pi / 180)  # x shear (deg)
-            S[1, 0] = math.tan(random.uniform(-shear, shear) * math.pi / 180)  # y shear (deg)
-
-            # Translation
-            T = np.eye(3)
-            T[0, 2] = random.uniform(0.5 - translate, 0.5 + translate) * width  # x translation (pixels)
-            T[1, 2] = random.uniform(0.5 - translate, 0.5 + translate) * height  # y translation (pixels)
-
-            # Combined rotation matrix
-            M = T @ S @ R @ P @ C  # order of operations (right to left) is IMPORTANT
-            if (border[0] != 0) or (border[1] != 0) or (M != np.eye(3)).any():  # image changed
-                if perspective:
-                    rgb = cv2.warpPerspective(rgb, M, dsize=(width, height), borderValue=(114, 114, 114))
-                    thermal = cv2.warpPerspective(thermal, M, dsize=(width, height), borderValue=(114, 114, 114))
-                else:  # affine
-                    rgb = cv2.warpAffine(rgb, M[:2], dsize=(width, height), borderValue=(114, 114, 114))
-                    thermal = cv2.warpAffine(thermal, M[:2], dsize=(width, height), borderValue=(114, 114, 114))
-
-            # Visualize
-            # import matplotlib.pyplot as plt
-            # ax = plt.subplots(1, 2, figsize=(12, 6))[1].ravel()
-            # ax[0].imshow(im[:, :, ::-1])  # base
-            # ax[1].imshow(im2[:, :, ::-1])  # warped
-
-            # Transform label coordinates
-            n = len(targets)
-            if n:
-                use_segments = any(x.any() for x in segments) and len(segments) == n
-                new = np.zeros((n, 4))
-                if use_segments:  # warp segments
-                    segments = resample_segments(segments)  # upsample
-                    for i, segment in enumerate(segments):
-                        xy = np.ones((len(segment), 3))
-                        xy[:, :2] = segment
-                        xy = xy @ M.T  # transform
-                        xy = xy[:, :2] / xy[:, 2:3] if perspective else xy[:, :2]  # perspective rescale or affine
-
-                        # clip
-                        new[i] = segment2box(xy, width, height)
-
-                else:  # warp boxes
-                    xy = np.ones((n * 4, 3))
-                    xy[:, :2] = targets[:, [1, 2, 3, 4, 1, 4, 3, 2]].reshape(n * 4, 2)  # x1y1, x2y2, x1y2, x2y1
-                    xy = xy @ M.T  # transform
-                    xy = (xy[:, :2] / xy[:, 2:3] if perspective else xy[:, :2]).reshape(n, 8)  # perspective rescale or affine
-
-                    # create new boxes
-                    x = xy[:, [0, 2, 4, 6]]
-                    y = xy[:, [1, 3, 5, 7]]
-                    new = np.concatenate((x.min(1), y.min(1), x.max(1), y.max(1))).reshape(4, n).T
-
-                    # clip
-                    new[:, [0, 2]] = new[:, [0, 2]].clip(0, width)
-                    new[:, [1, 3]] = new[:, [1, 3]].clip(0, height)
-
-                # filter candidates
-                i = box_candidates(box1=targets[:, 1:5].T * s, box2=new.T, area_thr=0.01 if use_segments else 0.10)
-                targets = targets[i]
-                targets[:, 1:5] = new[i]
-
-            return rgb, thermal, targets
-
-
 def copy_paste(im, labels, segments, p=0.5):
     # Implement Copy-Paste augmentation https://arxiv.org/abs/2012.07177, labels as nx5 np.array(cls, xyxy)
     n = len(segments)
@@ -405,22 +323,13 @@ def cutout(im, labels, p=0.5):
 
 
 def mixup(im, labels, im2, labels2):
-    # Applies MixUp augmentation https://arxiv.org/pdf/1710.09412.pdf
+    # Applies MixUp augmentation https://arxiv.org/pdf/1710.09412.pdf, also to stacks of aligned images im(n,h,w,c)
     r = np.random.beta(32.0, 32.0)  # mixup ratio, alpha=beta=32.0
     im = (im * r + im2 * (1 - r)).astype(np.uint8)
     labels = np.concatenate((labels, labels2), 0)
     return im, labels
 
 
-def mixup_RGBT(rgb, thermal, labels, rgb2, thermal2, labels2):
-    # Applies MixUp augmentation https://arxiv.org/pdf/1710.09412.pdf
-    r = np.random.beta(32.0, 32.0)  # mixup ratio, alpha=beta=32.0
-    rgb = (rgb * r + rgb2 * (1 - r)).astype(np.uint8)
-    thermal = (thermal * r + thermal2 * (1 - r)).astype(np.uint8)
-    labels = np.concatenate((labels, labels2), 0)
-    return rgb, thermal, labels
-
-
 def box_candidates(box1, box2, wh_thr=2, ar_thr=100, area_thr=0.1, eps=1e-16):  # box1(4,n), box2(4,n)
     # Compute candidate boxes: box1 before augment, box2 after augment, wh_thr (pixels), aspect_ratio_thr, area_ratio
     w1, h1 = box1[2] - box1[0], box1[3] - box1[1]
@@ -8,17 +8,50 @@ from copy import deepcopy
 import numpy as np
 import torch
 
-from utils.general import LOGGER, colorstr
+from models.common import is_rgbt, rgbt_channels
+from utils.general import LOGGER, ROOT, colorstr, yaml_load
 from utils.torch_utils import profile
 
 
-def check_train_batch_size(model, imgsz=640, amp=True):
-    # Check YOLOv5 training batch size
+def check_train_batch_size(model, imgsz=640, amp=True, hyp=None):
+    # Check YOLOv5 training batch size, RGB-T models are profiled with full training steps using hyperparameters hyp
     with torch.cuda.amp.autocast(amp):
-        return autobatch(deepcopy(model).train(), imgsz)  # compute optimal batch size
+        return autobatch(deepcopy(model).train(), imgsz, hyp=hyp)  # compute optimal batch size
 
 
-def autobatch(model, imgsz=640, fraction=0.8, batch_size=16):
+def profile_rgbt(model, batch_sizes, imgsz=640, hyp=None, n=3, nt=16):
+    # Profile the CUDA memory of RGB-T training steps: packed (b,6,h,w) input, (b,4,h,w) for grayscale lwir, forward
+    # with the TargetAwareFusion outputs, box, object, class and mask losses on nt random targets per image, and backward.
+    # Returns [batch size, peak GiB reserved] per batch size, None if the step failed, i.e. out of memory
+    from utils.loss import ComputeLoss  # scoped to avoid circular import
+
+    device = next(model.parameters()).device  # get model device
+    model.hyp = hyp or yaml_load(ROOT / 'data/hyps/hyp.scratch-low.yaml')  # ComputeLoss() reads model.hyp
+    compute_loss = ComputeLoss(model)
+    results = []
+    for b in batch_sizes:
+        try:
+            torch.cuda.reset_peak_memory_stats(device)
+            for _ in range(n):
+                imgs = torch.rand(b, rgbt_channels(model), imgsz, imgsz, device=device)
+                targets = torch.cat((torch.arange(b, device=device).repeat_interleave(nt)[:, None],
+                                     torch.zeros(b * nt, 1, device=device),
+                                     torch.rand(b * nt, 2, device=device) * 0.8 + 0.1,
+                                     torch.rand(b * nt, 2, device=device) * 0.15 + 0.02), 1)  # image,class,x,y,w,h
+                pred, taf_loss_inputs = model(imgs)  # forward
+                loss, _ = compute_loss([pred, taf_loss_inputs], targets)
+                loss.backward()
+                model.zero_grad(set_to_none=True)
+            results.append([b, torch.cuda.max_memory_reserved(device) / (1 << 30)])
+        except Exception as e:
+            LOGGER.info(f'batch-size {b}: {e}')
+            model.zero_grad(set_to_none=True)
+            results.append(None)
+        torch.cuda.empty_cache()
+    return results
+
+
+def autobatch(model, imgsz=640, fraction=0.8, batch_size=16, hyp=None):
     # Automatically estimate best YOLOv5 batch size to use `fraction` of available CUDA memory
     # Usage:
     #     import torch
@@ -49,15 +82,19 @@ def autobatch(model, imgsz=640, fraction=0.8, batch_size=16):
 
     # Profile batch sizes
     batch_sizes = [1, 2, 4, 8, 16]
+    rgbt = is_rgbt(model)  # 6 (4) channel input, (pred, taf_loss_inputs) output and mask losses
     try:
-        img = [torch.empty(b, 3, imgsz, imgsz) for b in batch_sizes]
-        results = profile(img, model, n=3, device=device)
+        if rgbt:
+            results = profile_rgbt(model, batch_sizes, imgsz, hyp)
+        else:
+            img = [torch.empty(b, 3, imgsz, imgsz) for b in batch_sizes]
+            results = profile(img, model, n=3, device=device)
     except Exception as e:
         LOGGER.warning(f'{prefix}{e}')
 
     # Fit a solution
-    y = [x[2] for x in results if x]  # memory [2]
-    p = np.polyfit(batch_sizes[:len(y)], y, deg=1)  # first degree polynomial fit
+    y = [x[-1 if rgbt else 2] for x in results if x]  # memory
+    p = np.polyfit([b for b, x in zip(batch_sizes, results) if x], y, deg=1)  # first degree polynomial fit
     b = int((f * fraction - p[1]) / p[0])  # y intercept (optimal batch size)
     if None in results:  # some sizes failed
         i = results.index(None)  # first fail index
@@ -9,6 +9,7 @@ import hashlib
 import json
 import math
 import os
+import queue
 import random
 import shutil
 import time
@@ -29,7 +30,7 @@ from torch.utils.data import DataLoader, Dataset, dataloader, distributed
 from tqdm import tqdm
 
 from utils.augmentations import (Albumentations, augment_hsv_RGBT, classify_albumentations, classify_transforms, copy_paste,
-                                 letterbox, mixup_RGBT, random_perspective_RGBT)
+                                 letterbox, mixup, random_perspective)
 from utils.general import (DATASETS_DIR, LOGGER, NUM_THREADS, TQDM_BAR_FORMAT, check_dataset, check_requirements,
                            check_yaml, clean_str, cv2, is_colab, is_kaggle, segments2boxes, unzip_file, xyn2xy,
                            xywh2xyxy, xywhn2xyxy, xyxy2xywhn)
@@ -116,7 +117,8 @@ def create_dataloader(path,
                       quad=False,
                       prefix='',
                       shuffle=False,
-                      seed=0):
+                      seed=0,
+                      lwir_ch=3):
     if rect and shuffle:
         LOGGER.warning('WARNING ⚠️ --rect is incompatible with DataLoader shuffle, setting shuffle=False')
         shuffle = False
@@ -133,7 +135,8 @@ def create_dataloader(path,
             stride=int(stride),
             pad=pad,
             image_weights=image_weights,
-            prefix=prefix)
+            prefix=prefix,
+            lwir_ch=lwir_ch)
 
     batch_size = min(batch_size, len(dataset))
     nd = torch.cuda.device_count()  # number of CUDA devices
@@ -236,9 +239,22 @@ class LoadScreenshots:
         return str(self.screen), im, im0, None, s  # screen, img, original img, im0s, s
 
 
+def letterbox_rgbt(im, ir_im, new_shape=640, stride=32, auto=True):
+    # Letterbox a BGR visible image and its lwir counterpart into one packed RGB-T array, (6,h,w) for a BGR lwir image
+    # and (4,h,w) for a grayscale (h,w) lwir image
+    if ir_im.ndim == 2:
+        im, ir_im = (letterbox(x, new_shape, stride=stride, auto=auto)[0] for x in (im, ir_im))
+        return np.concatenate((im[..., ::-1].transpose((2, 0, 1)), ir_im[None]))  # BGR to RGB, to (4,h,w)
+    im = letterbox(np.stack([im, ir_im]), new_shape, stride=stride, auto=auto)[0]  # resize
+    im = im[..., ::-1].transpose((0, 3, 1, 2)).reshape(6, *im.shape[1:3])  # BGR to RGB, (2,h,w,3) to (6,h,w)
+    return np.ascontiguousarray(im)  # contiguous
+
+
 class LoadImages:
-    # YOLOv5 image/video dataloader, i.e. `python detect.py --source image.jpg/vid.mp4`
-    def __init__(self, path, img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
+    # YOLOv5 RGB-T image/video dataloader, i.e. `python detect.py --source visible/image.jpg/vid.mp4`, yields (6,h,w)
+    # visible+lwir images, or (4,h,w) with lwir_ch=1 grayscale lwir images, the lwir counterpart of each file is found
+    # by replacing 'visible' with 'lwir' in its path
+    def __init__(self, path, img_size=640, stride=32, auto=True, transforms=None, vid_stride=1, lwir_ch=3):
         if isinstance(path, str) and Path(path).suffix == '.txt':  # *.txt file with img/vid/dir on each line
             path = Path(path).read_text().rsplit()
         files = []
@@ -266,6 +282,7 @@ class LoadImages:
         self.auto = auto
         self.transforms = transforms  # optional
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.lwir_ch = lwir_ch  # lwir channels, 1 decodes lwir images as grayscale
         if any(videos):
             self._new_video(videos[0])  # new video
         else:
@@ -287,15 +304,19 @@ class LoadImages:
             self.mode = 'video'
             for _ in range(self.vid_stride):
                 self.cap.grab()
+                self.ir_cap.grab()
             ret_val, im0 = self.cap.retrieve()
-            while not ret_val:
+            ir_ret_val, ir_im0 = self.ir_cap.retrieve()
+            while not (ret_val and ir_ret_val):
                 self.count += 1
                 self.cap.release()
+                self.ir_cap.release()
                 if self.count == self.nf:  # last video
                     raise StopIteration
                 path = self.files[self.count]
                 self._new_video(path)
                 ret_val, im0 = self.cap.read()
+                ir_ret_val, ir_im0 = self.ir_cap.read()
 
             self.frame += 1
             # im0 = self._cv2_rotate(im0)  # for use if cv2 autorotation is False
@@ -305,28 +326,28 @@ class LoadImages:
             # Read image
             self.count += 1
             im0 = cv2.imread(path)  # BGR
-            ir_im0 = cv2.imread(path.replace('visible', 'lwir'))
+            flags = cv2.IMREAD_GRAYSCALE if self.lwir_ch == 1 else cv2.IMREAD_COLOR  # BGR or grayscale lwir
+            ir_im0 = cv2.imread(path.replace('visible', 'lwir'), flags)
             assert im0 is not None, f'Image Not Found {path}'
+            assert ir_im0 is not None, f'Image Not Found {path.replace("visible", "lwir")}'
             s = f'image {self.count}/{self.nf} {path}: '
 
+        if self.lwir_ch == 1 and ir_im0.ndim == 3:  # video frame
+            ir_im0 = cv2.cvtColor(ir_im0, cv2.COLOR_BGR2GRAY)
+        assert im0.shape[:2] == ir_im0.shape[:2], f'RGB-T shape mismatch {im0.shape} != {ir_im0.shape} for {path}'
         if self.transforms:
-            im = self.transforms(im0)  # transforms
-            ir_im = self.transforms(ir_im0)  # transforms
+            im = np.concatenate([self.transforms(im0), self.transforms(ir_im0)])  # transforms
         else:
-            im = letterbox(im0, self.img_size, stride=self.stride, auto=self.auto)[0]  # padded resize
-            im = im.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
-            im = np.ascontiguousarray(im)  # contiguous
-
-            ir_im = letterbox(ir_im0, self.img_size, stride=self.stride, auto=self.auto)[0]  # padded resize
-            ir_im = ir_im.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
-            ir_im = np.ascontiguousarray(ir_im)  # contiguous
+            im = letterbox_rgbt(im0, ir_im0, self.img_size, stride=self.stride, auto=self.auto)  # padded resize
 
-        return path, im, ir_im, im0, ir_im0, self.cap, s
+        return path, im, im0, ir_im0, self.cap, s
 
     def _new_video(self, path):
-        # Create a new video capture object
+        # Create a new video capture object for each modality, the lwir video is found by name as for images
         self.frame = 0
         self.cap = cv2.VideoCapture(path)
+        self.ir_cap = cv2.VideoCapture(path.replace('visible', 'lwir'))
+        assert self.ir_cap.isOpened(), f'Failed to open {path.replace("visible", "lwir")}'
         self.frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) / self.vid_stride)
         self.orientation = int(self.cap.get(cv2.CAP_PROP_ORIENTATION_META))  # rotation degrees
         # self.cap.set(cv2.CAP_PROP_ORIENTATION_AUTO, 0)  # disable https://github.com/ultralytics/yolov5/issues/8493
@@ -431,6 +452,156 @@ class LoadStreams:
         return len(self.sources)  # 1E12 frames = 32 streams at 30 FPS for 30 years
 
 
+class LoadRGBTStreams:
+    # YOLOv5 RGB-T streamloader, i.e. `python detect.py --source set06_visible.avi  # lwir video found by name`
+    # or `--source rgbt.streams` with one `visible [lwir]` pair of videos, RTSP/RTMP/HTTP streams or webcams per line.
+    # Every source is decoded in a daemon thread and batches of aligned (6,h,w) visible+lwir frames are yielded, or
+    # (4,h,w) with lwir_ch=1 grayscale lwir frames
+    def __init__(self,
+                 sources='file.streams',
+                 img_size=640,
+                 stride=32,
+                 auto=True,
+                 transforms=None,
+                 vid_stride=1,
+                 lwir_sources=None,
+                 sync='index',
+                 buffer=2,
+                 lwir_ch=3):
+        torch.backends.cudnn.benchmark = True  # faster for fixed-size inference
+        assert sync in ('index', 'timestamp'), f'invalid sync {sync}, valid values are index or timestamp'
+        self.mode = 'stream'
+        self.img_size = img_size
+        self.stride = stride
+        self.vid_stride = vid_stride  # video frame-rate stride
+        self.lwir_ch = lwir_ch  # lwir channels, 1 converts lwir frames to grayscale
+        self.key = 0 if sync == 'index' else 1  # align frames by (frame index, timestamp ms)[key]
+        if os.path.isfile(sources) and Path(sources).suffix in ('.streams', '.txt'):
+            pairs = [x.split() for x in Path(sources).read_text().splitlines() if x.strip()]
+        else:
+            pairs = [[sources, lwir_sources] if lwir_sources else [sources]]
+        pairs = [x if len(x) == 2 else [x[0], x[0].replace('visible', 'lwir')] for x in pairs]
+        n = len(pairs)
+        self.sources = [clean_str(x[0]) for x in pairs]  # clean source names for later
+        self.fps, self.tolerance, self.threads = [0] * n, [0] * n, []
+        self.buffers = [[None, None] for _ in range(n)]  # (visible, lwir) frame queues of each pair
+        first = [[None, None] for _ in range(n)]
+        for i, pair in enumerate(pairs):  # index, source pair
+            assert pair[0] != pair[1], f'No lwir source for {pair[0]}, pass one or name the sources visible/lwir'
+            for m, s in enumerate(pair):  # modality, source
+                st = f'{i + 1}/{n} {("visible", "lwir")[m]}: {s}... '
+                live = not os.path.isfile(s)  # drop stale frames of live streams, block on video files instead
+                s = eval(s) if s.isnumeric() else s  # i.e. s = '0' local webcam
+                if s == 0:
+                    assert not is_colab(), '--source 0 webcam unsupported on Colab. Rerun command in a local environment.'
+                    assert not is_kaggle(), '--source 0 webcam unsupported on Kaggle. Rerun command in a local environment.'
+                cap = cv2.VideoCapture(s)
+                assert cap.isOpened(), f'{st}Failed to open {s}'
+                w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                fps = cap.get(cv2.CAP_PROP_FPS)  # warning: may return 0 or nan
+                fps = max((fps if math.isfinite(fps) else 0) % 100, 0) or 30  # 30 FPS fallback
+                frames = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0) or float('inf')  # infinite stream fallback
+                if m == 0:
+                    self.fps[i] = fps
+                    self.tolerance[i] = 0 if sync == 'index' else 500 / fps  # half a frame period in ms
+
+                success, first[i][m] = cap.read()  # guarantee first frame
+                assert success, f'{st}Failed to read {s}'
+                q = self.buffers[i][m] = queue.Queue(maxsize=buffer)
+                q.put((0, self._timestamp(cap, live), first[i][m]))
+                self.threads.append(Thread(target=self.update, args=([q, cap, s, live]), daemon=True))
+                LOGGER.info(f'{st} Success ({frames} frames {w}x{h} at {fps:.2f} FPS)')
+                self.threads[-1].start()
+        LOGGER.info('')  # newline
+
+        # check for common shapes
+        s = np.stack([letterbox(x[0], img_size, stride=stride, auto=auto)[0].shape for x in first])
+        self.rect = np.unique(s, axis=0).shape[0] == 1  # rect inference if all shapes equal
+        self.auto = auto and self.rect
+        self.transforms = transforms  # optional
+        if not self.rect:
+            LOGGER.warning('WARNING ⚠️ Stream shapes differ. For optimal performance supply similarly-shaped streams.')
+
+    @staticmethod
+    def _timestamp(cap, live):
+        # Frame time in ms, video files carry their own clock and live streams are stamped on arrival
+        return time.time() * 1E3 if live else cap.get(cv2.CAP_PROP_POS_MSEC)
+
+    def update(self, q, cap, stream, live):
+        # Read frames of one source into queue `q` in daemon thread, None marks the end of a video file
+        n = 0  # frame number
+        while cap.isOpened():
+            n += 1
+            if not cap.grab() and not live:  # .read() = .grab() followed by .retrieve()
+                break
+            if n % self.vid_stride == 0:
+                success, im = cap.retrieve()
+                if not success:
+                    if not live:
+                        break
+                    LOGGER.warning('WARNING ⚠️ Video stream unresponsive, please check your IP camera connection.')
+                    cap.open(stream)  # re-open stream if signal was lost
+                    continue
+                self._put(q, (n, self._timestamp(cap, live), im), live)
+        cap.release()
+        self._put(q, None, live)
+
+    @staticmethod
+    def _put(q, item, live):
+        # Queue `item`, under back-pressure live streams drop their oldest frame so inference runs on recent ones
+        if not live:
+            q.put(item)
+            return
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                with contextlib.suppress(queue.Empty):
+                    q.get_nowait()
+
+    def _next_pair(self, i):
+        # Pop the next aligned (visible, lwir) frames of source pair `i`, frames without a counterpart are dropped
+        rgb_q, lwir_q = self.buffers[i]
+        rgb, lwir = rgb_q.get(), lwir_q.get()
+        while rgb is not None and lwir is not None:
+            d = rgb[self.key] - lwir[self.key]
+            if abs(d) <= self.tolerance[i]:
+                return rgb[2], lwir[2]
+            if d < 0:  # visible frame is older
+                rgb = rgb_q.get()
+            else:
+                lwir = lwir_q.get()
+        return None  # end of video
+
+    def __iter__(self):
+        self.count = -1
+        return self
+
+    def __next__(self):
+        self.count += 1
+        pairs = [self._next_pair(i) for i in range(len(self.sources))]
+        if any(x is None for x in pairs) or cv2.waitKey(1) == ord('q'):  # q to quit
+            cv2.destroyAllWindows()
+            raise StopIteration
+
+        im0, ir_im0 = [x[0] for x in pairs], [x[1] for x in pairs]
+        ir_im0 = [y if y.shape == x.shape else cv2.resize(y, x.shape[1::-1]) for x, y in zip(im0, ir_im0)]
+        if self.lwir_ch == 1:
+            ir_im0 = [cv2.cvtColor(y, cv2.COLOR_BGR2GRAY) for y in ir_im0]
+        if self.transforms:
+            im = np.stack([np.concatenate([self.transforms(x), self.transforms(y)]) for x, y in zip(im0, ir_im0)])
+        else:
+            im = np.stack([letterbox_rgbt(x, y, self.img_size, stride=self.stride, auto=self.auto)
+                           for x, y in zip(im0, ir_im0)])  # padded resize, (b,6,h,w) or (b,4,h,w)
+
+        return self.sources, im, im0, ir_im0, None, ''
+
+    def __len__(self):
+        return len(self.sources)
+
+
 def img2label_paths(img_paths):
     # Define label paths as a function of image paths
     sa, sb = f'{os.sep}images{os.sep}', f'{os.sep}labels{os.sep}'  # /images/, /labels/ substrings
@@ -455,7 +626,9 @@ class LoadImagesAndLabels(Dataset):
                  stride=32,
                  pad=0.0,
                  min_items=0,
-                 prefix=''):
+                 prefix='',
+                 lwir_ch=3):
+        assert lwir_ch in (1, 3), f'lwir_ch={lwir_ch} must be 3 (BGR) or 1 (grayscale)'
         self.img_size = img_size
         self.augment = augment
         self.hyp = hyp
@@ -465,7 +638,8 @@ class LoadImagesAndLabels(Dataset):
         self.mosaic_border = [-img_size // 2, -img_size // 2]
         self.stride = stride
         self.path = path
-        self.albumentations = Albumentations(size=img_size) if augment else None
+        self.lwir_ch = lwir_ch  # 1 decodes lwir images as grayscale and packs a (4,h,w) RGB-T array
+        self.albumentations = Albumentations(size=img_size, modalities=2) if augment else None
 
         try:
             f = []  # image files
@@ -577,18 +751,19 @@ class LoadImagesAndLabels(Dataset):
         if cache_images == 'ram' and not self.check_cache_ram(prefix=prefix):
             cache_images = False
         self.ims = [None] * n
-        self.npy_files = [Path(f).with_suffix('.npy') for f in self.im_files]
+        suffix = '.npy' if lwir_ch == 3 else '.lwir1.npy'  # grayscale lwir pairs are cached apart
+        self.npy_files = [Path(f).with_suffix(suffix) for f in self.im_files]
         if cache_images:
             b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
             self.im_hw0, self.im_hw = [None] * n, [None] * n
-            fcn = self.cache_images_to_disk if cache_images == 'disk' else self.load_image
+            fcn = self.cache_images_to_disk if cache_images == 'disk' else self.load_image_pair
             results = ThreadPool(NUM_THREADS).imap(fcn, range(n))
             pbar = tqdm(enumerate(results), total=n, bar_format=TQDM_BAR_FORMAT, disable=LOCAL_RANK > 0)
             for i, x in pbar:
                 if cache_images == 'disk':
                     b += self.npy_files[i].stat().st_size
                 else:  # 'ram'
-                    self.ims[i], self.im_hw0[i], self.im_hw[i] = x  # im, hw_orig, hw_resized = load_image(self, i)
+                    self.ims[i], self.im_hw0[i], self.im_hw[i] = x  # pair, hw_orig, hw_resized = load_image_pair(i)
                     b += self.ims[i].nbytes
                 pbar.desc = f'{prefix}Caching images ({b / gb:.1f}GB {cache_images})'
             pbar.close()
@@ -600,7 +775,7 @@ class LoadImagesAndLabels(Dataset):
         for _ in range(n):
             im = cv2.imread(random.choice(self.im_files))  # sample image
             ratio = self.img_size / max(im.shape[0], im.shape[1])  # max(h, w)  # ratio
-            b += im.nbytes * ratio ** 2
+            b += 2 * im.nbytes * ratio ** 2  # RGB and thermal image of the same size
         mem_required = b * self.n / n  # GB required to cache dataset into RAM
         mem = psutil.virtual_memory()
         cache = mem_required * (1 + safety_margin) < mem.available  # to cache or not to cache, that is the question
@@ -661,24 +836,24 @@ class LoadImagesAndLabels(Dataset):
         index = self.indices[index]  # linear, shuffled, or image_weights
 
         hyp = self.hyp
+        # RGB and thermal are augmented as one (2,h,w,3) stack, every random transform is sampled once for both
         mosaic = self.mosaic and random.random() < hyp['mosaic']
         if mosaic:
             # Load mosaic
-            rgb, thermal, labels = self.load_mosaic(index)
+            im, labels = self.load_mosaic(index)
             shapes = None
 
             # MixUp augmentation
             if random.random() < hyp['mixup']:
-                rgb, thermal, labels = mixup_RGBT(rgb, thermal, labels, *self.load_mosaic(random.randint(0, self.n - 1)))
+                im, labels = mixup(im, labels, *self.load_mosaic(random.randint(0, self.n - 1)))
 
         else:
             # Load image
-            rgb, thermal, (h0, w0), (h, w) = self.load_image(index)
+            im, (h0, w0), (h, w) = self.load_image_pair(index)
 
             # Letterbox
             shape = self.batch_shapes[self.batch[index]] if self.rect else self.img_size  # final letterboxed shape
-            rgb, ratio, pad = letterbox(rgb, shape, auto=False, scaleup=self.augment)
-            thermal, _, _ = letterbox(thermal, shape, auto=False, scaleup=self.augment)
+            im, ratio, pad = letterbox(im, shape, auto=False, scaleup=self.augment)
             shapes = (h0, w0), ((h / h0, w / w0), pad)  # for COCO mAP rescaling
 
             labels = self.labels[index].copy()
@@ -686,39 +861,36 @@ class LoadImagesAndLabels(Dataset):
                 labels[:, 1:] = xywhn2xyxy(labels[:, 1:], ratio[0] * w, ratio[1] * h, padw=pad[0], padh=pad[1])
 
             if self.augment:
-                rgb, thermal, labels = random_perspective_RGBT(rgb, thermal,
-                                                               labels,
-                                                               degrees=hyp['degrees'],
-                                                               translate=hyp['translate'],
-                                                               scale=hyp['scale'],
-                                                               shear=hyp['shear'],
-                                                               perspective=hyp['perspective'])
-
-        assert rgb.shape == thermal.shape
+                im, labels = random_perspective(im,
+                                                labels,
+                                                degrees=hyp['degrees'],
+                                                translate=hyp['translate'],
+                                                scale=hyp['scale'],
+                                                shear=hyp['shear'],
+                                                perspective=hyp['perspective'])
+
         nl = len(labels)  # number of labels
+        h, w = im.shape[1:3]
         if nl:
-            labels[:, 1:5] = xyxy2xywhn(labels[:, 1:5], w=rgb.shape[1], h=rgb.shape[0], clip=True, eps=1E-3)
+            labels[:, 1:5] = xyxy2xywhn(labels[:, 1:5], w=w, h=h, clip=True, eps=1E-3)
 
         if self.augment:
             # Albumentations
-            rgb, _ = self.albumentations(rgb, labels)
-            thermal, labels = self.albumentations(thermal, labels)
+            im, labels = self.albumentations(im, labels)
             nl = len(labels)  # update after albumentations
 
             # HSV color-space
-            augment_hsv_RGBT(rgb, thermal, hgain=hyp['hsv_h'], sgain=hyp['hsv_s'], vgain=hyp['hsv_v'])
+            augment_hsv_RGBT(im, hgain=hyp['hsv_h'], sgain=hyp['hsv_s'], vgain=hyp['hsv_v'])
 
             # Flip up-down
             if random.random() < hyp['flipud']:
-                rgb = np.flipud(rgb)
-                thermal = np.flipud(thermal)
+                im = im[:, ::-1]
                 if nl:
                     labels[:, 2] = 1 - labels[:, 2]
 
             # Flip left-right
             if random.random() < hyp['fliplr']:
-                rgb = np.fliplr(rgb)
-                thermal = np.fliplr(thermal)
+                im = im[:, :, ::-1]
                 if nl:
                     labels[:, 1] = 1 - labels[:, 1]
 
@@ -730,59 +902,62 @@ class LoadImagesAndLabels(Dataset):
         if nl:
             labels_out[:, 1:] = torch.from_numpy(labels)
 
-        # generate masks according to the labels
-        assert rgb.shape == thermal.shape
-        mask = np.zeros_like(rgb)[:, :, 0]
-        mask_h, mask_w = np.shape(mask)
-        if nl:
-            labels_per_img = xywhn2xyxy(labels[:, 1:], mask_w, mask_h)
-            for boxp in labels_per_img:
-                mask[int(boxp[1]):int(boxp[3])+1, int(boxp[0]):int(boxp[2])+1] = 255
-        pil_ds = lambda inputs, dsr: np.expand_dims(
-                                     np.array(
-                                         Image.fromarray(inputs).resize((mask_w//dsr, mask_h//dsr), Image.NEAREST),
-                                         inputs.dtype), 0)
-        mask8 = pil_ds(mask, 8)
-        mask16 = pil_ds(mask, 16)
-        mask32 = pil_ds(mask, 32)
-        # Convert
-        rgb = rgb.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
-        thermal = thermal.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
-        rgb = np.ascontiguousarray(rgb)
-        thermal = np.ascontiguousarray(thermal)
-        mask8 = np.ascontiguousarray(mask8)
-        mask16 = np.ascontiguousarray(mask16)
-        mask32 = np.ascontiguousarray(mask32)
-
-        return torch.from_numpy(rgb), torch.from_numpy(thermal), \
-               torch.from_numpy(mask8), torch.from_numpy(mask16), torch.from_numpy(mask32), \
-               labels_out, self.im_files[index], shapes
+        # Convert, TargetAwareFusion box masks are rasterized from labels_out on the device by ComputeLoss
+        im = im.transpose((0, 3, 1, 2))[:, ::-1]  # HWC to CHW, BGR to RGB
+        if self.lwir_ch == 1:  # packed (4,h,w) RGB-T, one channel of the replicated grayscale lwir image
+            im = np.concatenate((im[0], im[1, :1]))
+        else:
+            im = np.ascontiguousarray(im).reshape(6, h, w)  # packed RGB-T, rgb channels first
+
+        return torch.from_numpy(im), labels_out, self.im_files[index], shapes
+
+    def read_image_pair(self, i):
+        # Reads the RGB-T pair of index 'i' as (rgb, thermal) BGR images, thermal is (h, w, 1) with lwir_ch=1
+        f = self.im_files[i]
+        rgb = cv2.imread(f)  # BGR
+        flags = cv2.IMREAD_GRAYSCALE if self.lwir_ch == 1 else cv2.IMREAD_COLOR  # BGR or grayscale lwir
+        thermal = cv2.imread(f.replace('visible', 'lwir'), flags)
+        assert rgb is not None and thermal is not None, f'Image Not Found {f}'
+        assert rgb.shape[:2] == thermal.shape[:2], f'RGB-T shape mismatch {rgb.shape} != {thermal.shape} for {f}'
+        return rgb, thermal.reshape(*rgb.shape[:2], -1)
+
+    def load_image_pair(self, i):
+        # Loads the RGB-T pair of index 'i' as one (2, h, w, 3) uint8 array, returns (pair, original hw, resized hw).
+        # A grayscale lwir image is replicated to 3 channels so both modalities are augmented as one stack
+        im, fn = self.ims[i], self.npy_files[i]
+        if im is not None:  # cached in RAM
+            return im, self.im_hw0[i], self.im_hw[i]
+        if fn.exists():  # load npy
+            im = np.load(fn)
+            h0, w0 = im.shape[1:3]  # orig hw
+        else:  # read image
+            im = self.read_image_pair(i)
+            h0, w0 = im[0].shape[:2]  # orig hw
+        r = self.img_size / max(h0, w0)  # ratio
+        if r != 1:  # if sizes are not equal
+            interp = cv2.INTER_LINEAR if (self.augment or r > 1) else cv2.INTER_AREA
+            w, h = math.ceil(w0 * r), math.ceil(h0 * r)
+            pair = np.empty((2, h, w, 3), dtype=np.uint8)
+            for x, dst in zip(im, pair):
+                if x.shape[2] == 1:  # grayscale lwir, resized once and replicated
+                    dst[:] = cv2.resize(x, (w, h), interpolation=interp)[..., None]
+                else:
+                    cv2.resize(x, (w, h), dst=dst, interpolation=interp)
+            im = pair
+        elif isinstance(im, tuple):
+            im = np.stack(np.broadcast_arrays(*im))
+        return im, (h0, w0), im.shape[1:3]  # pair, hw_original, hw_resized
 
     def load_image(self, i):
-        # Loads 1 image from dataset index 'i', returns (im, original hw, resized hw)
-        imf, f, fn = self.ims[i], self.im_files[i], self.npy_files[i],
-        if imf is None:  # not cached in RAM
-            if fn.exists():  # load npy
-                imfn = np.load(fn)
-            else:  # read image
-                rgb = cv2.imread(f)  # BGR
-                thermal = cv2.imread(f.replace('visible', 'lwir'))  # BGR
-                assert rgb is not None or thermal is not None, f'Image Not Found {f}'
-            h0, w0 = rgb.shape[:2]  # orig hw
-            assert (h0, w0) == tuple(thermal.shape[:2])
-            r = self.img_size / max(h0, w0)  # ratio
-            if r != 1:  # if sizes are not equal
-                interp = cv2.INTER_LINEAR if (self.augment or r > 1) else cv2.INTER_AREA
-                rgb = cv2.resize(rgb, (math.ceil(w0 * r), math.ceil(h0 * r)), interpolation=interp)
-                thermal = cv2.resize(thermal, (math.ceil(w0 * r), math.ceil(h0 * r)), interpolation=interp)
-            return rgb, thermal, (h0, w0), rgb.shape[:2]  # im, hw_original, hw_resized
-        raise ValueError
+        # Loads 1 RGB-T image pair from dataset index 'i', returns (rgb, thermal, original hw, resized hw)
+        im, hw0, hw = self.load_image_pair(i)
+        return im[0], im[1], hw0, hw
 
     def cache_images_to_disk(self, i):
-        # Saves an image as an *.npy file for faster loading
+        # Saves an RGB-T image pair as one (2, h, w, 3) *.npy file for faster loading
         f = self.npy_files[i]
-        if not f.exists():
-            np.save(f.as_posix(), cv2.imread(self.im_files[i]))
+        if not f.exists() or np.load(f, mmap_mode='r').ndim != 4:  # missing or a single image from an older cache
+            np.save(f.as_posix(), np.stack(np.broadcast_arrays(*self.read_image_pair(i))))
 
     def load_mosaic(self, index):
         # YOLOv5 4-mosaic loader. Loads 1 image + 3 random images into a 4-image mosaic
@@ -793,12 +968,11 @@ class LoadImagesAndLabels(Dataset):
         random.shuffle(indices)
         for i, index in enumerate(indices):
             # Load image
-            rgb, thermal, _, (h, w) = self.load_image(index)
+            img, _, (h, w) = self.load_image_pair(index)
 
             # place img in img4
             if i == 0:  # top left
-                rgb4 = np.full((s * 2, s * 2, rgb.shape[2]), 114, dtype=np.uint8)  # base image with 4 tiles
-                thermal4 = np.full((s * 2, s * 2, thermal.shape[2]), 114, dtype=np.uint8)  # base image with 4 tiles
+                img4 = np.full((len(img), s * 2, s * 2, img.shape[3]), 114, dtype=np.uint8)  # base RGB-T with 4 tiles
                 x1a, y1a, x2a, y2a = max(xc - w, 0), max(yc - h, 0), xc, yc  # xmin, ymin, xmax, ymax (large image)
                 x1b, y1b, x2b, y2b = w - (x2a - x1a), h - (y2a - y1a), w, h  # xmin, ymin, xmax, ymax (small image)
             elif i == 1:  # top right
@@ -811,8 +985,7 @@ class LoadImagesAndLabels(Dataset):
                 x1a, y1a, x2a, y2a = xc, yc, min(xc + w, s * 2), min(s * 2, yc + h)
                 x1b, y1b, x2b, y2b = 0, 0, min(w, x2a - x1a), min(y2a - y1a, h)
 
-            rgb4[y1a:y2a, x1a:x2a] = rgb[y1b:y2b, x1b:x2b]  # img4[ymin:ymax, xmin:xmax]
-            thermal4[y1a:y2a, x1a:x2a] = thermal[y1b:y2b, x1b:x2b]  # img4[ymin:ymax, xmin:xmax]
+            img4[:, y1a:y2a, x1a:x2a] = img[:, y1b:y2b, x1b:x2b]  # img4[ymin:ymax, xmin:xmax]
             padw = x1a - x1b
             padh = y1a - y1b
 
@@ -832,19 +1005,18 @@ class LoadImagesAndLabels(Dataset):
 
         # Augment
         assert self.hyp['copy_paste'] == 0.0, 'copy_paste is not allowed'
-        rgb4, labels4, segments4 = copy_paste(rgb4, labels4, segments4, p=self.hyp['copy_paste'])
-        thermal4, labels4, segments4 = copy_paste(thermal4, labels4, segments4, p=self.hyp['copy_paste'])
-        rgb4, thermal4, labels4 = random_perspective_RGBT(rgb4, thermal4,
-                                                          labels4,
-                                                          segments4,
-                                                          degrees=self.hyp['degrees'],
-                                                          translate=self.hyp['translate'],
-                                                          scale=self.hyp['scale'],
-                                                          shear=self.hyp['shear'],
-                                                          perspective=self.hyp['perspective'],
-                                                          border=self.mosaic_border)  # border to remove
-
-        return rgb4, thermal4, labels4
+        img4, labels4, segments4 = copy_paste(img4, labels4, segments4, p=self.hyp['copy_paste'])
+        img4, labels4 = random_perspective(img4,
+                                           labels4,
+                                           segments4,
+                                           degrees=self.hyp['degrees'],
+                                           translate=self.hyp['translate'],
+                                           scale=self.hyp['scale'],
+                                           shear=self.hyp['shear'],
+                                           perspective=self.hyp['perspective'],
+                                           border=self.mosaic_border)  # border to remove
+
+        return img4, labels4
 
     def load_mosaic9(self, index):
         # YOLOv5 9-mosaic loader. Loads 1 image + 8 random images into a 9-image mosaic
@@ -926,12 +1098,11 @@ class LoadImagesAndLabels(Dataset):
 
     @staticmethod
     def collate_fn(batch):
-        img, img_ir, mask8, mask16, mask32, label, path, shapes = zip(*batch)  # transposed
-        for i, l in enumerate(label):
-            l[:, 0] = i  # add target image index for build_targets()
-        return torch.stack(img, 0), torch.stack(img_ir, 0), \
-               torch.stack(mask8, 0), torch.stack(mask16, 0), torch.stack(mask32, 0), \
-               torch.cat(label, 0), path, shapes
+        # One packed uint8 (b,6,h,w) RGB-T batch, pinned by the DataLoader, so a step does a single H2D copy
+        im, label, path, shapes = zip(*batch)  # transposed
+        for i, lb in enumerate(label):
+            lb[:, 0] = i  # add target image index for build_targets()
+        return torch.stack(im, 0), torch.cat(label, 0), path, shapes
 
     @staticmethod
     def collate_fn4(batch):
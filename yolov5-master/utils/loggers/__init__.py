@@ -86,6 +86,8 @@ class Loggers():
             'x/lr0',
             'x/lr1',
             'x/lr2']  # params
+        if getattr(opt, 'fitness', 'map') == 'mr':  # val.py appends the log-average miss rate to the results
+            self.keys.insert(self.keys.index('x/lr0'), 'metrics/MR-2')
         self.best_keys = ['best/epoch', 'best/precision', 'best/recall', 'best/mAP_0.5', 'best/mAP_0.5:0.95']
         for k in LOGGERS:
             setattr(self, k, None)  # init empty logger dictionary
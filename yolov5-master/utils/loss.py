@@ -6,6 +6,7 @@ Loss functions
 import torch
 import torch.nn as nn
 
+from utils.general import xywhn2xyxy
 from utils.metrics import bbox_iou
 from utils.torch_utils import de_parallel
 
@@ -15,6 +16,22 @@ def smooth_BCE(eps=0.1):  # https://github.com/ultralytics/yolov3/issues/238#iss
     return 1.0 - 0.5 * eps, 0.5 * eps
 
 
+def box_masks(targets, shape, stride):
+    # Rasterize targets(image,class,x,y,w,h) into (bs,1,ny,nx) binary box masks on the stride-s grid in one batched op.
+    # A cell is set when the full-resolution pixel at its centre lies inside a box, i.e. the box filled at image
+    # resolution and nearest-downsampled by s
+    bs, _, ny, nx = shape
+    masks = torch.zeros((bs, ny, nx), device=targets.device)
+    if targets.shape[0]:
+        box = xywhn2xyxy(targets[:, 2:6], w=nx * stride, h=ny * stride)  # pixels
+        cx = torch.arange(nx, device=targets.device) * stride + stride // 2  # cell centre pixels
+        cy = torch.arange(ny, device=targets.device) * stride + stride // 2
+        inx = (box[:, [0]] < cx + 1) & (box[:, [2]] >= cx)  # (nt, nx), box covers pixels int(x1)...int(x2)
+        iny = (box[:, [1]] < cy + 1) & (box[:, [3]] >= cy)  # (nt, ny)
+        masks.index_add_(0, targets[:, 0].long(), (iny[:, :, None] & inx[:, None, :]).float())
+    return masks.clamp_(max=1).unsqueeze(1)
+
+
 class BCEBlurWithLogitsLoss(nn.Module):
     # BCEwithLogitLoss() with reduced missing label effects.
     def __init__(self, alpha=0.05):
@@ -147,12 +164,11 @@ class ComputeLoss:
         self.nc = m.nc  # number of classes
         self.nl = m.nl  # number of layers
         self.anchors = m.anchors
+        self.stride = m.stride.tolist()  # TargetAwareFusion masks share the P3-P5 strides
         self.device = device
 
-    def __call__(self, predList, targetsList):  # predictions, targets
+    def __call__(self, predList, targets):  # predictions, targets
         p, taf_loss_inputs = predList
-        masks8, masks16, masks32, targets = targetsList
-        masks_list = [masks8, masks16, masks32]
         lcls = torch.zeros(1, device=self.device)  # class loss
         lbox = torch.zeros(1, device=self.device)  # box loss
         lobj = torch.zeros(1, device=self.device)  # object loss
@@ -212,7 +228,8 @@ class ComputeLoss:
             if pred_mask_logits is None and ccs_logit is None:
                 raise ValueError('predicted mask is not available!')
             else:
-                ldice += self.diceBCE(pred_mask_logits, masks_list[i])/len(taf_loss_inputs)
+                masks = box_masks(targets, pred_mask_logits.shape, int(self.stride[i])).type(pred_mask_logits.dtype)
+                ldice += self.diceBCE(pred_mask_logits, masks)/len(taf_loss_inputs)
                 lnegent += self.negEnt(ccs_logit)/len(taf_loss_inputs)
 
         return (lbox + lobj + lcls + ldice + lnegent) * bs, torch.cat((lbox, lobj, lcls, ldice, lnegent)).detach()
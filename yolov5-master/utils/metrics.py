@@ -4,6 +4,7 @@ Model validation metrics
 """
 
 import math
+import re
 import warnings
 from pathlib import Path
 
@@ -14,8 +15,10 @@ import torch
 from utils import TryExcept, threaded
 
 
-def fitness(x):
-    # Model fitness as a weighted combination of metrics
+def fitness(x, miss_rate=False):
+    # Model fitness as a weighted combination of metrics, or 1 - MR-2 in the last column if miss_rate
+    if miss_rate:
+        return 1 - x[:, -1]
     w = [0.0, 0.0, 0.1, 0.9]  # weights for [P, R, mAP@0.5, mAP@0.5:0.95]
     return (x[:, :4] * w).sum(1)
 
@@ -219,6 +222,102 @@ class ConfusionMatrix:
             print(' '.join(map(str, self.matrix[i])))
 
 
+class MissRate:
+    # Log-average miss rate (MR-2) of the KAIST multispectral pedestrian benchmark, as mmdetection/mr_evaluation_script
+    # computes it offline: detections are matched greedily by score at IoU 0.5, labels out of the height range or the
+    # bounds, or of ignore_classes, are ignore regions that absorb detections by IoA, and the miss rate is averaged in
+    # log space at 9 FPPI points in [1e-2, 1]. Images are matched per batch on the device, subsets are regexes on paths
+    fppi = (0.0100, 0.0178, 0.0316, 0.0562, 0.1000, 0.1778, 0.3162, 0.5623, 1.0000)  # false positives per image
+
+    def __init__(self, height=(55, 1e10), bounds=None, ignore_classes=(), subsets=None, iou_thres=0.5, max_det=1000):
+        self.height = height  # (min, max) pixel height of the labels that count
+        self.bounds = bounds  # (x1, y1, x2, y2) pixel bounds of the labels that count, i.e. KAIST (5, 5, 635, 507)
+        self.ignore_classes = list(ignore_classes)  # classes that are ignore regions, i.e. KAIST people, person?
+        self.subsets = {'all': None, **{k: re.compile(v) for k, v in (subsets or {}).items()}}  # i.e. day: set0[6-8]
+        self.iou_thres = iou_thres
+        self.max_det = max_det
+        self.dets = []  # per batch (conf, tp, image subsets) of the detections that are not ignored
+        self.images = []  # per batch (image subsets, number of labels that count) of the images, 0 without detections
+
+    def process_batch(self, detections, labels, paths):
+        """
+        Match the detections of a batch of images to their labels.
+        Arguments:
+            detections (list[Array[N, 6]]), x1, y1, x2, y2, conf, class per image
+            labels (list[Array[M, 5]]), class, x1, y1, x2, y2 per image
+            paths (list[str]), image paths
+        Returns:
+            None, updates the matched detections
+        """
+        device, nb = detections[0].device, len(detections)
+        nd, nl = min(max(len(x) for x in detections), self.max_det), max(len(x) for x in labels)
+        subsets = torch.tensor([[p is None or bool(p.search(str(f))) for p in self.subsets.values()] for f in paths],
+                               device=device)  # (nb, ns)
+
+        # Pad to (nb, nd) detections sorted by conf and (nb, nl) labels
+        det = torch.zeros((nb, nd, 5), device=device)
+        lb = torch.zeros((nb, nl, 5), device=device)
+        dvalid = torch.zeros((nb, nd), dtype=torch.bool, device=device)
+        lvalid = torch.zeros((nb, nl), dtype=torch.bool, device=device)
+        for i, (d, l) in enumerate(zip(detections, labels)):
+            d = d[d[:, 4].sort(descending=True, stable=True)[1][:nd]]
+            det[i, :len(d)], dvalid[i, :len(d)] = d[:, :5], True
+            lb[i, :len(l)], lvalid[i, :len(l)] = l, True
+
+        # Ignore rules
+        h = lb[..., 4] - lb[..., 2]
+        ignore = (h < self.height[0]) | (h > self.height[1])
+        ignore |= torch.isin(lb[..., 0], lb.new_tensor(self.ignore_classes))
+        if self.bounds is not None:
+            x1, y1, x2, y2 = self.bounds
+            ignore |= (lb[..., 1] < x1) | (lb[..., 2] < y1) | (lb[..., 3] > x2) | (lb[..., 4] > y2)
+
+        # IoU (nb, nd, nl), IoA for ignore regions
+        a, b = det[..., None, :4], lb[:, None, :, 1:]
+        inter = (torch.min(a[..., 2:], b[..., 2:]) - torch.max(a[..., :2], b[..., :2])).clamp(0).prod(-1)
+        area = (a[..., 2:] - a[..., :2]).prod(-1)
+        union = torch.where(ignore[:, None], area, area + (b[..., 2:] - b[..., :2]).prod(-1) - inter)
+        iou = inter / union.clamp(1e-9)
+        candidate = (iou >= self.iou_thres) & lvalid[:, None] & dvalid[..., None]
+        regular, region = candidate & ~ignore[:, None], (candidate & ignore[:, None]).any(2)
+
+        # Greedy matching in score order, vectorized over the images, over the detections that overlap any label
+        tp = torch.zeros((nb, nd), dtype=torch.bool, device=device)
+        matched = torch.zeros((nb, nl), dtype=torch.bool, device=device)
+        for j in candidate.any(2).any(0).nonzero()[:, 0].tolist():
+            best, k = torch.where(regular[:, j] & ~matched, iou[:, j], -1.0).max(1)
+            tp[:, j] = best >= 0
+            matched |= (torch.arange(nl, device=device) == k[:, None]) & tp[:, j, None]
+        keep = dvalid & (tp | ~region)  # detections matched to ignore regions only are discarded
+
+        i = keep.nonzero()[:, 0]
+        self.dets.append((det[..., 4][keep], tp[keep], subsets[i]))
+        # As the offline evaluateImg skips images without detections, their labels do not count as misses
+        self.images.append((subsets, (lvalid & ~ignore & dvalid.any(1, keepdim=True)).sum(1)))
+
+    def compute(self):
+        # Returns {subset: MR-2} in 0-1, nan for subsets without labels that count
+        if not self.images:
+            return {k: float('nan') for k in self.subsets}
+        conf, tp, dsubsets = (torch.cat(x) for x in zip(*self.dets))
+        isubsets, npos = (torch.cat(x) for x in zip(*self.images))
+        i = conf.sort(descending=True, stable=True)[1]  # stable as the mergesort of the offline evaluation
+        tp, dsubsets = tp[i], dsubsets[i]
+        results = {}
+        for s, k in enumerate(self.subsets):
+            n, ni = int(npos[isubsets[:, s]].sum()), int(isubsets[:, s].sum())
+            if n == 0:
+                results[k] = float('nan')
+                continue
+            t = tp[dsubsets[:, s]]
+            recall = torch.cat((t.new_zeros(1, dtype=torch.long), t.cumsum(0))) / n
+            fp = torch.cat((t.new_zeros(1, dtype=torch.long), (~t).cumsum(0)))
+            fp_max = torch.tensor([math.floor(x * ni + 1e-9) for x in self.fppi], device=fp.device)  # fp <= fppi * ni
+            r = recall[torch.searchsorted(fp, fp_max, right=True) - 1]  # recall at each FPPI
+            results[k] = (1 - r).clamp(1e-10).log().mean().exp().item()
+        return results
+
+
 def bbox_iou(box1, box2, xywh=True, GIoU=False, DIoU=False, CIoU=False, eps=1e-7):
     # Returns Intersection over Union (IoU) of box1(1,4) to box2(n,4)
 
@@ -42,7 +42,7 @@ from utils.dataloaders_rgbtImageLabelsMasks import create_dataloader
 from utils.general import (LOGGER, TQDM_BAR_FORMAT, Profile, check_dataset, check_img_size, check_requirements,
                            check_yaml, coco80_to_coco91_class, colorstr, increment_path, non_max_suppression,
                            print_args, scale_boxes, xywh2xyxy, xyxy2xywh)
-from utils.metrics import ConfusionMatrix, ap_per_class, box_iou
+from utils.metrics import ConfusionMatrix, MissRate, ap_per_class, box_iou
 from utils.plots import output_to_target, plot_images, plot_val_study
 from utils.torch_utils import select_device, smart_inference_mode
 
@@ -119,6 +119,8 @@ def run(
         exist_ok=False,  # existing project/name ok, do not increment
         half=True,  # use FP16 half-precision inference
         dnn=False,  # use OpenCV DNN for ONNX inference
+        stack_modalities=False,  # run shared pre-fusion layers once on batch-stacked RGB-T inputs
+        miss_rate=False,  # compute the KAIST log-average miss rate (MR-2) with the 'miss_rate' settings of data
         model=None,
         dataloader=None,
         save_dir=Path(''),
@@ -142,6 +144,8 @@ def run(
         # Load model
         model = DetectMultiBackend(weights, device=device, dnn=dnn, data=data, fp16=half)
         stride, pt, jit, engine = model.stride, model.pt, model.jit, model.engine
+        if pt:
+            model.model.stack_modalities = stack_modalities
         imgsz = check_img_size(imgsz, s=stride)  # check image size
         half = model.fp16  # FP16 supported on limited backends with CUDA
         if engine:
@@ -169,7 +173,7 @@ def run(
             ncm = model.model.nc
             assert ncm == nc, f'{weights} ({ncm} classes) trained on different --data than what you passed ({nc} ' \
                               f'classes). Pass correct combination of --weights and --data that are trained together.'
-        model.warmup(imgsz=(1 if pt else batch_size, 6, imgsz, imgsz))  # warmup
+        model.warmup(imgsz=(1 if pt else batch_size, model.ch or 3, imgsz, imgsz))  # warmup
         pad, rect = (0.0, False) if task == 'speed' else (0.5, pt)  # square inference for benchmarks
         task = task if task in ('train', 'val', 'test') else 'val'  # path to train/val/test images
         dataloader = create_dataloader(data[task],
@@ -180,10 +184,12 @@ def run(
                                        pad=pad,
                                        rect=rect,
                                        workers=workers,
-                                       prefix=colorstr(f'{task}: '))[0]
+                                       prefix=colorstr(f'{task}: '),
+                                       lwir_ch=1 if model.ch == 4 else 3)[0]
 
     seen = 0
     confusion_matrix = ConfusionMatrix(nc=nc)
+    missrate = MissRate(**data.get('miss_rate', {})) if miss_rate else None
     names = model.names if hasattr(model, 'names') else model.module.names  # get class names
     if isinstance(names, (list, tuple)):  # old format
         names = dict(enumerate(names))
@@ -195,44 +201,29 @@ def run(
     jdict, stats, ap, ap_class = [], [], [], []
     callbacks.run('on_val_start')
     pbar = tqdm(dataloader, desc=s, bar_format=TQDM_BAR_FORMAT)  # progress bar
-    for batch_i, (imgs_rgb, imgs_ir, masks8, masks16, masks32, targets, paths, shapes) in enumerate(pbar):
+    for batch_i, (imgs, targets, paths, shapes) in enumerate(pbar):
         callbacks.run('on_val_batch_start')
         with dt[0]:
             if cuda:
-                imgs_rgb = imgs_rgb.to(device, non_blocking=True)
-                imgs_ir = imgs_ir.to(device, non_blocking=True)
-                masks8 = masks8.to(device, non_blocking=True)
-                masks16 = masks16.to(device, non_blocking=True)
-                masks32 = masks32.to(device, non_blocking=True)
+                imgs = imgs.to(device, non_blocking=True)  # packed (b,6,h,w) RGB-T, (b,4,h,w) for grayscale lwir
                 targets = targets.to(device)
-            imgs_rgb = imgs_rgb.half() if half else imgs_rgb.float()  # uint8 to fp16/32
-            imgs_ir = imgs_ir.half() if half else imgs_ir.float()  # uint8 to fp16/32
-            imgs_rgb /= 255  # 0 - 255 to 0.0 - 1.0
-            imgs_ir /= 255  # 0 - 255 to 0.0 - 1.0
-
-            masks8 = masks8.half() if half else masks8.float()  # uint8 to fp16/32
-            masks8 /= 255.0  # 0 - 255 to 0.0 - 1.0
-
-            masks16 = masks16.half() if half else masks16.float()  # uint8 to fp16/32
-            masks16 /= 255.0  # 0 - 255 to 0.0 - 1.0
-
-            masks32 = masks32.half() if half else masks32.float()  # uint8 to fp16/32
-            masks32 /= 255.0  # 0 - 255 to 0.0 - 1.0
-
-            assert imgs_ir.shape == imgs_rgb.shape
-            nb, _, height, width = imgs_ir.shape  # batch size, channels, height, width
+            imgs = imgs.half() if half else imgs.float()  # uint8 to fp16/32
+            imgs /= 255  # 0 - 255 to 0.0 - 1.0
+            imgs_rgb, imgs_ir = imgs.split((3, imgs.shape[1] - 3), 1)  # views
+            nb, _, height, width = imgs.shape  # batch size, channels, height, width
 
         # Inference
         with dt[1]:
             if compute_loss:
-                (preds, train_out), taf_loss_inputs = model(torch.cat([imgs_rgb, imgs_ir], 1))
+                (preds, train_out), taf_loss_inputs = model(imgs)
             else:
-                preds, taf_loss_inputs = model(torch.cat([imgs_rgb, imgs_ir], 1), augment=augment)
+                preds = model(imgs, augment=augment)
+                preds = preds[0] if pt else preds  # drop TAF mask logits, exported models output detections only
                 train_out = None
 
         # Loss
         if compute_loss:
-            loss += compute_loss([train_out, taf_loss_inputs], [masks8, masks16, masks32, targets])[1]  # box, obj, cls, dice, neg_corr
+            loss += compute_loss([train_out, taf_loss_inputs], targets)[1]  # box, obj, cls, dice, neg_corr
 
         # NMS
         targets[:, 2:] *= torch.tensor((width, height, width, height), device=device)  # to pixels
@@ -247,35 +238,40 @@ def run(
                                         max_det=max_det)
 
         # Metrics
+        mr_batch = []  # native-space (predictions, labels) of the miss rate
         for si, pred in enumerate(preds):
             labels = targets[targets[:, 0] == si, 1:]
             nl, npr = labels.shape[0], pred.shape[0]  # number of labels, predictions
             path, shape = Path(paths[si]), shapes[si][0]
             correct = torch.zeros(npr, niou, dtype=torch.bool, device=device)  # init
             seen += 1
+            tbox = xywh2xyxy(labels[:, 1:5])  # target boxes
+            scale_boxes(imgs[si].shape[1:], tbox, shape, shapes[si][1])  # native-space labels
+            labelsn = torch.cat((labels[:, 0:1], tbox), 1)  # native-space labels
 
             if npr == 0:
                 if nl:
                     stats.append((correct, *torch.zeros((2, 0), device=device), labels[:, 0]))
                     if plots:
                         confusion_matrix.process_batch(detections=None, labels=labels[:, 0])
+                if missrate:
+                    mr_batch.append((pred, labelsn))
                 continue
 
             # Predictions
             if single_cls:
                 pred[:, 5] = 0
             predn = pred.clone()
-            scale_boxes(imgs_rgb[si].shape[1:], predn[:, :4], shape, shapes[si][1])  # native-space pred
+            scale_boxes(imgs[si].shape[1:], predn[:, :4], shape, shapes[si][1])  # native-space pred
 
             # Evaluate
             if nl:
-                tbox = xywh2xyxy(labels[:, 1:5])  # target boxes
-                scale_boxes(imgs_rgb[si].shape[1:], tbox, shape, shapes[si][1])  # native-space labels
-                labelsn = torch.cat((labels[:, 0:1], tbox), 1)  # native-space labels
                 correct = process_batch(predn, labelsn, iouv)
                 if plots:
                     confusion_matrix.process_batch(predn, labelsn)
             stats.append((correct, pred[:, 4], pred[:, 5], labels[:, 0]))  # (correct, conf, pcls, tcls)
+            if missrate:
+                mr_batch.append((predn, labelsn))
 
             # Save/log
             if save_txt:
@@ -284,6 +280,9 @@ def run(
                 save_one_json(predn, jdict, path, class_map)  # append to COCO-JSON dictionary
             callbacks.run('on_val_image_end', pred, predn, path, names, (imgs_rgb[si] + imgs_ir[si])/2.0)
 
+        if missrate:
+            missrate.process_batch(*zip(*mr_batch), paths)
+
         # Plot images
         if plots and batch_i < 3:
             plot_images((imgs_rgb + imgs_ir)/2.0, targets, paths, save_dir / f'val_batch{batch_i}_labels.jpg', names)  # labels
@@ -311,10 +310,16 @@ def run(
         for i, c in enumerate(ap_class):
             LOGGER.info(pf % (names[c], seen, nt[c], p[i], r[i], ap50[i], ap75[i], ap[i]))
 
+    # Print miss rates
+    lamr = missrate.compute() if missrate else {}
+    if lamr:
+        LOGGER.info(('%22s' + '%11s' * len(lamr)) % ('MR-2', *lamr))
+        LOGGER.info(('%22s' + '%11.4g' * len(lamr)) % ('', *lamr.values()))
+
     # Print speeds
     t = tuple(x.t / seen * 1E3 for x in dt)  # speeds per image
     if not training:
-        shape = (batch_size, 3, imgsz, imgsz)
+        shape = (batch_size, model.ch or 6, imgsz, imgsz)
         LOGGER.info(f'Speed: %.1fms pre-process, %.1fms inference, %.1fms NMS per image at shape {shape}' % t)
 
     # Plots
@@ -358,7 +363,7 @@ def run(
     maps = np.zeros(nc) + map
     for i, c in enumerate(ap_class):
         maps[c] = ap[i]
-    return (mp, mr, map50, map, *(loss.cpu() / len(dataloader)).tolist()), maps, t
+    return (mp, mr, map50, map, *(loss.cpu() / len(dataloader)).tolist(), *list(lamr.values())[:1]), maps, t
 
 
 def parse_opt():
@@ -385,6 +390,8 @@ def parse_opt():
     parser.add_argument('--exist-ok', action='store_true', help='existing project/name ok, do not increment')
     parser.add_argument('--half', action='store_true', help='use FP16 half-precision inference')
     parser.add_argument('--dnn', action='store_true', help='use OpenCV DNN for ONNX inference')
+    parser.add_argument('--stack-modalities', action='store_true', help='run shared RGB-T layers on batch-stacked inputs')
+    parser.add_argument('--miss-rate', action='store_true', help='report the KAIST log-average miss rate (MR-2)')
     opt = parser.parse_args()
     opt.data = check_yaml(opt.data)  # check YAML
     opt.save_json |= opt.data.endswith('coco.yaml')